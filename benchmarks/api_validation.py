@@ -0,0 +1,45 @@
+"""
+Validation cost of a `/neo-screener` payload: schema rebuilt and re-checked on every call (previous
+behaviour), compiled validator, and the `neo_screener` pydantic model.
+
+    python -m benchmarks.api_validation --items 1000 --rounds 20
+"""
+import argparse
+import time
+from jsonschema import Draft7Validator, validate
+from src.utils import api_validation
+
+
+def make_payload(items: int) -> list[dict]:
+    return [{'s_question_id': i, 'q_id': f'q{i}', 'video_url': f'https://storage.example.com/answers/{i}.mp4',
+             'question': 'Explain the difference between overfitting and underfitting.', 'vas_subtype_id': 1}
+            for i in range(items)]
+
+
+def timed(func, payload, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(payload)
+    return (time.perf_counter() - started) / rounds
+
+
+def main(items: int, rounds: int) -> None:
+    payload = make_payload(items)
+    compiled = Draft7Validator(api_validation.NONTECH_SCHEMA)
+    results = {
+        'jsonschema.validate per call  ': timed(lambda data: validate(data, api_validation.NONTECH_SCHEMA), payload, rounds),
+        'compiled validator, no formats': timed(lambda data: list(compiled.iter_errors(data)), payload, rounds),
+        'compiled validator + formats  ': timed(api_validation.validate_api_data_nontech, payload, rounds),
+        'pydantic neo_screener model   ': timed(api_validation.validate_api_data_model, payload, rounds),
+    }
+    print(f"payload: {items} items, {rounds} rounds")
+    for name, seconds in results.items():
+        print(f"{name} : {seconds * 1e3:8.2f} ms per payload")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    main(args.items, args.rounds)
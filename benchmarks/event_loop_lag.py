@@ -0,0 +1,64 @@
+"""
+Measures the event loop lag while a batch is written through db_ops.
+
+    python -m benchmarks.event_loop_lag --questions 50 --latency 0.005
+"""
+import argparse
+import asyncio
+import time
+from src.utils import db_ops, async_db_ops
+from benchmarks.fakes import fake_db
+
+
+async def measure_lag(coroutine, interval: float = 0.001) -> float:
+    """
+    Returns the worst delay (seconds) seen by a ticker scheduled every `interval` seconds while `coroutine` runs.
+    """
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal worst
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            worst = max(worst, time.perf_counter() - expected)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    await coroutine
+    done.set()
+    await task
+    return worst
+
+
+def make_batch(questions: int) -> list[dict]:
+    return [{'s_question_id': i, 'q_id': f'q{i}', 'feedback': '[{"Rating": 5}]'} for i in range(questions)]
+
+
+async def blocking_batch(batch: list[dict]) -> None:
+    db_ops.insert_data_into_mysql(batch, {})
+    db_ops.update_student_questions(batch, {})
+
+
+async def async_batch(batch: list[dict]) -> None:
+    await async_db_ops.insert_data_into_mysql(batch, {})
+    await async_db_ops.update_student_questions(batch, {})
+
+
+async def main(questions: int, latency: float) -> None:
+    batch = make_batch(questions)
+    with fake_db(latency=latency):
+        blocking = await measure_lag(blocking_batch(batch))
+        non_blocking = await measure_lag(async_batch(batch))
+    print(f"questions={questions} statement_latency={latency}s")
+    print(f"max event loop lag, blocking db_ops : {blocking * 1000:.2f} ms")
+    print(f"max event loop lag, async_db_ops    : {non_blocking * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(main(args.questions, args.latency))
@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+
+class FakeCursor:
+    """
+    Cursor of `FakeConnection`, sleeps `latency` seconds per statement to stand in for a MySQL round trip.
+    """
+    def __init__(self, connection, dictionary: bool = False):
+        self.connection = connection
+        self.dictionary = dictionary
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query: str, params=None):
+        self.connection.record(query, params)
+        self._rows = list(self.connection.responder(query, params, self.dictionary) or [])
+
+    def executemany(self, query: str, seq_params):
+        self.connection.record(query, seq_params)
+        for params in seq_params:
+            self.connection.responder(query, params, self.dictionary)
+        self._rows = []
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    In-process stand-in for a pooled mysql-connector connection which records every statement.
+    """
+    def __init__(self, latency: float = 0.0, responder=None):
+        self.latency = latency
+        self.responder = responder or (lambda query, params, dictionary: [])
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def record(self, query: str, params) -> None:
+        self.statements.append((" ".join(query.split()), params))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def cursor(self, dictionary: bool = False, prepared: bool = False):
+        return FakeCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect: bool = False, attempts: int = 1, delay: int = 0):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """
+    Stand-in for `DBPool` lending the same `FakeConnection` to every checkout.
+    """
+    def __init__(self, connection: FakeConnection):
+        self.fake_connection = connection
+
+    @contextmanager
+    def connection(self):
+        yield self.fake_connection
+
+
+@contextmanager
+def fake_db(latency: float = 0.0, responder=None):
+    """
+    Patch the process wide pool to lend `FakeConnection`s instead of pooled MySQL connections,
+    units of work included. Yields the shared connection so callers can inspect the issued statements.
+    """
+    connection = FakeConnection(latency=latency, responder=responder)
+    with patch('src.utils.db_pool._current_pool', lambda db_config: FakePool(connection)):
+        yield connection
+
+
+SELECT_RE = re.compile(r'^select\s+(.*?)\s+from\s', re.IGNORECASE | re.DOTALL)
+
+
+def _columns(query: str) -> list[str]:
+    """
+    Result column names of a SELECT: the alias, or the column without its table prefix.
+    """
+    names = []
+    for column in SELECT_RE.match(query).group(1).split(','):
+        names.append(re.split(r'\s+as\s+', column.strip(), flags=re.IGNORECASE)[-1].split('.')[-1])
+    return names
+
+
+class FakeSchema:
+    """
+    In-memory `tests`, `test_templates`, `student_course`, `student_questions` and `video_auto_results`
+    answering the statements of `db_ops`, to be used as the `responder` of `FakeConnection`. Writes are
+    applied, so the marks and the overall feedback are computed from what the pipeline stored. Statements
+    it does not know answer no rows and are counted in `unmatched`.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tests = {}  # t_id -> row, its template_data joined in
+        self.student_course = {}  # (user_id, c_id, t_id, attempt_no) -> row
+        self.student_questions = {}  # s_question_id -> row
+        self.video_auto_results = {}  # s_question_id -> row
+        self.unmatched = Counter()
+        self._handlers = (
+            ('insert into video_auto_results', self._insert_result),
+            ('update student_questions', self._update_question_marks),
+            ('update student_course set section_wise_marks', self._update_section_marks),
+            ('update student_course set overall_feedback', self._update_overall_feedback),
+            ('update student_course set t_marks', self._update_t_marks),
+            ('from tests t', self._select_template),
+            ('from video_auto_results var where var.s_question_id in', self._select_transcriptions),
+            ('from student_questions sq where sq.s_question_id in', self._select_attempts),
+            ('from student_questions sq where sq.q_id in', self._select_test_questions),
+            ('sum(sq.marks)', self._select_section_marks),
+            ('select sc.section_wise_marks', self._select_course),
+            ('select t_total_marks', self._select_course),
+            ('select var.overall_score', self._select_rated),
+            ('select var.feedback', self._select_feedback),
+        )
+
+    def seed(self, attempts: int, questions: int, sections: int = 3, total_marks: int = 100) -> list[list[dict]]:
+        """
+        One test of `questions` questions spread over `sections` sections, and `attempts` attempts of it.
+
+        Returns:
+            The `/neo-screener` payload of each attempt.
+        """
+        q_ids = [f'q{number}' for number in range(questions)]
+        section_of = {q_id: number % sections for number, q_id in enumerate(q_ids)}
+        template = {'sections': [{'name': f'section {number}'} for number in range(sections)],
+                    'questions': [{'sectionName': f'section {number}',
+                                   'questionList': [q_id for q_id in q_ids if section_of[q_id] == number]}
+                                  for number in range(sections)]}
+        payloads = []
+        with self.lock:
+            self.tests['t1'] = {'t_id': 't1', 't_name': 'Load test', 't_type': 'video',
+                                'template_data': json.dumps(template)}
+            for attempt in range(attempts):
+                key = (f'user{attempt}', 'c1', 't1', 1)
+                self.student_course[key] = {
+                    'user_id': key[0], 'c_id': 'c1', 't_id': 't1', 'attempt_no': 1, 't_marks': 0,
+                    't_total_marks': total_marks, 'overall_feedback': None,
+                    'section_wise_marks': json.dumps([{'name': f'section {number}', 'marks': 0}
+                                                      for number in range(sections)])}
+                payload = []
+                for q_id in q_ids:
+                    s_question_id = len(self.student_questions) + 1
+                    self.student_questions[s_question_id] = {
+                        's_question_id': s_question_id, 'q_id': q_id, 'user_id': key[0], 'c_id': 'c1', 't_id': 't1',
+                        'attempt_no': 1, 'section_no': section_of[q_id] + 1, 'marks': 0, 'state': None,
+                        'q_total_marks': 10}
+                    payload.append({'s_question_id': s_question_id, 'q_id': q_id, 'vas_subtype_id': 1,
+                                    'video_url': f'https://storage.example.com/answers/{s_question_id}.mp4',
+                                    'question': f'Question {q_id}: explain the trade-offs of your last design.'})
+                payloads.append(payload)
+        return payloads
+
+    def __call__(self, query: str, params, dictionary: bool) -> list:
+        statement = ' '.join(query.split()).lower()
+        for marker, handler in self._handlers:
+            if marker in statement:
+                with self.lock:
+                    rows = handler(tuple(params or ()), statement)
+                break
+        else:
+            self.unmatched[statement[:60]] += 1
+            return []
+        if not statement.startswith('select'):
+            return []
+        columns = _columns(statement)
+        return [{column: row.get(column) for column in columns} if dictionary
+                else tuple(row.get(column) for column in columns) for row in rows]
+
+    def _attempt_questions(self, user_id, c_id, t_id, attempt_no) -> list[dict]:
+        return [row for row in self.student_questions.values()
+                if (row['user_id'], row['c_id'], row['t_id'], row['attempt_no']) == (user_id, c_id, t_id, attempt_no)]
+
+    def _select_template(self, params, statement):
+        return [self.tests[params[0]]] if params[0] in self.tests else []
+
+    def _select_transcriptions(self, params, statement):
+        return [self.video_auto_results[s_question_id] for s_question_id in params
+                if self.video_auto_results.get(s_question_id, {}).get('transcription_text') is not None]
+
+    def _select_attempts(self, params, statement):
+        return [self.student_questions[s_question_id] for s_question_id in params
+                if s_question_id in self.student_questions]
+
+    def _select_test_questions(self, params, statement):
+        q_ids = set(params)
+        return [row for row in self.student_questions.values() if row['q_id'] in q_ids]
+
+    def _select_section_marks(self, params, statement):
+        q_ids, marks = set(params[4:]), Counter()
+        for row in self._attempt_questions(*params[:4]):
+            if row['q_id'] in q_ids:
+                marks[row['section_no']] += row['marks'] or 0
+        return [{'section_no': section_no, 'marks': total} for section_no, total in marks.items()]
+
+    def _select_course(self, params, statement):
+        return [self.student_course[params]] if params in self.student_course else []
+
+    def _joined_results(self, questions) -> list[dict]:
+        rows = [self.video_auto_results.get(row['s_question_id']) for row in questions]
+        return sorted((row for row in rows if row and row['feedback'] is not None), key=lambda row: row['s_question_id'])
+
+    def _select_rated(self, params, statement):
+        return self._joined_results(self._attempt_questions(*params))
+
+    def _select_feedback(self, params, statement):
+        t_id, attempt_no, user_id = params
+        return self._joined_results([row for row in self.student_questions.values()
+                                     if (row['t_id'], row['attempt_no'], row['user_id']) == (t_id, attempt_no, user_id)])
+
+    def _insert_result(self, params, statement):
+        columns = ('transcription_id', 's_question_id', 'q_id', 'video_link', 'transcription_text', 'answer_keywords',
+                   'overall_score', 'q_subtype_id', 'answer_explanation', 'status', 'feedback')
+        row = dict(zip(columns, params))
+        self.video_auto_results[row['s_question_id']] = row
+
+    def _update_question_marks(self, params, statement):
+        if 'when exists' in statement:
+            # per-row form: marks and state read from video_auto_results through sub-selects
+            row = self.student_questions.get(params[-1])
+            if row is not None:
+                score = self.video_auto_results.get(params[-1], {}).get('overall_score')
+                row['marks'] = score if score is not None else 0
+                row['state'] = None if score is None else (
+                    1 if float(score) == row['q_total_marks'] else 2 if float(score) == 0 else 4)
+            return
+        # joined form: the scores come from the statement parameters or from video_auto_results
+        if 'union all' in statement:
+            count = len(params) // 3
+            scores = dict(zip(params[:2 * count:2], params[1:2 * count:2]))
+            s_question_ids = params[2 * count:]
+        else:
+            s_question_ids = params
+            scores = {s_question_id: self.video_auto_results.get(s_question_id, {}).get('overall_score')
+                      for s_question_id in s_question_ids}
+        for s_question_id in s_question_ids:
+            row = self.student_questions.get(s_question_id)
+            if row is None:
+                continue
+            score = scores.get(s_question_id)
+            row['marks'] = 0 if score is None else score  # COALESCE(var.overall_score, 0)
+            if score is None:
+                row['state'] = None
+            elif float(score) == row['q_total_marks']:
+                row['state'] = 1
+            elif float(score) == 0:
+                row['state'] = 2
+            else:
+                row['state'] = 4
+
+    def _update_section_marks(self, params, statement):
+        if params[1:] in self.student_course:
+            self.student_course[params[1:]]['section_wise_marks'] = params[0]
+
+    def _update_t_marks(self, params, statement):
+        row = self.student_course.get(params[1:])
+        if row is not None:
+            row['t_marks'] = params[0] / 10 * row['t_total_marks']
+
+    def _update_overall_feedback(self, params, statement):
+        row = self.student_course.get(params[1:])
+        if row is not None:
+            row['overall_feedback'] = params[0]
+
+
+class Latency:
+    """
+    Seconds a fake dependency takes per call: `mean` spread uniformly by +/- `jitter` (a fraction of the
+    mean), drawn from a seeded generator so two runs see the same sequence.
+    """
+    def __init__(self, mean: float, jitter: float = 0.0, seed: int = 0):
+        self.mean = mean
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def draw(self) -> float:
+        return max(self.mean * (1 + self._random.uniform(-self.jitter, self.jitter)), 0.0)
+
+
+class FakeLLM:
+    """
+    Blocking stand-in for the Gemini client, answering the per-question and the overall feedback prompts in
+    the formats the pipeline parses. The rating of a question is derived from its text, so runs are repeatable.
+    """
+    def __init__(self, latency: Latency, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(1)
+
+    def invoke(self, prompt: str) -> SimpleNamespace:
+        time.sleep(self.latency.draw())
+        return self._answer(prompt)
+
+    async def ainvoke(self, prompt: str) -> SimpleNamespace:
+        await asyncio.sleep(self.latency.draw())
+        return self._answer(prompt)
+
+    def _answer(self, prompt: str) -> SimpleNamespace:
+        self.calls += 1
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("fake LLM failure")
+        rating = int(hashlib.sha256(prompt.encode()).hexdigest(), 16) % 11
+        return SimpleNamespace(content=json.dumps([{
+            'question': prompt[:80], 'area_of_improvement': 'Quantify the impact of the decisions. ' * 4,
+            'strength': 'Clear structure and a concrete example. ' * 3,
+            'suggestions': 'Mention how the result was validated. ' * 3, 'Rating': rating}]))
+
+    def question_feedback(self, question: str, transcript: str) -> str:
+        return self.invoke(f"{question}\n{transcript}").content
+
+    def overall_feedback(self, prompt: str) -> str:
+        rating = json.loads(self.invoke(prompt).content)[0]['Rating']
+        return json.dumps({'overall_score': {'Overall Rating': rating}, 'strengths': 'Structured answers.',
+                           'areas_of_improvement': 'Depth on validation.'})
+
+
+class FakeTranscription:
+    """
+    Stand-in for `process_task`: waits the transcription latency, then has `llm` generate the feedback of
+    the question, and answers the fields of a transcribed question.
+    """
+    def __init__(self, latency: Latency, llm: FakeLLM, error_rate: float = 0.0):
+        self.latency = latency
+        self.llm = llm
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(2)
+
+    async def process_task(self, doc: dict) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency.draw())
+        if self._random.random() < self.error_rate:
+            raise RuntimeError("fake transcription failure")
+        transcript = f"Answer to question {doc['q_id']}: " + 'we measured, compared and chose the simpler design. ' * 20
+        feedback = (await self.llm.ainvoke(f"{doc['question']}\n{transcript}")).content
+        return {'transcription_id': f"fake-{doc['s_question_id']}", 'transcription_text': transcript,
+                'answer_keywords': ['design', 'trade-off'], 'answer_explanation': None, 'status': 'completed',
+                's_question_id': doc['s_question_id'], 'q_id': doc['q_id'], 'video_link': doc['video_url'],
+                'q_subtype_id': doc.get('vas_subtype_id'), 'feedback': feedback}
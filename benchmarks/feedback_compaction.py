@@ -0,0 +1,61 @@
+"""
+Size of the question feedback sent to the overall feedback prompt, as stored and once compacted to a
+token budget, for attempts of a growing number of questions.
+
+    python -m benchmarks.feedback_compaction --budget 6000
+    python -m benchmarks.feedback_compaction --budget 6000 --live   # also times the LLM (GEMINI_API_KEY)
+"""
+import argparse
+import json
+import os
+import time
+from src.utils.common import read_yaml
+from src.utils.feedback_compaction import compact_question_feedback, estimate_tokens
+
+SENTENCE = ("The candidate explained the trade-off between bias and variance with a concrete example from a "
+            "previous project, but did not quantify the impact or mention how the model was validated. ")
+
+
+def make_feedback(questions: int) -> list[str]:
+    return [json.dumps([{'question': f"Question {i}: describe how you would approach problem {i}. " + SENTENCE,
+                         'area_of_improvement': SENTENCE * 3, 'strength': SENTENCE * 2,
+                         'suggestions': SENTENCE * 2, 'Rating': i % 11}])
+            for i in range(questions)]
+
+
+def time_llm(prompt: str) -> float:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from src.secrets.load_keys import LoadSecret
+    llm = ChatGoogleGenerativeAI(model=LoadSecret().get_secret('GENAI_MODEL', 'gemini-1.5-flash'),
+                                 google_api_key=LoadSecret().get_secret('GEMINI_API_KEY'), temperature=0)
+    started = time.perf_counter()
+    llm.invoke(prompt)
+    return time.perf_counter() - started
+
+
+def main(budget: int, sizes: list[int], live: bool) -> None:
+    overall_prompt = read_yaml(os.path.join('configs', 'feedback_config.yml'))['overal_feedback_prompt']
+    prompt_tokens = estimate_tokens(overall_prompt)
+    print(f"budget={budget} tokens, overall feedback prompt={prompt_tokens} tokens (estimated)")
+    for questions in sizes:
+        blobs = make_feedback(questions)
+        started = time.perf_counter()
+        compacted, stats = compact_question_feedback(blobs, budget)
+        elapsed = time.perf_counter() - started
+        line = (f"questions={questions:4}: feedback {stats['tokens_before']:7} -> {stats['tokens_after']:6} tokens "
+                f"({stats['tier']}), prompt {prompt_tokens + stats['tokens_before']:7} -> "
+                f"{prompt_tokens + stats['tokens_after']:6} tokens, compaction {elapsed * 1e3:6.2f} ms")
+        if live:
+            raw = time_llm(overall_prompt + '\n' + '\n'.join(blobs))
+            short = time_llm(overall_prompt + '\n' + compacted)
+            line += f", LLM {raw:5.2f} s -> {short:5.2f} s"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=int, default=6000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 20, 50, 100, 200, 1000])
+    parser.add_argument('--live', action='store_true')
+    args = parser.parse_args()
+    main(args.budget, args.sizes, args.live)
@@ -0,0 +1,253 @@
+"""
+End-to-end load test of `/neo-screener` and `/test-level-feedback`, with MySQL (`FakeSchema`), the
+transcription service and the LLM replaced by local fakes of configurable latency. The app is driven
+in-process through ASGI, job queue, scheduler, retry policies and db_ops included: `--clients` clients
+each submit a batch, poll its job until it completes and submit the next one.
+
+Reports p50/p95/p99 per pipeline stage (as recorded on the job) and the jobs/questions per second.
+A run can be saved as a baseline, and a later run compared to it: the comparison fails (exit code 1)
+when a p95 or the throughput regresses by more than `--tolerance` (p95 changes under `--noise-ms` aside).
+
+    python -m benchmarks.load_test --jobs 40 --clients 8 --questions 10
+    python -m benchmarks.load_test --transcription-latency 0.5 --llm-latency 0.8 --env SCHEDULER_GENAI_CONCURRENCY=8
+    python -m benchmarks.load_test --save-baseline benchmarks/baselines/load_test.json
+    python -m benchmarks.load_test --compare benchmarks/baselines/load_test.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+from benchmarks.fakes import fake_db, FakeSchema, FakeLLM, FakeTranscription, Latency
+
+# stage -> how it is measured, in report order
+STAGES = {
+    'submit': 'POST /neo-screener, client side',
+    'queue_wait': 'job queued -> validation started',
+    'validation': 'job stage',
+    'question_processing': 'job stage',
+    'db_write': 'job stage',
+    'test_level_feedback': 'job stage',
+    'job': 'job queued -> job done',
+    'overall_feedback_request': 'POST /test-level-feedback, client side',
+}
+# settings of the app under test, `--env` overrides them
+APP_ENV = {
+    'JOB_QUEUE_POLL_INTERVAL': '0.01',
+    'JOB_QUEUE_RETRY_DELAY': '0.1',
+    'RETRY_BASE_DELAY': '0.05',
+    'TRANSCRIPTION_CACHE_ENABLED': 'false',
+    'FEEDBACK_CACHE_ENABLED': 'false',
+    'FEEDBACK_BATCH_ENABLED': 'false',
+    'MEDIA_PREPROCESS_ENABLED': 'false',
+}
+
+
+def percentile(values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of `values`.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def summarise(samples: dict) -> dict:
+    return {stage: {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                    'p99': percentile(values, 99)}
+            for stage, values in samples.items() if values}
+
+
+async def asgi_request(app, method: str, path: str, body=None) -> tuple[int, object]:
+    """
+    One HTTP request handed to the ASGI `app` directly, no server nor socket involved.
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+             'headers': [(b'host', b'loadtest'), (b'content-type', b'application/json'),
+                         (b'content-length', str(len(payload)).encode())],
+             'client': ('127.0.0.1', 0), 'server': ('loadtest', 80)}
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    disconnected = asyncio.get_running_loop().create_future()
+    status, chunks = None, []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return await disconnected  # the client stays connected until the response is sent
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    disconnected.cancel()
+    content = b''.join(chunks)
+    return status, json.loads(content) if content else None
+
+
+async def run_load(main, args, payloads: list[list[dict]]) -> tuple[dict, dict]:
+    samples = {stage: [] for stage in STAGES}
+    outcomes = {'done': 0, 'failed': 0, 'rejected': 0}
+    pending = list(payloads)
+
+    async def client():
+        while pending:
+            payload = pending.pop(0)
+            started = time.perf_counter()
+            status, body = await asgi_request(main.app, 'POST', '/neo-screener', payload)
+            samples['submit'].append(time.perf_counter() - started)
+            if status != 200:
+                # saturated, resubmitted later like a real caller honouring Retry-After
+                outcomes['rejected'] += 1
+                pending.append(payload)
+                await asyncio.sleep(args.poll)
+                continue
+            while True:
+                await asyncio.sleep(args.poll)
+                _, job = await asgi_request(main.app, 'GET', f"/neo-screener/jobs/{body['job_id']}")
+                if job['status'] in ('done', 'failed'):
+                    break
+            outcomes[job['status']] += 1
+            stages = {stage['stage']: stage for stage in job['stages']}
+            if stages['validation']['started_at'] is not None:
+                samples['queue_wait'].append(stages['validation']['started_at'] - job['created_at'])
+            samples['job'].append(job['updated_at'] - job['created_at'])
+            for name, stage in stages.items():
+                if stage['status'] == 'done':
+                    samples[name].append(stage['duration_ms'] / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(args.clients)])
+    elapsed = time.perf_counter() - started
+
+    # the overall feedback endpoint on its own, once per processed attempt (see `FakeSchema.seed`)
+    attempts = [f'user{number}' for number in range(min(len(payloads), args.overall_requests))]
+
+    async def overall_client():
+        while attempts:
+            user_id = attempts.pop(0)
+            started = time.perf_counter()
+            await asgi_request(main.app, 'POST', '/test-level-feedback',
+                               {'user_id': user_id, 'test_id': 't1', 'attempt_no': 1, 'course_id': 'c1'})
+            samples['overall_feedback_request'].append(time.perf_counter() - started)
+
+    await asyncio.gather(*[overall_client() for _ in range(args.clients)])
+    return summarise(samples), {**outcomes, 'seconds': elapsed, 'jobs_per_second': outcomes['done'] / elapsed,
+                                'questions_per_second': outcomes['done'] * args.questions / elapsed}
+
+
+def report(results: dict, throughput: dict, counters: dict) -> None:
+    print(f"{'stage':32} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  measured as")
+    for stage, measured in STAGES.items():
+        if stage in results:
+            row = results[stage]
+            print(f"{stage:32} {row['count']:6} {row['p50'] * 1e3:9.1f} {row['p95'] * 1e3:9.1f} "
+                  f"{row['p99'] * 1e3:9.1f}  {measured}")
+    print(f"jobs done={throughput['done']} failed={throughput['failed']} rejected={throughput['rejected']} "
+          f"in {throughput['seconds']:.2f}s: {throughput['jobs_per_second']:.2f} jobs/s, "
+          f"{throughput['questions_per_second']:.1f} questions/s")
+    print(f"fake calls: {counters}")
+
+
+def compare(baseline: dict, run: dict, tolerance: float, noise_ms: float) -> bool:
+    """
+    Prints the p95 of each stage and the throughput against the baseline, returns False on a regression:
+    a p95 longer by more than `tolerance` and `noise_ms`, or a throughput lower by more than `tolerance`.
+    """
+    if baseline['config'] != run['config']:
+        print(f"warning: the baseline was run with a different configuration: {baseline['config']}")
+    ok = True
+    print(f"{'':32} {'baseline':>10} {'now':>10} {'change':>8}")
+    rows = [(f"{stage} p95 ms", baseline['stages'][stage]['p95'] * 1e3, run['stages'][stage]['p95'] * 1e3, False)
+            for stage in STAGES if stage in baseline['stages'] and stage in run['stages']]
+    rows.append(('jobs/s', baseline['throughput']['jobs_per_second'], run['throughput']['jobs_per_second'], True))
+    for name, before, now, higher_is_better in rows:
+        change = (now - before) / before if before else 0.0
+        if higher_is_better:
+            regressed = -change > tolerance
+        else:
+            regressed = change > tolerance and now - before > noise_ms
+        ok = ok and not regressed
+        print(f"{name:32} {before:10.2f} {now:10.2f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main(args) -> int:
+    config = {key: getattr(args, key) for key in ('jobs', 'clients', 'questions', 'workers', 'transcription_latency',
+                                                  'llm_latency', 'db_latency', 'jitter', 'error_rate',
+                                                  'overall_requests', 'env')}
+    directory = tempfile.mkdtemp(prefix='load_test_')
+    # read by main at import, the .env files do not override them
+    os.environ.update(APP_ENV)
+    os.environ.update(JOB_QUEUE_PATH=os.path.join(directory, 'job_queue.db'), JOB_QUEUE_WORKERS=str(args.workers),
+                      LOG_DIR=os.path.join(directory, 'logs'), METRICS_MULTIPROC_DIR=os.path.join(directory, 'metrics'))
+    os.environ.update(dict(setting.split('=', 1) for setting in args.env))
+
+    db_schema = FakeSchema()
+    payloads = db_schema.seed(attempts=args.jobs, questions=args.questions)
+    llm = FakeLLM(Latency(args.llm_latency, args.jitter, seed=1), error_rate=args.error_rate)
+    transcription = FakeTranscription(Latency(args.transcription_latency, args.jitter, seed=2), llm,
+                                      error_rate=args.error_rate)
+
+    import main as app_module
+    app_module.question_pipeline.process_task = transcription.process_task
+    app_module.question_pipeline.feedback_provider = llm.question_feedback
+    app_module.genai_overall_feedback = llm.overall_feedback
+
+    async def run():
+        with fake_db(latency=args.db_latency, responder=db_schema) as connection, \
+                patch.object(app_module, 'init_pool'), patch.object(app_module, 'close_pool'):
+            await app_module.startup_event()
+            try:
+                results, throughput = await run_load(app_module, args, payloads)
+            finally:
+                await app_module.shutdown_event()
+        return results, throughput, {'transcription': transcription.calls, 'llm': llm.calls,
+                                     'db_statements': len(connection.statements),
+                                     'db_unmatched': sum(db_schema.unmatched.values())}
+
+    results, throughput, counters = asyncio.run(run())
+    report(results, throughput, counters)
+    run_record = {'config': config, 'stages': results, 'throughput': throughput,
+                  'python': sys.version.split()[0], 'machine': platform.machine(), 'cpus': os.cpu_count(),
+                  'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or '.', exist_ok=True)
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(run_record, baseline_file, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            if not compare(json.load(baseline_file), run_record, args.tolerance, args.noise_ms):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=40, help='batches submitted, one attempt each')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--questions', type=int, default=10, help='questions per batch')
+    parser.add_argument('--workers', type=int, default=2, help='job consumers (JOB_QUEUE_WORKERS)')
+    parser.add_argument('--transcription-latency', type=float, default=0.2, help='seconds per transcription')
+    parser.add_argument('--llm-latency', type=float, default=0.3, help='seconds per LLM call')
+    parser.add_argument('--db-latency', type=float, default=0.002, help='seconds per SQL statement')
+    parser.add_argument('--jitter', type=float, default=0.3, help='latency spread, fraction of the mean')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='failure rate of the fake providers')
+    parser.add_argument('--overall-requests', type=int, default=10, help='direct /test-level-feedback calls')
+    parser.add_argument('--poll', type=float, default=0.02, help='seconds between job status polls')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='app setting override')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression, fraction')
+    parser.add_argument('--noise-ms', type=float, default=25, help='p95 increases ignored below this')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,52 @@
+"""
+Silence detection of `MediaPreprocessor` on generated answers: a spoken-like answer video, a silent one
+and a too short one. Prints the measured duration and silence, the short circuit decision and the time
+it takes.
+
+    python -m benchmarks.media_preprocess --ffmpeg ffmpeg --seconds 60
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import tempfile
+from src.utils.media import MediaPreprocessor
+
+# lavfi sources of the generated answers, a modulated tone stands in for speech
+ANSWERS = {
+    'voiced': 'sine=frequency=220:sample_rate=48000,volume=0.5*(1+sin(2*PI*t/3)):eval=frame',
+    'silent': 'anullsrc=channel_layout=stereo:sample_rate=48000',
+}
+
+
+def make_answer(ffmpeg: str, path: str, audio: str, seconds: float) -> None:
+    subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+                    '-f', 'lavfi', '-i', f'{audio},atrim=duration={seconds}',
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '1500k',
+                    '-c:a', 'aac', '-b:a', '128k', '-ac', '2', '-shortest', path], check=True)
+
+
+async def run(ffmpeg: str, seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        answers = {'voiced': (ANSWERS['voiced'], seconds), 'silent': (ANSWERS['silent'], seconds),
+                   'too_short': (ANSWERS['voiced'], 0.5)}
+        preprocessor = MediaPreprocessor(ffmpeg=ffmpeg)
+        for name, (audio, duration) in answers.items():
+            path = os.path.join(directory, f'{name}.mp4')
+            make_answer(ffmpeg, path, audio, duration)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            media = await preprocessor.prepare(path)
+            elapsed = loop.time() - started
+            print(f"{name:9}: {media['duration']:6.2f}s ({media['silence']:6.2f}s silent), "
+                  f"decision={media['short_circuit'] or 'transcribe'}, {elapsed * 1e3:7.1f} ms")
+        print(preprocessor.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--seconds', type=float, default=60)
+    args = parser.parse_args()
+    asyncio.run(run(args.ffmpeg, args.seconds))
@@ -0,0 +1,52 @@
+"""
+Per-question cost of building the feedback prompt: the config file read and parsed for every question
+and the prompt formatted from the raw template (previous behaviour), against the compiled prompts of
+the config registry.
+
+    python -m benchmarks.prompt_building --questions 2000
+"""
+import argparse
+import os
+import time
+from src.utils.common import read_yaml
+from src.utils.config_registry import ConfigRegistry
+
+CONFIG_PATH = os.path.join('configs', 'feedback_config.yml')
+QUESTION = 'Explain the difference between overfitting and underfitting and how you would detect each.'
+RESPONSE = 'Overfitting is when the model memorises the training data and fails to generalise. ' * 20
+
+
+def per_call_yaml() -> str:
+    config = read_yaml(CONFIG_PATH)
+    return ' '.join(config['prompt']).format(question=QUESTION, candidate_response=RESPONSE,
+                                             expected_output_format=config['expected_output_format'][0])
+
+
+def timed(func, questions: int) -> float:
+    started = time.perf_counter()
+    for _ in range(questions):
+        func()
+    return (time.perf_counter() - started) / questions
+
+
+def main(questions: int) -> None:
+    registry = ConfigRegistry(CONFIG_PATH)
+    watched = ConfigRegistry(CONFIG_PATH, check_interval=0)
+    assert registry.render('question_feedback', question=QUESTION, candidate_response=RESPONSE) == per_call_yaml()
+    results = {
+        'read_yaml + str.format per question ': timed(per_call_yaml, questions),
+        'registry, mtime checked every call  ': timed(lambda: watched.render(
+            'question_feedback', question=QUESTION, candidate_response=RESPONSE), questions),
+        'registry, mtime checked every 5s    ': timed(lambda: registry.render(
+            'question_feedback', question=QUESTION, candidate_response=RESPONSE), questions),
+    }
+    print(f"{questions} questions, config version {registry.version}")
+    for name, seconds in results.items():
+        print(f"{name} : {seconds * 1e6:9.1f} us per question")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.questions)
@@ -0,0 +1,125 @@
+"""
+Startup time and memory per worker of the server process models (Linux only, reads /proc):
+
+    uvicorn           `uvicorn --workers N`, every worker is spawned and imports the app itself
+    gunicorn          gunicorn without preload, every forked worker imports the app itself
+    gunicorn-preload  gunicorn.conf.py as deployed, the master imports the app once and forks
+
+Startup is the time until every worker answers `/health/live`. PSS splits the pages shared between
+processes across them, so it shows what copy-on-write saves where RSS counts shared pages in every worker.
+
+    python -m benchmarks.server_startup --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+MODES = ('uvicorn', 'gunicorn', 'gunicorn-preload')
+
+
+def command(mode: str, app: str, port: int, workers: int) -> tuple[list[str], dict]:
+    env = {**os.environ, 'SERVER_BIND': f'127.0.0.1:{port}', 'SERVER_WORKERS': str(workers),
+           'SERVER_PRELOAD': 'true' if mode == 'gunicorn-preload' else 'false'}
+    if mode == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', app, '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning'], env
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', app], env
+
+
+def descendants(pid: int) -> list[int]:
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    found, pending = [], [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def memory_kb(pid: int) -> tuple[int, int]:
+    """
+    (RSS, PSS) of a process in kB.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def served_by_workers(port: int, workers: int, deadline: float) -> bool:
+    # connections are spread over the workers, keep asking until as many distinct pids answered
+    pids = set()
+    while time.monotonic() < deadline and len(pids) < workers:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health/live', timeout=1) as response:
+                pids.add(json.load(response)['pid'])
+        except OSError:
+            time.sleep(0.05)
+    return len(pids) >= workers
+
+
+def measure(mode: str, app: str, port: int, workers: int, timeout: float) -> dict:
+    cmd, env = command(mode, app, port, workers)
+    started = time.monotonic()
+    server = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not served_by_workers(port, workers, started + timeout):
+            return {'mode': mode, 'error': f'workers not serving after {timeout}s'}
+        startup = time.monotonic() - started
+        time.sleep(1)  # let lazily started threads settle
+        processes = [server.pid] + descendants(server.pid)
+        usage = [memory_kb(pid) for pid in processes]
+        worker_usage = usage[1:] or usage
+        return {
+            'mode': mode,
+            'startup_seconds': startup,
+            'processes': len(processes),
+            'total_rss_mb': sum(rss for rss, _ in usage) / 1024,
+            'total_pss_mb': sum(pss for _, pss in usage) / 1024,
+            'worker_pss_mb': sum(pss for _, pss in worker_usage) / len(worker_usage) / 1024,
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main(app: str, port: int, workers: int, modes: list[str], timeout: float) -> None:
+    print(f"app={app} workers={workers}")
+    for mode in modes:
+        result = measure(mode, app, port, workers, timeout)
+        if 'error' in result:
+            print(f"{mode:17}: {result['error']}")
+            continue
+        print(f"{mode:17}: startup {result['startup_seconds']:6.2f} s, {result['processes']} processes, "
+              f"RSS {result['total_rss_mb']:7.1f} MB, PSS {result['total_pss_mb']:7.1f} MB, "
+              f"PSS per worker {result['worker_pss_mb']:6.1f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', default='main:app')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+    main(args.app, args.port, args.workers, args.modes, args.timeout)
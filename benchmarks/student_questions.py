@@ -0,0 +1,47 @@
+"""
+Compares the per-row and the set-based `update_student_questions` against a fake MySQL
+connection that charges `--latency` seconds per round trip.
+
+    python -m benchmarks.student_questions --sizes 10 50 200 --latency 0.002
+"""
+import argparse
+import time
+from src.utils import db_ops
+from benchmarks.fakes import fake_db
+
+
+def per_row_update(results: list[dict], connection) -> None:
+    """
+    The previous implementation: one UPDATE with five correlated subqueries per s_question_id.
+    """
+    with connection.cursor() as cursor:
+        for result in results:
+            s_question_id = result.get("s_question_id")
+            cursor.execute("UPDATE student_questions AS sq SET ... WHERE sq.s_question_id = %s", (s_question_id,) * 6)
+    connection.commit()
+
+
+def main(sizes: list[int], latency: float) -> None:
+    print(f"{'batch':>6} {'per-row stmts':>14} {'per-row ms':>11} {'batched stmts':>14} {'batched ms':>11}")
+    for size in sizes:
+        results = [{'s_question_id': i} for i in range(size)]
+        with fake_db(latency=latency) as connection:
+            started = time.perf_counter()
+            per_row_update(results, connection)
+            per_row_ms = (time.perf_counter() - started) * 1000
+            per_row_statements = len(connection.statements)
+
+        with fake_db(latency=latency) as connection:
+            started = time.perf_counter()
+            db_ops.update_student_questions(results, {})
+            batched_ms = (time.perf_counter() - started) * 1000
+            batched_statements = len(connection.statements)
+        print(f"{size:>6} {per_row_statements:>14} {per_row_ms:>11.1f} {batched_statements:>14} {batched_ms:>11.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--latency', type=float, default=0.002)
+    args = parser.parse_args()
+    main(args.sizes, args.latency)
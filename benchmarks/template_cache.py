@@ -0,0 +1,52 @@
+"""
+Per-submission cost of resolving the section index of a test template, with and without `template_cache`.
+
+    python -m benchmarks.template_cache --sections 10 --questions 50 --latency 0.002 --submissions 200
+"""
+import argparse
+import json
+import time
+from src.utils import db_ops
+from benchmarks.fakes import FakeConnection
+
+
+def make_template(sections: int, questions: int) -> str:
+    return json.dumps({
+        'sections': [{'name': f'section {s}'} for s in range(sections)],
+        'questions': [{'sectionName': f'section {s}', 'questionList': [f'q{s}_{q}' for q in range(questions)]}
+                      for s in range(sections)],
+    })
+
+
+def main(sections: int, questions: int, latency: float, submissions: int) -> None:
+    template_data = make_template(sections, questions)
+    connection = FakeConnection(latency=latency,
+                                responder=lambda query, params, dictionary: [{'template_data': template_data}])
+
+    with connection.cursor(dictionary=True) as cursor:
+        started = time.perf_counter()
+        for _ in range(submissions):
+            db_ops.template_cache.invalidate()
+            db_ops.get_test_template_index(cursor, 't1')
+        uncached = (time.perf_counter() - started) / submissions
+
+        db_ops.template_cache.invalidate()
+        started = time.perf_counter()
+        for _ in range(submissions):
+            db_ops.get_test_template_index(cursor, 't1')
+        cached = (time.perf_counter() - started) / submissions
+
+    print(f"template: {sections} sections x {questions} questions, fetch latency {latency}s")
+    print(f"per submission without cache : {uncached * 1e6:10.1f} us")
+    print(f"per submission with cache    : {cached * 1e6:10.1f} us")
+    print(f"cache stats                  : {db_ops.template_cache.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--submissions', type=int, default=200)
+    args = parser.parse_args()
+    main(args.sections, args.questions, args.latency, args.submissions)
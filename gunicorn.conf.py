@@ -1,12 +1,64 @@
-# Gunicorn configuration file
+# Gunicorn configuration file, the production entrypoint: gunicorn -c gunicorn.conf.py main:app
+import gc
 import multiprocessing
+from src.secrets.load_keys import LoadSecret
 
-max_requests = 1000
-max_requests_jitter = 50
+load_secret_instance = LoadSecret()
+
+bind = load_secret_instance.get_secret('SERVER_BIND', '0.0.0.0:8080')
+
+worker_class = "uvicorn.workers.UvicornWorker"
+# the app is async, one worker per core serves it, each worker opens its own MySQL pool
+workers = int(load_secret_instance.get_secret('SERVER_WORKERS', 0)) or multiprocessing.cpu_count()
+
+# import the app (langchain, assemblyai, boto3, google-cloud) once in the master, workers share it copy-on-write
+preload_app = load_secret_instance.get_secret('SERVER_PRELOAD', 'true').lower() == 'true'
+
+# kept above the idle timeout of the load balancer, so it never reuses a connection the worker closed
+keepalive = int(load_secret_instance.get_secret('SERVER_KEEPALIVE', 75))
+timeout = int(load_secret_instance.get_secret('SERVER_TIMEOUT', 120))
+# a stopping worker drains its in-flight jobs (JOB_QUEUE_DRAIN_TIMEOUT) before it is killed
+graceful_timeout = int(load_secret_instance.get_secret('SERVER_GRACEFUL_TIMEOUT', 330))
+
+# off by default: health and metrics polls count as requests, and every recycle drains or redoes the
+# worker's in-flight jobs. Set it only to contain a leak.
+max_requests = int(load_secret_instance.get_secret('SERVER_MAX_REQUESTS', 0))
+max_requests_jitter = int(load_secret_instance.get_secret('SERVER_MAX_REQUESTS_JITTER', 50))
 
 log_file = "-"
 
-bind = "0.0.0.0:3100"
 
-worker_class = "uvicorn.workers.UvicornWorker"
-workers = (multiprocessing.cpu_count() * 2) + 1
\ No newline at end of file
+def when_ready(server):
+    """
+    Move the preloaded objects out of the garbage collector's reach before forking, so collections
+    in the workers do not touch (and copy) the pages they share with the master.
+    """
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    """
+    Release the worker's pooled MySQL connections when it exits, including `max_requests` recycling.
+    """
+    from src.utils.db_pool import close_pool
+    close_pool()
+
+
+def on_starting(server):
+    """
+    Start from empty metrics snapshots, the workers of a previous run are gone.
+    """
+    directory = load_secret_instance.get_secret('METRICS_MULTIPROC_DIR')
+    if directory:
+        from src.utils.metrics import clear_multiprocess_dir
+        clear_multiprocess_dir(directory)
+
+
+def child_exit(server, worker):
+    """
+    Drop the gauges of an exited worker from the combined metrics, its counters stay in the totals.
+    """
+    directory = load_secret_instance.get_secret('METRICS_MULTIPROC_DIR')
+    if directory:
+        from src.utils.metrics import mark_process_dead
+        mark_process_dead(directory, worker.pid)
@@ -1,20 +1,46 @@
-from src.utils.api_validation import validate_api_data_nontech
+from src.utils.api_validation import validate_api_data_nontech, validate_api_data_model
 import os
 from dotenv import load_dotenv
 from src.neoscreener.process_pipeline import *
-from src.neoscreener.overall_feedback import OverallFeedbackPipeline
 from src.neoscreener.logger import logger
-from fastapi import FastAPI
+from src.neoscreener.candidate_score_feedback import GenAiFeedbackModule
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from src.utils.db_ops import (insert_data_into_mysql, retrieve_student_course_info, update_section_wise_marks, update_student_questions)
-from fastapi import BackgroundTasks
-from src.utils.request_example import OveralFeedback
+from fastapi.responses import JSONResponse
+from langchain_google_genai import ChatGoogleGenerativeAI
+from src.utils.async_db_ops import (retrieve_student_attempts, write_attempt_results,
+                                    get_questions_feedback, update_test_level, shutdown_db_executor)
+from src.utils.batch_feedback import BatchFeedbackGenerator
+from src.utils.config_registry import ConfigRegistry
+from src.utils.db_pool import init_pool, close_pool, pool_stats, ping_database
+from src.utils.db_ops import template_cache, invalidate_test_template, group_by_attempt, ATTEMPT_KEYS
+from src.utils.exceptions import SchedulerSaturatedException, CircuitOpenException, PartialBatchException, ApiValidationException
+from src.utils.feedback_cache import FeedbackCache
+from src.utils.health import (CachedProbe, pool_check, queue_check, reachability_check, worst_status,
+                              OK, DEGRADED, UNAVAILABLE)
+from src.utils.job_queue import SQLiteJobQueue, JobWorkerPool
+from src.utils.job_status import (JobStatusStore, VALIDATION, QUESTION_PROCESSING, DB_WRITE,
+                                  TEST_LEVEL_FEEDBACK)
+from src.utils.media import MediaPreprocessor
+from src.utils.metrics import registry, timed, MAX, LOCAL
+from src.utils.ndjson import iter_ndjson, attempt_boundary
+from src.utils.overall_feedback import parse_overall_feedback
+from src.utils.question_pipeline import QuestionPipeline
+from src.utils.request_example import OveralFeedback, health_check
+from src.utils.resilience import (CircuitBreaker, RetryPolicy, gather_partial, is_transient_error,
+                                  OPEN, HALF_OPEN, CLOSED)
+from src.utils.scheduler import Scheduler, TRANSCRIPTION, GENAI, MEDIA
+from src.utils.transcription_cache import build_transcription_cache
 from src.neoscreener.process_pipeline import process_task
 import uvicorn
 from typing import List
 import asyncio
-import multiprocessing
+import functools
+import json
+import time
+import uuid
 from src.secrets.load_keys import LoadSecret
+from src import correlation_id
 # initialise app
 app = FastAPI(
     title='Neo screener',
@@ -43,6 +69,41 @@ async def add_security_headers(request, call_next):
     response.headers['X-XSS-Protection'] = '1; mode=block'
     return response
 
+@app.middleware("http")
+async def correlate_request(request, call_next):
+    """
+    Tag every log line of the request with its `X-Request-ID` (generated when absent) and echo it back.
+    """
+    request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    token = correlation_id.set(request_id)
+    try:
+        response = await call_next(request)
+        response.headers['X-Request-ID'] = request_id
+        return response
+    finally:
+        correlation_id.reset(token)
+
+HTTP_REQUESTS = registry.counter('neo_screener_http_requests_total', 'HTTP requests served.',
+                                 ('method', 'route', 'status'))
+HTTP_DURATION = registry.histogram('neo_screener_http_request_duration_seconds', 'HTTP request latency.', ('route',))
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    """
+    Count the requests and their latency per route template, so path parameters do not create series.
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        route = route.path if route is not None else 'unmatched'
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+        HTTP_DURATION.observe(time.perf_counter() - started, route=route)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -61,62 +122,395 @@ db_config = {
     'database':load_secret_instance.get_secret('DATABASE'),
 }
 print(db_config)
-#REF : Please check with business on the response that we send. Since running as background proccess giving 200 will not be useful.
+
+FEEDBACK_CONFIG_PATH = os.path.join('configs', 'feedback_config.yml')
+# prompts validated and compiled once per version of the file, edits are picked up without a restart
+feedback_config = ConfigRegistry(FEEDBACK_CONFIG_PATH,
+                                 check_interval=float(load_secret_instance.get_secret('FEEDBACK_CONFIG_RELOAD_INTERVAL', 5)))
+
+# `pydantic` validates the payload with the `neo_screener` model, faster on large batches
+validate_api_data = (validate_api_data_model
+                     if load_secret_instance.get_secret('API_VALIDATION_BACKEND', 'jsonschema') == 'pydantic'
+                     else validate_api_data_nontech)
+
+job_queue = SQLiteJobQueue(path=load_secret_instance.get_secret('JOB_QUEUE_PATH', 'data/job_queue.db'),
+                           lease_seconds=float(load_secret_instance.get_secret('JOB_QUEUE_LEASE_SECONDS', 900)),
+                           max_attempts=int(load_secret_instance.get_secret('JOB_QUEUE_MAX_ATTEMPTS', 3)),
+                           retry_delay=float(load_secret_instance.get_secret('JOB_QUEUE_RETRY_DELAY', 30)),
+                           retention_seconds=float(load_secret_instance.get_secret('JOB_QUEUE_RETENTION_SECONDS', 604800)))
+job_status = JobStatusStore(path=job_queue.path)
+job_queue_max_depth = int(load_secret_instance.get_secret('JOB_QUEUE_MAX_DEPTH', 500))
+stream_chunk_size = int(load_secret_instance.get_secret('STREAM_CHUNK_SIZE', 50))
+stream_max_chunk_size = int(load_secret_instance.get_secret('STREAM_MAX_CHUNK_SIZE', 200))
+stream_max_line_bytes = int(load_secret_instance.get_secret('STREAM_MAX_LINE_BYTES', 64 * 1024))
+stream_max_reported_errors = 1000
+scheduler_max_waiting = int(load_secret_instance.get_secret('SCHEDULER_MAX_WAITING', 200))
+# a TRANSCRIPTION slot also holds the Gemini request of process_task: size TRANSCRIPTION + GENAI, times the
+# gunicorn workers, to the Gemini quota, and TRANSCRIPTION alone to the transcription provider's
+scheduler = Scheduler({
+    TRANSCRIPTION: (int(load_secret_instance.get_secret('SCHEDULER_TRANSCRIPTION_CONCURRENCY', 8)), scheduler_max_waiting),
+    GENAI: (int(load_secret_instance.get_secret('SCHEDULER_GENAI_CONCURRENCY', 4)), scheduler_max_waiting),
+    MEDIA: (int(load_secret_instance.get_secret('SCHEDULER_MEDIA_CONCURRENCY', 4)), scheduler_max_waiting),
+})
+
+def build_retry_policy(provider: str, retryable=None) -> RetryPolicy:
+    """
+    Retry policy and circuit breaker of one external provider, configured from the env.
+    """
+    breaker = CircuitBreaker(provider,
+                             failure_threshold=int(load_secret_instance.get_secret('BREAKER_FAILURE_THRESHOLD', 5)),
+                             reset_timeout=float(load_secret_instance.get_secret('BREAKER_RESET_TIMEOUT', 60)))
+    return RetryPolicy(breaker,
+                       attempts=int(load_secret_instance.get_secret('RETRY_ATTEMPTS', 3)),
+                       base_delay=float(load_secret_instance.get_secret('RETRY_BASE_DELAY', 1)),
+                       max_delay=float(load_secret_instance.get_secret('RETRY_MAX_DELAY', 20)),
+                       retryable=retryable)
+
+# a provider request is retried, and counted against the circuit, only for timeouts, 429 and 5xx: a
+# transcription retry runs the whole process_task again (download, transcription and LLM request)
+transcription_policy = build_retry_policy(TRANSCRIPTION, retryable=is_transient_error)
+genai_policy = build_retry_policy(GENAI, retryable=is_transient_error)
+
+transcription_cache = None
+if load_secret_instance.get_secret('TRANSCRIPTION_CACHE_ENABLED', 'true').lower() == 'true':
+    transcription_cache = build_transcription_cache(
+        backend=load_secret_instance.get_secret('TRANSCRIPTION_CACHE_BACKEND', 'sqlite'),
+        path=load_secret_instance.get_secret('TRANSCRIPTION_CACHE_PATH', 'data/transcription_cache.db'),
+        max_bytes=int(load_secret_instance.get_secret('TRANSCRIPTION_CACHE_MAX_BYTES', 512 * 1024 * 1024)))
+
+feedback_cache = None
+if load_secret_instance.get_secret('FEEDBACK_CACHE_ENABLED', 'true').lower() == 'true':
+    feedback_cache = FeedbackCache(
+        path=load_secret_instance.get_secret('FEEDBACK_CACHE_PATH', 'data/feedback_cache.db'),
+        # checks the config file on every lookup (at most every reload interval), feedback of a previous
+        # prompt version is never served again
+        prompt_version=lambda: feedback_config.version,
+        max_entries=int(load_secret_instance.get_secret('FEEDBACK_CACHE_MAX_ENTRIES', 100000)),
+        ttl=float(load_secret_instance.get_secret('FEEDBACK_CACHE_TTL', 30 * 24 * 3600)))
+
+@functools.cache
+def genai_llm() -> ChatGoogleGenerativeAI:
+    # built on first use in each worker, the gRPC/HTTP client of one built in the preloading gunicorn
+    # master would be shared across fork
+    return ChatGoogleGenerativeAI(model=load_secret_instance.get_secret('GENAI_MODEL', 'gemini-1.5-flash'),
+                                  google_api_key=load_secret_instance.get_secret('GEMINI_API_KEY'),
+                                  temperature=0)
+
+os.register_at_fork(after_in_child=genai_llm.cache_clear)
+
+def genai_question_feedback(question: str, transcript: str) -> str:
+    return GenAiFeedbackModule(question, transcript).get_feedback()
+
+def genai_overall_feedback(prompt: str) -> str:
+    return genai_llm().invoke(prompt).content
+
+batch_generator = None
+if load_secret_instance.get_secret('FEEDBACK_BATCH_ENABLED', 'false').lower() == 'true':
+    batch_generator = BatchFeedbackGenerator(
+        llm_call=lambda prompt: genai_llm().invoke(prompt).content,
+        render_prompt=lambda questions: feedback_config.render('batch_feedback', questions=questions),
+        max_questions=int(load_secret_instance.get_secret('FEEDBACK_BATCH_MAX_QUESTIONS', 10)),
+        max_chars=int(load_secret_instance.get_secret('FEEDBACK_BATCH_MAX_CHARS', 24000)))
+
+# opt-in: one ffmpeg decode per answer, worth it when many answers are silent or too short
+media_preprocessor = None
+if load_secret_instance.get_secret('MEDIA_PREPROCESS_ENABLED', 'false').lower() == 'true':
+    ffmpeg_path = load_secret_instance.get_secret('MEDIA_FFMPEG_PATH', 'ffmpeg')
+    if MediaPreprocessor.available(ffmpeg_path):
+        media_preprocessor = MediaPreprocessor(
+            ffmpeg=ffmpeg_path,
+            sample_rate=int(load_secret_instance.get_secret('MEDIA_SAMPLE_RATE', 16000)),
+            silence_threshold_db=float(load_secret_instance.get_secret('MEDIA_SILENCE_THRESHOLD_DB', -40)),
+            min_duration=float(load_secret_instance.get_secret('MEDIA_MIN_DURATION', 1)),
+            min_voiced=float(load_secret_instance.get_secret('MEDIA_MIN_VOICED_SECONDS', 1)),
+            timeout=float(load_secret_instance.get_secret('MEDIA_TIMEOUT', 300)))
+    else:
+        logger.warning(f"{ffmpeg_path} not found, silent answers are transcribed too.")
+
+question_pipeline = QuestionPipeline(
+    scheduler, transcription_policy, genai_policy,
+    process_task=process_task,
+    feedback_provider=genai_question_feedback,
+    db_config=db_config,
+    transcription_cache=transcription_cache,
+    use_content_hash=load_secret_instance.get_secret('TRANSCRIPTION_CACHE_CONTENT_HASH', 'false').lower() == 'true',
+    feedback_cache=feedback_cache,
+    batch_generator=batch_generator,
+    media_preprocessor=media_preprocessor)
+job_workers: JobWorkerPool | None = None
+metrics_flush_interval = float(load_secret_instance.get_secret('METRICS_FLUSH_INTERVAL', 5))
+metrics_flusher: asyncio.Task | None = None
+
+async def flush_metrics():
+    """
+    Keeps this worker's metrics snapshot fresh for the scrapes served by the other workers.
+    """
+    while True:
+        await asyncio.sleep(metrics_flush_interval)
+        try:
+            await asyncio.to_thread(registry.flush, registry.collect())
+        except Exception as e:
+            logger.warning(f"Metrics snapshot not written: {e}")
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Build the process wide MySQL connection pool and start the job consumers once per worker.
+    """
+    global job_workers, metrics_flusher
+    init_pool(db_config,
+              pool_size=int(load_secret_instance.get_secret('MY_SQL_POOL_SIZE', 5)),
+              timeout=float(load_secret_instance.get_secret('MY_SQL_POOL_TIMEOUT', 30)))
+    job_workers = JobWorkerPool(job_queue, process_data,
+                                concurrency=int(load_secret_instance.get_secret('JOB_QUEUE_WORKERS', 2)),
+                                poll_interval=float(load_secret_instance.get_secret('JOB_QUEUE_POLL_INTERVAL', 1)),
+                                admit=lambda: not scheduler.saturated(),
+                                permanent_errors=(ApiValidationException,),
+                                on_purge=job_status.forget)
+    job_workers.start()
+    if registry.multiprocess_dir:
+        metrics_flusher = asyncio.create_task(flush_metrics())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Drain the in-flight jobs, then release the pooled connections when the worker stops or is
+    recycled after `max_requests`.
+    """
+    if job_workers is not None:
+        await job_workers.stop(drain_timeout=float(load_secret_instance.get_secret('JOB_QUEUE_DRAIN_TIMEOUT', 300)))
+    # waits for the running DB calls, off the event loop
+    await asyncio.to_thread(shutdown_db_executor)
+    close_pool()
+    if metrics_flusher is not None:
+        metrics_flusher.cancel()
+        # the counts of the last jobs stay in the totals once the worker is gone
+        registry.flush()
+
 @app.post("/neo-screener")
-async def screener(data: List[dict], background_tasks: BackgroundTasks):
+async def screener(data: List[dict]):
+    """
+    API end point to accept the data and persist it in the job queue, the job consumers process it.
+    The returned job id can be polled on `/neo-screener/jobs/{job_id}`.
+    Answers 422 with the schema errors when the payload is invalid, nothing is queued then,
+    and 503 when the worker is saturated instead of piling up work.
+    """
+    with timed(VALIDATION):
+        validation_status, message = await asyncio.to_thread(validate_api_data, data)
+    if not validation_status:
+        return JSONResponse(status_code=422, content={"message": f"Data is not up to the agreed format.\n{message}"})
+    try:
+        if scheduler.saturated() or await asyncio.to_thread(job_queue.depth) >= job_queue_max_depth:
+            return JSONResponse(status_code=503, headers={"Retry-After": "30"},
+                                content={"message": "Neo screener is saturated, retry later"})
+        job_id = await asyncio.to_thread(job_queue.enqueue, data)
+        return {"message": "Data accepted and will be processed later", "job_id": job_id}
+    except Exception as e:
+        logger.exception(f"Error queueing data: {e}")
+        return JSONResponse(status_code=503, content={"message": "Data could not be queued, retry later"})
+
+
+@app.post("/neo-screener/stream")
+async def screener_stream(request: Request):
     """
-    API end point to accept the data and start the processing as a background task.
+    Streaming variant of `/neo-screener` for bulk re-evaluations: the body is NDJSON, one `neo_screener`
+    record per line, grouped by attempt. Lines are parsed and validated as they arrive and queued in jobs of
+    about `STREAM_CHUNK_SIZE` items, so memory stays bounded whatever the payload size. A job is cut where
+    the attempt changes, so the marks and the narrative of an attempt are computed once, from all of its
+    questions. An attempt longer than `STREAM_MAX_CHUNK_SIZE` lines is split.
+    The saturation is checked before every job, ingestion stops with 503 once the worker is saturated.
+    Answers NDJSON: one entry per queued job with its line range, one per invalid line, then a summary.
     """
+    results, chunk, attempt_of = [], [], {}
+    summary = {"lines_queued": 0, "lines_invalid": 0, "jobs": 0}
+    saturated = False
+
+    async def admitted() -> bool:
+        return not scheduler.saturated() and await asyncio.to_thread(job_queue.depth) < job_queue_max_depth
+
+    async def flush(count: int) -> bool:
+        """
+        Queue the first `count` lines of the chunk as one job, False when the worker is saturated.
+        """
+        if not await admitted():
+            return False
+        lines = chunk[:count]
+        job_id = await asyncio.to_thread(job_queue.enqueue, [item for _, item in lines])
+        results.append({"job_id": job_id, "lines": [lines[0][0], lines[-1][0]], "count": len(lines)})
+        summary["lines_queued"] += len(lines)
+        summary["jobs"] += 1
+        del chunk[:count]
+        return True
+
+    async def attempt_cut() -> int:
+        """
+        Lines of the chunk which can be queued without splitting an attempt, 0 to keep reading.
+        """
+        unknown = [item['s_question_id'] for _, item in chunk if item['s_question_id'] not in attempt_of]
+        if unknown:
+            attempts = await retrieve_student_attempts(unknown, db_config=db_config)
+            for s_question_id in unknown:
+                attempt = attempts.get(s_question_id)
+                attempt_of[s_question_id] = tuple(attempt[key] for key in ATTEMPT_KEYS) if attempt else None
+        cut = attempt_boundary([attempt_of[item['s_question_id']] for _, item in chunk])
+        if not cut and len(chunk) >= stream_max_chunk_size:
+            logger.warning(f"Attempt longer than {stream_max_chunk_size} lines, split across jobs.")
+            return len(chunk)
+        return cut
+
+    if not await admitted():
+        return JSONResponse(status_code=503, headers={"Retry-After": "30"},
+                            content={"message": "Neo screener is saturated, retry later"})
     try:
-        background_tasks.add_task(process_data, data)
-        return {"message": "Data accepted and will be processed later"}
-    except:
-        logger.exception(f"Error processing data: {e}")
-    
+        async for line_no, item, errors in iter_ndjson(request.stream(), stream_max_line_bytes):
+            if errors:
+                summary["lines_invalid"] += 1
+                if summary["lines_invalid"] <= stream_max_reported_errors:
+                    results.append({"line": line_no, "errors": errors})
+                continue
+            chunk.append((line_no, item))
+            if len(chunk) >= stream_chunk_size:
+                cut = await attempt_cut()
+                if cut and not await flush(cut):
+                    saturated = True
+                    break
+        if chunk and not saturated and not await flush(len(chunk)):
+            saturated = True
+        if saturated:
+            summary["error"] = "Neo screener is saturated, retry the lines after the last queued job later"
+    except Exception as e:
+        # the jobs queued so far stay queued, the caller resumes after the last reported line range
+        logger.exception(f"Error queueing streamed data: {e}")
+        summary["error"] = "Data could not be queued, retry the lines after the last queued job"
+    results.append({"summary": summary})
+    return Response(content=''.join(json.dumps(result) + '\n' for result in results),
+                    media_type="application/x-ndjson", status_code=503 if "error" in summary else 200,
+                    headers={"Retry-After": "30"} if saturated else None)
 
 
-async def process_data(data: List[dict]):
+@app.get("/neo-screener/jobs/{job_id}")
+async def screener_job_status(job_id: str):
+    """
+    Delivery state of a submitted batch and the progress and timings of each of its pipeline stages.
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": f"Job {job_id} not found"})
+    job['stages'] = await asyncio.to_thread(job_status.get_stages, job_id)
+    return job
+
+
+async def process_data(data: List[dict], job_id: str | None = None):
     """
     This handles the asychronous processing of the tasks.
+    Delivery from the job queue is at-least-once, reprocessing a batch is safe as every write is an upsert.
+    The progress of each stage is recorded against `job_id` when the batch comes from the job queue.
     """
-    validation_status, message = validate_api_data_nontech(data=data)
+    # every log line of the job, down to process_task and the db_ops calls, carries the job id
+    token = correlation_id.set(job_id) if job_id else None
+    if job_id:
+        await job_status.start_job(job_id)
+    try:
+        async with job_status.stage(job_id, VALIDATION):
+            with timed(VALIDATION):
+                validation_status, message = validate_api_data(data)
+            if not validation_status:
+                # checked before queueing already, redelivering the job cannot make it valid
+                raise ApiValidationException(message)
 
-    if validation_status:
         try:
-            tasks = [process_task(doc) for doc in data]
-            responses = await asyncio.gather(*tasks)
-            status:bool = insert_data_into_mysql(json_array=responses, db_config=db_config)
-            if status:
-                # Call test-level-feedback after processing neo-screener tasks
-                response_overall_feedback = retrieve_student_course_info(results=responses,db_config=db_config)
-                await update_student_questions(results=responses, db_config=db_config)
-                feedback_data = OveralFeedback(
-                    user_id=response_overall_feedback['user_id'],  # Assuming you have this information in responses
-                    test_id=response_overall_feedback['t_id'],  # Adjust according to your data structure
-                    attempt_no=response_overall_feedback['attempt_no'],  # Adjust according to your data structure
-                    course_id=response_overall_feedback['c_id']  # Adjust according to your data structure
-                )
-            await test_level_feedback(feedback_data)
-            await update_section_wise_marks(db_config, feedback_data.test_id)
+            submission_id = job_id or str(uuid.uuid4())
+            async with job_status.stage(job_id, QUESTION_PROCESSING, total=len(data)) as progress:
+                # a replayed batch reuses its stored / cached transcripts instead of transcribing again
+                known = await question_pipeline.known_transcripts(data)
+                # opt-in: one LLM request per chunk of known transcripts instead of one per question
+                feedbacks = await question_pipeline.batch_feedback(data, known, submission_id)
+                async def run_task(doc):
+                    response = await question_pipeline.process(doc, submission_id, known, feedbacks)
+                    await progress.advance()
+                    return response
+                # a failing question must not cost the questions which completed
+                responses, errors = await gather_partial(*[run_task(doc) for doc in data])
+            failed = [data[index].get('s_question_id') for index, _ in errors]
+            for index, error in errors:
+                logger.error(f"Question {data[index].get('s_question_id')} failed: {error!r}")
+            if not responses:
+                raise PartialBatchException(failed, len(data))
+
+            # resolve the attempt of every question in one query, a batch may span several attempts
+            attempts = await retrieve_student_attempts([response.get('s_question_id') for response in responses],
+                                                       db_config=db_config)
+            attempt_groups = group_by_attempt(responses, attempts)
+            without_attempt = [response for response in responses if response.get('s_question_id') not in attempts]
+            writes = [(dict(zip(ATTEMPT_KEYS, attempt)), results) for attempt, results in attempt_groups.items()]
+            if without_attempt:
+                writes.append((None, without_attempt))
+
+            # each attempt's rows, question marks and attempt marks are written on one connection with
+            # one commit, a reader never sees the new rows with the previous marks
+            async with job_status.stage(job_id, DB_WRITE, total=len(responses)) as progress:
+                async def write_attempt(attempt, results):
+                    await write_attempt_results(results, db_config, attempt)
+                    await progress.advance(len(results))
+                await asyncio.gather(*[write_attempt(attempt, results) for attempt, results in writes])
+
+            # the LLM narrative of each attempt of the batch, from the question feedback written above
+            if attempt_groups:
+                feedbacks_data = [OveralFeedback(user_id=user_id, test_id=t_id, attempt_no=attempt_no, course_id=c_id)
+                                  for user_id, t_id, c_id, attempt_no in attempt_groups]
+                async with job_status.stage(job_id, TEST_LEVEL_FEEDBACK, total=len(feedbacks_data)) as progress:
+                    async def attempt_feedback(feedback_data):
+                        # a failure fails the stage, the job queue retries the batch
+                        await generate_overall_feedback(feedback_data, admitted=True)
+                        await progress.advance()
+                    await asyncio.gather(*[attempt_feedback(feedback_data) for feedback_data in feedbacks_data])
+            else:
+                logger.warning(f"No student attempt found for the batch, skipping marks and test level feedback.")
+
+            if errors:
+                # completed questions are persisted, the job queue retries the batch for the failed ones
+                raise PartialBatchException(failed, len(data))
         except Exception as e:
             logger.exception(f"Error processing data: {e}")
-    else:
-        return {"message": f"Data is not up to the agreed format.\n{message}"}
-    
+            raise  # the job queue retries the batch
+    finally:
+        if job_id:
+            await job_status.finish_job(job_id)
+        if token is not None:
+            correlation_id.reset(token)
+
+@timed('overall_feedback')
+async def generate_overall_feedback(data: OveralFeedback, admitted: bool = False) -> None:
+    """
+    Writes the LLM narrative of an attempt from its stored question feedback, raises on any failure.
+    `admitted` work (a job already running) waits for the GenAI limiter instead of being shed.
+    """
+    # only the LLM request goes through the GenAI retry policy: a MySQL error or an attempt without
+    # rated question fails once, without another LLM request and without counting against the circuit
+    question_feedback = await get_questions_feedback(data.test_id, data.attempt_no, data.user_id, db_config)
+    if not question_feedback.strip():
+        raise LookupError("No question feedback found for the given user, test, and attempt number.")
+    prompt = feedback_config.render('overall_feedback', question_feedback=question_feedback)
+    run = scheduler.run_admitted if admitted else scheduler.run
+    answer = await genai_policy.call(run, GENAI, f"{data.user_id}:{data.test_id}:{data.attempt_no}",
+                                     asyncio.to_thread, genai_overall_feedback, prompt)
+    await update_test_level(db_config, data.user_id, data.test_id, data.course_id, data.attempt_no,
+                            parse_overall_feedback(answer))
+
+
 @app.post('/test-level-feedback')
-async def test_level_feedback(data:OveralFeedback)->None:
+async def test_level_feedback(data:OveralFeedback):
     try:
-       # logger.info(f"STARTING OVERALL FEEDBACKKKKKKK {data}")
-    #    OverallFeedbackPipeline.process_pipeline(data)
-        result=OverallFeedbackPipeline(data.user_id,
-                              data.test_id,
-                             data.attempt_no,
-                             data.course_id,
-                             db_config)
-        result.process_pipeline()
+        await generate_overall_feedback(data)
         return {"message": "Overall feedback processed successfully"}
+    except (SchedulerSaturatedException, CircuitOpenException) as e:
+        logger.warning(f"Overall feedback refused: {e}")
+        return JSONResponse(status_code=503, headers={"Retry-After": "30"}, content={"message": str(e)})
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"message": str(e)})
     except Exception as e:
         logger.exception(f"Error processing data:{e}")
+        return JSONResponse(status_code=500, content={"message": "Overall feedback could not be generated."})
 
 
 @app.get("/status")
@@ -124,10 +518,168 @@ async def root():
     return {"message": "Neo screener is running", "status": 200}
 
 
+health_probe_ttl = float(load_secret_instance.get_secret('HEALTH_PROBE_TTL', 5))
+health_probe_timeout = float(load_secret_instance.get_secret('HEALTH_PROBE_TIMEOUT', 2))
+health_queue_degraded_depth = int(load_secret_instance.get_secret('HEALTH_QUEUE_DEGRADED_DEPTH',
+                                                                  int(job_queue_max_depth * 0.8)))
+# 503 takes a degraded worker out of rotation, 200 only reports it (body and `X-Health-Status`)
+health_degraded_status_code = int(load_secret_instance.get_secret('HEALTH_DEGRADED_STATUS_CODE', 200))
+provider_hosts = {
+    TRANSCRIPTION: load_secret_instance.get_secret('HEALTH_TRANSCRIPTION_HOST', 'api.assemblyai.com'),
+    GENAI: load_secret_instance.get_secret('HEALTH_GENAI_HOST', 'generativelanguage.googleapis.com'),
+}
+
+def database_check():
+    status, details = pool_check(pool_stats())
+    if status == OK:
+        # a saturated pool is reported as is, never wait for one of its connections
+        ping_database(db_config)
+    return status, details
+
+def provider_probe(name: str, host: str) -> CachedProbe:
+    # reachability changes slowly and costs a connection to the provider, probe it less often
+    return CachedProbe(name, lambda: reachability_check(host, timeout=health_probe_timeout),
+                       ttl=max(health_probe_ttl, 60.0), timeout=health_probe_timeout + 1)
+
+readiness_probes = [
+    CachedProbe('database', database_check, ttl=health_probe_ttl, timeout=health_probe_timeout),
+    CachedProbe('job_queue', lambda: queue_check(job_queue.depth(), health_queue_degraded_depth, job_queue_max_depth),
+                ttl=health_probe_ttl, timeout=health_probe_timeout),
+    *[provider_probe(name, host) for name, host in provider_hosts.items()],
+]
+
+def scheduler_check():
+    """
+    In-memory state of the dependency limiters and circuit breakers, read without probing anything.
+    """
+    stats = scheduler.stats()
+    if scheduler.saturated():
+        return UNAVAILABLE, {'reason': 'dependency waiting room full', 'dependencies': stats}
+    if any(limiter['waiting'] >= limiter['max_waiting'] / 2 for limiter in stats.values()):
+        return DEGRADED, {'reason': 'dependency waiting room filling up', 'dependencies': stats}
+    return OK, {'dependencies': stats}
+
+def circuit_check():
+    states = {policy.breaker.name: policy.breaker.state for policy in (transcription_policy, genai_policy)}
+    if any(state != CLOSED for state in states.values()):
+        return DEGRADED, {'reason': 'provider circuit not closed', 'circuits': states}
+    return OK, {'circuits': states}
+
+
+@app.get("/health/live")
+async def liveness():
+    """
+    The worker's event loop answers and its job consumers are running, restart the worker otherwise.
+    """
+    consumers = job_workers.alive if job_workers is not None else 0
+    if job_workers is not None and consumers == 0:
+        return JSONResponse(status_code=503, content=health_check(
+            status=UNAVAILABLE, pid=os.getpid(), checks={'job_consumers': {'status': UNAVAILABLE, 'alive': 0}}
+        ).model_dump())
+    return health_check(status=OK, pid=os.getpid(), checks={'job_consumers': {'status': OK, 'alive': consumers}})
+
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Whether this worker should receive traffic: DB pool and connectivity, job queue depth, dependency
+    limiters, circuit breakers and provider reachability. Probes are cached and time bounded, so load
+    balancer polling never adds load to the dependencies.
+    Answers 200 when ok, `HEALTH_DEGRADED_STATUS_CODE` when degraded and 503 when unavailable.
+    """
+    results = await asyncio.gather(*[probe.result() for probe in readiness_probes])
+    checks = {probe.name: result for probe, result in zip(readiness_probes, results)}
+    for name, check in (('scheduler', scheduler_check), ('circuit_breakers', circuit_check)):
+        status, details = check()
+        checks[name] = {'status': status, **details}
+    status = worst_status(check['status'] for check in checks.values())
+    status_code = {OK: 200, DEGRADED: health_degraded_status_code}.get(status, 503)
+    return JSONResponse(status_code=status_code, headers={"X-Health-Status": status},
+                        content=health_check(status=status, pid=os.getpid(), checks=checks).model_dump())
+
+
+@app.get("/status/db-pool")
+async def db_pool_status():
+    """
+    Checkout counts and wait times of this worker's MySQL connection pool, used to size it.
+    """
+    return {"pid": os.getpid(), "db_pool": pool_stats()}
+
+
+@app.get("/status/scheduler")
+async def scheduler_status():
+    """
+    In-flight and waiting calls and circuit state per external dependency of this worker, and the job queue depth.
+    """
+    return {"pid": os.getpid(), "scheduler": scheduler.stats(),
+            "circuit_breakers": {policy.breaker.name: {**policy.breaker.stats(), 'retries': policy.retries}
+                                 for policy in (transcription_policy, genai_policy)},
+            "job_queue_depth": await asyncio.to_thread(job_queue.depth)}
+
+
+@app.get("/status/caches")
+async def cache_status():
+    """
+    Hit/miss counters of this worker's in-process caches.
+    """
+    return {"pid": os.getpid(), "template_cache": template_cache.stats(),
+            "transcriptions": question_pipeline.stats(),
+            "feedback_cache": feedback_cache.stats() if feedback_cache is not None else {},
+            "feedback_batches": batch_generator.stats() if batch_generator is not None else {}}
+
+
+@app.get("/status/config")
+async def config_status():
+    """
+    Version (content hash) of the feedback config in use by this worker and its reloads.
+    """
+    return {"pid": os.getpid(), "feedback_config": feedback_config.stats()}
+
+
+# gauges read when /metrics is scraped
+job_queue_depth = {'value': 0}
+CIRCUIT_STATES = {OPEN: 2, HALF_OPEN: 1}
+registry.gauge('neo_screener_job_queue_depth', 'Queued and running jobs.', lambda: job_queue_depth['value'],
+               aggregate=LOCAL)
+registry.gauge('neo_screener_jobs_in_flight', 'Jobs being processed.',
+               lambda: job_workers.in_flight if job_workers is not None else 0)
+registry.gauge('neo_screener_dependency_in_flight', 'Calls in flight per external dependency.',
+               lambda: {(name,): stats['in_flight'] for name, stats in scheduler.stats().items()}, ('dependency',))
+registry.gauge('neo_screener_dependency_waiting', 'Calls waiting for a slot per external dependency.',
+               lambda: {(name,): stats['waiting'] for name, stats in scheduler.stats().items()}, ('dependency',))
+registry.gauge('neo_screener_circuit_state', 'Circuit breaker state per provider (0 closed, 1 half open, 2 open).',
+               lambda: {(policy.breaker.name,): CIRCUIT_STATES.get(policy.breaker.state, 0)
+                        for policy in (transcription_policy, genai_policy)}, ('provider',), aggregate=MAX)
+registry.gauge('neo_screener_db_pool', 'MySQL connection pool counters, summed over the workers.',
+               lambda: {(key,): value for key, value in pool_stats().items()}, ('stat',))
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Metrics in the Prometheus text format, combined over the gunicorn workers (METRICS_MULTIPROC_DIR).
+    """
+    job_queue_depth['value'] = await asyncio.to_thread(job_queue.depth)
+    content = await asyncio.to_thread(registry.render, registry.collect())
+    return Response(content=content, media_type="text/plain; version=0.0.4")
+
+
+@app.post("/template-cache/invalidate")
+async def invalidate_template_cache(t_id: str | None = None):
+    """
+    Drop the cached template of `t_id` (every template when omitted) on the worker serving the call.
+    """
+    invalidate_test_template(t_id)
+    return {"message": f"Template cache invalidated for {t_id or 'all tests'}"}
+
+
 def run_uvicorn():
-    config = uvicorn.Config("main:app", host="0.0.0.0", port=8080, log_level="info", reload=True,workers=(multiprocessing.cpu_count() * 2) + 1)
-    server = uvicorn.Server(config)
-    server.run()
+    """
+    Development server, production runs `gunicorn -c gunicorn.conf.py main:app` (see the Dockerfile).
+    """
+    host, _, port = load_secret_instance.get_secret('SERVER_BIND', '0.0.0.0:8080').rpartition(':')
+    uvicorn.run("main:app", host=host, port=int(port), log_level="info",
+                reload=load_secret_instance.get_secret('SERVER_RELOAD', 'false').lower() == 'true')
 
 if __name__ == "__main__":
     run_uvicorn()
\ No newline at end of file
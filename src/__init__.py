@@ -1,22 +1,139 @@
 import os
 import sys
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from src.secrets.load_keys import LoadSecret
 
-logging_str = '[%(asctime)s: %(levelname)s: %(module)s - line %(lineno)d: %(message)s]'
+load_secret_instance = LoadSecret()
 
-log_dir = 'logs'
+# [level][date&time][thread/worker id][request-id][filename][funcname][line no]:[msg]
+logging_str = '[%(asctime)s: %(levelname)s: %(process)d/%(threadName)s: %(correlation_id)s: %(module)s.%(funcName)s - line %(lineno)d: %(message)s]'
+
+log_dir = load_secret_instance.get_secret('LOG_DIR', 'logs')
 
 log_filepath = os.path.join(log_dir,'running_logs.log')
 os.makedirs(log_dir,exist_ok=True)
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format=logging_str,
+# id of the job / request being served, copied into every task, `asyncio.to_thread` and `run_blocking` call it starts
+correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar('correlation_id', default='-')
+
+
+class CorrelationIdFilter(logging.Filter):
+    """
+    Stamps every record with the correlation id of the context which logged it.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` records per second from one call site (module and line), so a message
+    logged for every row of a batch cannot flood the log. The count of dropped records is appended to
+    the next record let through. Errors are never dropped.
+    """
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+        self._windows = {}  # (pathname, lineno) -> [window start, records in window, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.ERROR:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                dropped = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+                if dropped:
+                    record.msg = f"{record.msg} ({dropped} similar messages suppressed)"
+            window[1] += 1
+            if window[1] > self.limit:
+                window[2] += 1
+                return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'thread': record.threadName,
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'module': record.module,
+            'func': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
 
-    handlers=[
-        logging.FileHandler(log_filepath), # saving log in the specified folder path
-        logging.StreamHandler(sys.stdout) # printing log in terminal
-    ]
+class StructuredQueueHandler(QueueHandler):
+    """
+    Queues the record with its message rendered and its traceback kept apart (`exc_text`), so the
+    listener formats it as a whole record and not as pre-formatted text.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+file_handler = RotatingFileHandler(log_filepath,  # saving log in the specified folder path
+                                   maxBytes=int(load_secret_instance.get_secret('LOG_MAX_BYTES', 50 * 1024 * 1024)),
+                                   backupCount=int(load_secret_instance.get_secret('LOG_BACKUP_COUNT', 5)))
+stream_handler = logging.StreamHandler(sys.stdout)  # printing log in terminal
+formatter = (JsonFormatter() if load_secret_instance.get_secret('LOG_FORMAT', 'json') == 'json'
+             else logging.Formatter(logging_str))
+for handler in (file_handler, stream_handler):
+    handler.setFormatter(formatter)
+
+# records are queued by the logging call and written by the listener thread, never on the event loop
+log_queue = queue.SimpleQueue()
+queue_handler = StructuredQueueHandler(log_queue)
+queue_handler.addFilter(CorrelationIdFilter())
+queue_handler.addFilter(RateLimitFilter(int(load_secret_instance.get_secret('LOG_RATE_LIMIT', 20))))
+
+logging.basicConfig(
+    level=load_secret_instance.get_secret('LOG_LEVEL', 'INFO').upper(),
+    handlers=[queue_handler],
 )
 
-logger = logging.getLogger('neoprescreener')
\ No newline at end of file
+log_listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+log_listener.start()
+
+
+def _restart_log_listener() -> None:
+    # a forked gunicorn worker inherits the queue but not the listener thread of the master
+    global log_listener
+    log_listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    log_listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_log_listener)
+atexit.register(lambda: log_listener.stop())
+
+logger = logging.getLogger('neoprescreener')
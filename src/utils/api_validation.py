@@ -1,12 +1,14 @@
-from jsonschema import validate, ValidationError
+from typing import Iterator, List
+from jsonschema import Draft7Validator, FormatChecker
+from pydantic import TypeAdapter, ValidationError
 from src.neoscreener.logger import logger
-    
-def validate_api_data_nontech(data):
-    logger.info(
-        f"Validating the API request data."
-    )
-    # Define the JSON schema for the expected data structure
-    schema = {
+from src.utils.common import is_uri
+from src.utils.request_example import neo_screener
+
+# errors reported back to the caller, a fully broken 1000 question payload must not produce a 1000 line message
+MAX_REPORTED_ERRORS = 20
+
+NONTECH_SCHEMA = {
     "type": "array",
     "items": {
         "type": "object",
@@ -19,15 +21,75 @@ def validate_api_data_nontech(data):
         "required": ["s_question_id", "q_id", "video_url", "question"]
     }
 }
-    try:
-        # Validate the received data against the schema
-        validate(data, schema)
-        logger.info(
-        f"Validated the API request data."
-        )
+
+format_checker = FormatChecker()
+format_checker.checks('uri')(is_uri)
+
+# compiled once at import: the schema is checked against the meta-schema here and not on every request
+Draft7Validator.check_schema(NONTECH_SCHEMA)
+nontech_validator = Draft7Validator(NONTECH_SCHEMA, format_checker=format_checker)
+nontech_item_validator = Draft7Validator(NONTECH_SCHEMA['items'], format_checker=format_checker)
+
+nontech_adapter = TypeAdapter(List[neo_screener])
+
+
+def _format_path(path) -> str:
+    """
+    [3].video_url style path of an error in the payload.
+    """
+    return ''.join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in path) or '$'
+
+
+def iter_api_errors(data) -> Iterator[str]:
+    """
+    Yields every schema error of the payload as `<path>: <message>`, item by item.
+    """
+    for error in nontech_validator.iter_errors(data):
+        yield f"{_format_path(error.absolute_path)}: {error.message}"
+
+
+def validate_api_item(item) -> list[str]:
+    """
+    Errors of a single payload item, used when the items arrive one by one (NDJSON ingestion).
+    """
+    return [f"{_format_path(error.absolute_path)}: {error.message}" for error in nontech_item_validator.iter_errors(item)]
+
+
+def _result(errors: list[str], count: int):
+    if not errors:
+        logger.info(f"Validated the API request data.")
         return True, "API data Validation successful"  # Validation successful
+    message = '\n'.join(errors[:MAX_REPORTED_ERRORS])
+    if len(errors) > MAX_REPORTED_ERRORS:
+        message += f"\n... {len(errors) - MAX_REPORTED_ERRORS} more errors"
+    logger.warning(f"API request data of {count} items failed validation with {len(errors)} errors:\n{message}")
+    return False, message  # Validation failed with error message
+
+
+def validate_api_data_nontech(data):
+    """
+    Validates a `/neo-screener` payload against `NONTECH_SCHEMA`, formats included.
+
+    Returns:
+        (bool, str) - the outcome and a message listing the errors with their item paths.
+    """
+    logger.info(
+        f"Validating the API request data."
+    )
+    return _result(list(iter_api_errors(data)), len(data) if isinstance(data, list) else 1)
+
+
+def validate_api_data_model(data):
+    """
+    Same contract as `validate_api_data_nontech`, validated by the `neo_screener` pydantic model.
+    Faster on large payloads, the error messages are pydantic's.
+    """
+    logger.info(
+        f"Validating the API request data."
+    )
+    try:
+        nontech_adapter.validate_python(data)
+        errors = []
     except ValidationError as e:
-        logger.exception(e)
-        return False, str(e)  # Validation failed with error message
-    
-    # [level][date&time][thread/worker id][request-id][filename][funcname][line no]:[msg]
\ No newline at end of file
+        errors = [f"{_format_path(error['loc'])}: {error['msg']}" for error in e.errors()]
+    return _result(errors, len(data) if isinstance(data, list) else 1)
@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from src.utils import db_ops
+from src.utils.db_pool import DEFAULT_POOL_SIZE, run_in_unit_of_work
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    Returns the bounded executor running the blocking mysql-connector calls.
+
+    It is sized like the connection pool (`DB_EXECUTOR_WORKERS`, defaults to `MY_SQL_POOL_SIZE`)
+    so queued DB work waits in the executor instead of holding an event loop turn.
+    """
+    global _executor
+    if _executor is None:
+        max_workers = int(os.getenv('DB_EXECUTOR_WORKERS', os.getenv('MY_SQL_POOL_SIZE', DEFAULT_POOL_SIZE)))
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db_ops')
+    return _executor
+
+
+def shutdown_db_executor() -> None:
+    """
+    Wait for the running DB calls to finish and release the executor threads.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking DB function on the bounded executor without blocking the event loop.
+    The caller's context variables are carried over to the executor thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_db_executor(), call)
+
+
+async def insert_data_into_mysql(json_array: dict, db_config: dict) -> bool:
+    return await run_blocking(db_ops.insert_data_into_mysql, json_array, db_config)
+
+
+async def get_existing_transcriptions(s_question_ids: list, db_config: dict) -> dict:
+    return await run_blocking(db_ops.get_existing_transcriptions, s_question_ids, db_config)
+
+
+async def retrieve_student_attempts(s_question_ids: list, db_config: dict) -> dict:
+    return await run_blocking(db_ops.retrieve_student_attempts, s_question_ids, db_config)
+
+
+async def retrieve_student_course_info(results: dict, db_config: dict) -> dict:
+    return await run_blocking(db_ops.retrieve_student_course_info, results, db_config)
+
+
+async def update_student_questions(results: dict, db_config: dict) -> None:
+    return await run_blocking(db_ops.update_student_questions, results, db_config)
+
+
+async def update_section_wise_marks(db_config: dict, test_id: str, user_id: str | None = None,
+                                    c_id: str | None = None, attempt_no: int | None = None) -> None:
+    return await run_blocking(db_ops.update_section_wise_marks, db_config, test_id, user_id, c_id, attempt_no)
+
+
+async def write_attempt_results(results: list, db_config: dict, attempt: dict | None = None) -> float | None:
+    return await run_blocking(run_in_unit_of_work, db_config, db_ops.write_attempt_results, results, db_config, attempt)
+
+
+async def update_student_course(results: dict, db_config: dict) -> None:
+    return await run_blocking(db_ops.update_student_course, results, db_config)
+
+
+async def get_questions_feedback(test_id: str | None, attempt_no: int | None, user_id: str | None,
+                                 db_config: dict | None) -> str:
+    return await run_blocking(db_ops.get_questions_feedback, test_id, attempt_no, user_id, db_config)
+
+
+async def update_test_level(db_config: dict | None, user_id: str | None, t_id: str | None, c_id: str | None,
+                            attempt_no: str | None, overall_feedback: str | None) -> None:
+    return await run_blocking(db_ops.update_test_level, db_config, user_id, t_id, c_id, attempt_no,
+                              overall_feedback)
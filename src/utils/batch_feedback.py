@@ -0,0 +1,110 @@
+import json
+import re
+from src.neoscreener.logger import logger
+
+# keys of one question's feedback, in the per-question output format
+FEEDBACK_KEYS = ('question', 'area_of_improvement', 'strength', 'suggestions', 'Rating')
+
+
+def pack_batches(items: list[dict], max_questions: int, max_chars: int) -> list[list[dict]]:
+    """
+    Splits {s_question_id, question, candidate_response} items into chunks of at most `max_questions`
+    items and roughly `max_chars` characters of question and transcript, keeping the input order.
+    An item larger than `max_chars` gets a chunk of its own.
+    """
+    batches, batch, size = [], [], 0
+    for item in items:
+        item_size = len(item['question']) + len(item['candidate_response'])
+        if batch and (len(batch) >= max_questions or size + item_size > max_chars):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(item)
+        size += item_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def batch_questions(items: list[dict]) -> str:
+    """
+    The `questions` field of the batch prompt.
+    """
+    return json.dumps([{'s_question_id': item['s_question_id'], 'question': item['question'],
+                        'candidate_response': item['candidate_response']} for item in items])
+
+
+def _valid_rating(rating) -> bool:
+    try:
+        return 0 <= float(rating) <= 10
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_batch_feedback(text: str, items: list[dict]) -> dict:
+    """
+    Splits a batched LLM answer back per question.
+
+    Returns:
+        {s_question_id: feedback} in the per-question format (a JSON list holding one object), for the
+        questions of `items` the answer covers with a valid rating.
+
+    Raises:
+        ValueError: The answer is not a JSON array of objects.
+    """
+    cleaned = re.sub(r'^\s*```(?:json)?|```\s*$', '', text.strip()).strip()
+    entries = json.loads(cleaned)
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise ValueError("Batched feedback is not a JSON array of objects.")
+
+    questions = {str(item['s_question_id']): item for item in items}
+    feedback = {}
+    for entry in entries:
+        item = questions.get(str(entry.get('s_question_id')))
+        if item is None or not _valid_rating(entry.get('Rating')):
+            continue
+        per_question = {key: entry.get(key) for key in FEEDBACK_KEYS}
+        per_question['question'] = item['question']
+        feedback[item['s_question_id']] = json.dumps([per_question])
+    return feedback
+
+
+class BatchFeedbackGenerator:
+    """
+    Packs the feedback of several questions into one LLM request per chunk and splits the answer back.
+
+    Args:
+        llm_call: Blocking callable prompt -> LLM answer text.
+        render_prompt: Callable questions JSON -> prompt, the compiled `batch_prompt` of the feedback config.
+        max_questions (int): Questions packed in one request.
+        max_chars (int): Approximate size bound of the questions and transcripts of one request.
+    """
+    def __init__(self, llm_call, render_prompt, max_questions: int = 10, max_chars: int = 24000):
+        self.llm_call = llm_call
+        self.render_prompt = render_prompt
+        self.max_questions = max_questions
+        self.max_chars = max_chars
+        self.requests = 0
+        self.questions = 0
+        self.fallbacks = 0
+
+    def batches(self, items: list[dict]) -> list[list[dict]]:
+        return pack_batches(items, self.max_questions, self.max_chars)
+
+    def prompt(self, items: list[dict]) -> str:
+        self.requests += 1
+        return self.render_prompt(batch_questions(items))
+
+    def parse(self, answer: str, items: list[dict]) -> dict:
+        """
+        Feedback of the questions of `items` covered by the LLM answer, see `parse_batch_feedback`.
+        """
+        feedback = parse_batch_feedback(answer, items)
+        self.questions += len(feedback)
+        return feedback
+
+    def record_fallback(self, count: int) -> None:
+        self.fallbacks += count
+        logger.warning(f"{count} questions fell back to per-question feedback calls.")
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'questions': self.questions, 'fallbacks': self.fallbacks}
@@ -1,6 +1,7 @@
 import yaml
 import os
 from pathlib import Path
+from urllib.parse import urlsplit
 from src.neoscreener.logger import logger
 
 
@@ -20,7 +21,7 @@ def read_yaml(path_to_yaml: Path):
     try:
         with open(path_to_yaml) as yaml_file:
             content = yaml.safe_load(yaml_file)
-            logger.info(f"yaml file: {path_to_yaml} loaded successfully")
+            logger.debug(f"yaml file: {path_to_yaml} loaded successfully")
             return content
     except Exception as e:
         logger.exception(f"yaml file: {path_to_yaml} did not loaded successfully")
@@ -72,4 +73,17 @@ def delete_dirs(paths:list[Path])->None:
         logger.error(
             f"Exception occured in make_dirs: {e}"
         )
-        raise e
\ No newline at end of file
+        raise e
+
+def is_uri(value) -> bool:
+    """
+    `"format": "uri"` check of the request payloads: an absolute url with a scheme and a host.
+    jsonschema only checks the format when the optional rfc3987 package is installed.
+    """
+    if not isinstance(value, str):
+        return True  # the type is checked separately
+    try:
+        parts = urlsplit(value)
+    except ValueError:
+        return False
+    return bool(parts.scheme and parts.netloc) and not any(char.isspace() for char in value)
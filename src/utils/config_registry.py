@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+import time
+from string import Formatter
+import yaml
+from src.neoscreener.logger import logger
+from src.utils.exceptions import ConfigValidationException
+
+# compiled prompt -> (config key, fields filled per call, fields bound from the config when compiling)
+# `question_feedback` is only validated: `process_task` builds the per-question prompt in `GenAiFeedbackModule`
+FEEDBACK_PROMPTS = {
+    'question_feedback': ('prompt', ('question', 'candidate_response'), ('expected_output_format',)),
+    'overall_feedback': ('overal_feedback_prompt', ('question_feedback',), ()),
+    'batch_feedback': ('batch_prompt', ('questions',), ('expected_output_format',)),
+}
+
+
+class PromptTemplate:
+    """
+    A `str.format` template parsed once. Fields known when compiling (`partials`) are folded into the
+    literal text, rendering only joins the literals with the per-call values.
+
+    Raises:
+        ConfigValidationException: The template is malformed or uses a field spec / conversion.
+    """
+    def __init__(self, template: str, **partials):
+        literals, names = [''], []
+        try:
+            parsed = list(Formatter().parse(template))
+        except ValueError as e:
+            raise ConfigValidationException(f"malformed template: {e}")
+        for literal, name, spec, conversion in parsed:
+            literals[-1] += literal
+            if name is None:
+                continue
+            if spec or conversion:
+                raise ConfigValidationException(f"field `{name}` uses a format spec or conversion")
+            if name in partials:
+                literals[-1] += str(partials[name])
+            else:
+                names.append(name)
+                literals.append('')
+        self._literals = literals
+        self._names = names
+        self.fields = frozenset(names)
+
+    def render(self, **values) -> str:
+        parts = [self._literals[0]]
+        for name, literal in zip(self._names, self._literals[1:]):
+            parts.append(str(values[name]))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+class FeedbackConfig:
+    """
+    One validated version of the feedback config: the raw values, the compiled prompts and the version hash.
+    """
+    def __init__(self, data: dict, version: str, mtime: float):
+        self.data = data
+        self.version = version
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        self.prompts = compile_feedback_prompts(data)
+
+
+def compile_feedback_prompts(data: dict) -> dict:
+    """
+    Validates the feedback config and compiles its prompts, see `FEEDBACK_PROMPTS`.
+
+    Raises:
+        ConfigValidationException: A key is missing or a prompt does not take exactly its expected fields.
+    """
+    if not isinstance(data, dict):
+        raise ConfigValidationException("the config is not a mapping")
+    formats = data.get('expected_output_format')
+    if not isinstance(formats, list) or not formats or not isinstance(formats[0], str):
+        raise ConfigValidationException("`expected_output_format` must be a non empty list of strings")
+
+    prompts = {}
+    for name, (key, fields, bound) in FEEDBACK_PROMPTS.items():
+        template = data.get(key)
+        if isinstance(template, list) and template and all(isinstance(part, str) for part in template):
+            template = ' '.join(template)  # the instructions following the per-question prompt
+        if not isinstance(template, str) or not template.strip():
+            raise ConfigValidationException(f"`{key}` must be a non empty string")
+        prompt = PromptTemplate(template, **{field: formats[0] for field in bound})
+        if prompt.fields != set(fields):
+            raise ConfigValidationException(f"`{key}` must use the fields {sorted(fields)}, it uses {sorted(prompt.fields)}")
+        prompts[name] = prompt
+    return prompts
+
+
+class ConfigRegistry:
+    """
+    The feedback config loaded and validated once per version instead of once per question. The file's
+    mtime is checked at most every `check_interval` seconds and a changed file is reloaded in place, so a
+    prompt edit reaches running workers without a restart. An invalid edit is logged and the last valid
+    version stays in use.
+
+    Args:
+        path (str): YAML config file.
+        check_interval (float): Seconds between two mtime checks, 0 checks on every call.
+    """
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.failed_reloads = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._checked_at = time.monotonic()
+        self._failed_mtime = None
+        self._config = self._load(os.stat(path).st_mtime)
+
+    def _load(self, mtime: float) -> FeedbackConfig:
+        with open(self.path, 'rb') as config_file:
+            content = config_file.read()
+        config = FeedbackConfig(yaml.safe_load(content), hashlib.sha256(content).hexdigest()[:12], mtime)
+        logger.info(f"Feedback config {self.path} loaded, version {config.version}.")
+        return config
+
+    def subscribe(self, listener) -> None:
+        """
+        `listener(config)` is called after every reload, used to move caches keyed by the version along.
+        """
+        self._listeners.append(listener)
+
+    def current(self) -> FeedbackConfig:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._config
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._config
+            self._checked_at = now
+            mtime = None
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime in (self._config.mtime, self._failed_mtime):
+                    return self._config
+                config = self._load(mtime)
+            except Exception as e:
+                # retried once the file changes again, not on every check
+                self._failed_mtime = mtime
+                self.failed_reloads += 1
+                logger.error(f"Feedback config {self.path} not reloaded, keeping version {self._config.version}: {e}")
+                return self._config
+            if config.version != self._config.version:
+                self.reloads += 1
+                for listener in self._listeners:
+                    listener(config)
+            self._config = config
+        return config
+
+    @property
+    def version(self) -> str:
+        return self.current().version
+
+    def get(self, key: str):
+        return self.current().data[key]
+
+    def render(self, prompt: str, **values) -> str:
+        return self.current().prompts[prompt].render(**values)
+
+    def stats(self) -> dict:
+        config = self.current()
+        return {'path': self.path, 'version': config.version, 'loaded_at': config.loaded_at,
+                'reloads': self.reloads, 'failed_reloads': self.failed_reloads}
@@ -1,126 +1,280 @@
 import mysql.connector
 import json
+import math
 import os
 from src.neoscreener.logger import logger
+from src.utils.db_pool import get_connection, in_unit_of_work
+from src.utils.cache import TTLLRUCache
+from src.utils.metrics import timed, PROMPT_TOKENS, COMPACTION_TIERS
+from src.utils.feedback_compaction import compact_question_feedback
+from src.secrets.load_keys import LoadSecret
 import re
 import logging
 import json
 import mysql.connector
+from decimal import Decimal
 
-async def update_section_wise_marks(db_config: dict, test_id: str) -> None:
+# parsed test templates keyed by t_id, templates almost never change once a test is live
+template_cache = TTLLRUCache(maxsize=int(LoadSecret().get_secret('TEMPLATE_CACHE_SIZE', 256)),
+                             ttl=float(LoadSecret().get_secret('TEMPLATE_CACHE_TTL', 600)))
+# estimated tokens of question feedback sent to the overall feedback prompt, 0 sends it as stored
+feedback_token_budget = int(LoadSecret().get_secret('FEEDBACK_TOKEN_BUDGET', 6000))
+
+def parse_test_template(template_data: dict) -> dict:
+    """
+    Builds the section index of a test template in a single pass over its questions.
+
+    Params:
+        template_data: dict - the parsed `test_templates.template_data`
+
+    Returns:
+        dict - `sections`: [(section_name, question_list)] in template order and
+               `question_section`: {q_id: section_name}
+    """
+    question_lists = {}
+    for question in template_data.get('questions', []):
+        # the first entry of a section wins, as before
+        question_lists.setdefault(question['sectionName'], question['questionList'])
+
+    sections = []
+    question_section = {}
+    for section in template_data.get('sections', []):
+        section_name = section['name']
+        question_list = question_lists.get(section_name, [])
+        sections.append((section_name, question_list))
+        for q_id in question_list:
+            question_section.setdefault(q_id, section_name)
+    return {'sections': sections, 'question_section': question_section}
+
+
+def get_test_template_index(cursor, test_id: str) -> dict | None:
+    """
+    Returns the parsed section index of the test's template, from `template_cache` when possible.
+
+    Params:
+        cursor: dictionary cursor of a borrowed connection, used on a cache miss
+        test_id: str - the test ID whose template is indexed
+
+    Returns:
+        dict | None - the `parse_test_template` output, None when the test has no template
+    """
+    template_index = template_cache.get(test_id)
+    if template_index is not None:
+        return template_index
+
+    # Fetch the template data for the given test
+    query = """
+        SELECT t.t_id, t.t_name, t.t_type, tt.template_data
+        FROM tests t
+        INNER JOIN test_templates tt ON tt.template_id = t.template_id
+        WHERE t.t_id = %s
+    """
+    cursor.execute(query, (test_id,))
+    test_template = cursor.fetchone()
+    if not test_template:
+        return None
+
+    template_index = parse_test_template(json.loads(test_template['template_data']))
+    template_cache.set(test_id, template_index)
+    return template_index
+
+
+def invalidate_test_template(test_id: str | None = None) -> None:
+    """
+    Drop the cached template of a test (or of every test) after it was edited.
+    The cache is per worker process, other workers pick the change up after `TEMPLATE_CACHE_TTL`.
+    """
+    template_cache.invalidate(test_id)
+    logger.info(f"Invalidated the cached test template for test_id: {test_id or 'all'}")
+
+
+def _to_number(value):
+    """
+    Converts the DECIMAL returned by SUM() into an int/float which can be dumped to JSON.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _apply_section_marks(section_wise_marks: list, marks_by_section: dict) -> list:
+    """
+    Writes the accumulated marks into the 0-based `section_wise_marks` entries.
+    """
+    for section_no, total_marks in marks_by_section.items():
+        if 0 <= section_no < len(section_wise_marks):
+            section_wise_marks[section_no]['marks'] = _to_number(total_marks)
+    return section_wise_marks
+
+
+@timed('section_marks')
+def update_section_wise_marks(db_config: dict, test_id: str, user_id: str | None = None, c_id: str | None = None,
+                              attempt_no: int | None = None) -> None:
     """
     Function to update the section_wise_marks field in the student_course table.
 
+    When the attempt (user_id, c_id, attempt_no) is given only that attempt is aggregated with one
+    grouped query and written with one UPDATE, otherwise every attempt of the test is refreshed.
+
     Params:
         db_config: dict - database configuration
         test_id: str - the test ID from which to extract sections and question mappings.
+        user_id: str - user of the attempt being graded
+        c_id: str - course of the attempt being graded
+        attempt_no: int - attempt number being graded
     """
     try:
-        # Connect to the database
-        connection = mysql.connector.connect(**db_config)
-        cursor = connection.cursor(dictionary=True)
-        
-        # Fetch the template data for the given test
-        query = f"""
-            SELECT t.t_id, t.t_name, t.t_type, tt.template_data
-            FROM tests t
-            INNER JOIN test_templates tt ON tt.template_id = t.template_id
-            WHERE t.t_id = %s
-        """
-        cursor.execute(query, (test_id,))
-        test_template = cursor.fetchone()
-
-        if not test_template:
-            logger.error(f"No test template found for test_id: {test_id}")
-            return
-
-        # Parse the template_data
-        template_data = json.loads(test_template['template_data'])
-
-        # Iterate through the sections in the template data
-        sections = template_data['sections']
-        for section in sections:
-            section_name = section['name']
-            questions = [q for q in template_data['questions'] if q['sectionName'] == section_name]
-            question_list = questions[0]['questionList'] if questions else []
-
-            if not question_list:
-                continue
-
-            # Find corresponding student_question_id and marks for all questions in this section
-            question_placeholders = ', '.join(['%s'] * len(question_list))
-            query = f"""
-                SELECT sq.s_question_id, sq.marks, sq.user_id, sq.c_id, sq.t_id, sq.attempt_no, sq.section_no
-                FROM student_questions sq
-                WHERE sq.q_id IN ({question_placeholders})
-            """
-            cursor.execute(query, tuple(question_list))
-            student_questions = cursor.fetchall()
-
-            # Group the results by user_id, c_id, t_id, attempt_no (to update for each student)
-            grouped_data = {}
-            for sq in student_questions:
-                key = (sq['user_id'], sq['c_id'], sq['t_id'], sq['attempt_no'])
-                if key not in grouped_data:
-                    grouped_data[key] = {'marks_by_section': {}}
-
-                # Accumulate marks for each section
-                section_no = sq['section_no'] - 1  # Adjust for 0-based indexing
-                if section_no not in grouped_data[key]['marks_by_section']:
-                    grouped_data[key]['marks_by_section'][section_no] = 0
-                grouped_data[key]['marks_by_section'][section_no] += sq['marks']
-
-            # After accumulating the marks, update section_wise_marks for each student
-            for (user_id, c_id, t_id, attempt_no), data in grouped_data.items():
-                # Fetch the current section_wise_marks
-                query = """
-                    SELECT sc.section_wise_marks
-                    FROM student_course sc
-                    WHERE sc.user_id = %s AND sc.c_id = %s AND sc.t_id = %s AND sc.attempt_no = %s
-                """
-                cursor.execute(query, (user_id, c_id, t_id, attempt_no))
-                student_course = cursor.fetchone()
+        # Borrow a connection from the pool
+        with get_connection(db_config) as connection:
+            with connection.cursor(dictionary=True) as cursor:
+                template_index = get_test_template_index(cursor, test_id)
+                if template_index is None:
+                    logger.error(f"No test template found for test_id: {test_id}")
+                    return
 
-                if not student_course:
-                    logger.error(f"No student_course record found for user_id: {user_id}, c_id: {c_id}, t_id: {t_id}, attempt_no: {attempt_no}")
-                    continue
+                question_ids = list(template_index['question_section'])
 
-                # Load the section_wise_marks JSON
-                section_wise_marks = json.loads(student_course['section_wise_marks'])
+                if not question_ids:
+                    logger.warning(f"No section questions found in the template of test_id: {test_id}")
+                    return
 
-                # Update the marks in the appropriate sections
-                for section_no, total_marks in data['marks_by_section'].items():
-                    if section_no < len(section_wise_marks):
-                        section_wise_marks[section_no]['marks'] = total_marks
+                question_placeholders = ', '.join(['%s'] * len(question_ids))
+                if None not in (user_id, c_id, attempt_no):
+                    _update_attempt_section_marks(cursor, question_ids, question_placeholders,
+                                                  user_id, c_id, test_id, attempt_no)
+                else:
+                    _update_test_section_marks(cursor, question_ids, question_placeholders)
 
-                # Update the section_wise_marks in the database
-                update_query = """
-                    UPDATE student_course
-                    SET section_wise_marks = %s
-                    WHERE user_id = %s AND c_id = %s AND t_id = %s AND attempt_no = %s
-                """
-                cursor.execute(update_query, (
-                    json.dumps(section_wise_marks),
-                    user_id,
-                    c_id,
-                    t_id,
-                    attempt_no
-                ))
-
-        # Commit the transaction
-        connection.commit()
-        logger.info(f"Updated the student_course table with section_wise_marks for test_id {test_id}.")
+                # Commit the transaction
+                connection.commit()
+                logger.info(f"Updated the student_course table with section_wise_marks for test_id {test_id}.")
 
     except mysql.connector.Error as err:
         logger.exception(f"MySQL Error: {err}")
     except Exception as e:
+        if in_unit_of_work():
+            raise  # rolls back the unit instead of committing the attempt without its section marks
         logger.exception(f"An unexpected error occurred: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
+
+def _update_attempt_section_marks(cursor, question_ids: list, question_placeholders: str,
+                                  user_id: str, c_id: str, t_id: str, attempt_no: int) -> None:
+    """
+    Aggregates the section marks of a single attempt in one grouped query and writes them with one UPDATE.
+    """
+    query = f"""
+        SELECT sq.section_no, SUM(sq.marks) AS marks
+        FROM student_questions sq
+        WHERE sq.user_id = %s AND sq.c_id = %s AND sq.t_id = %s AND sq.attempt_no = %s
+          AND sq.q_id IN ({question_placeholders})
+        GROUP BY sq.section_no
+    """
+    cursor.execute(query, (user_id, c_id, t_id, attempt_no, *question_ids))
+    marks_by_section = {row['section_no'] - 1: row['marks'] or 0 for row in cursor.fetchall()}  # 0-based sections
+
+    query = """
+        SELECT sc.section_wise_marks
+        FROM student_course sc
+        WHERE sc.user_id = %s AND sc.c_id = %s AND sc.t_id = %s AND sc.attempt_no = %s
+        FOR UPDATE
+    """
+    cursor.execute(query, (user_id, c_id, t_id, attempt_no))
+    student_course = cursor.fetchone()
+
+    if not student_course:
+        logger.error(f"No student_course record found for user_id: {user_id}, c_id: {c_id}, t_id: {t_id}, attempt_no: {attempt_no}")
+        return
+
+    section_wise_marks = _apply_section_marks(json.loads(student_course['section_wise_marks']), marks_by_section)
+
+    update_query = """
+        UPDATE student_course
+        SET section_wise_marks = %s
+        WHERE user_id = %s AND c_id = %s AND t_id = %s AND attempt_no = %s
+    """
+    cursor.execute(update_query, (json.dumps(section_wise_marks), user_id, c_id, t_id, attempt_no))
+
+
+def _update_test_section_marks(cursor, question_ids: list, question_placeholders: str) -> None:
+    """
+    Refreshes the section marks of every attempt which answered the template questions.
+    """
+    # Find corresponding student_question_id and marks for all the template questions
+    query = f"""
+        SELECT sq.s_question_id, sq.marks, sq.user_id, sq.c_id, sq.t_id, sq.attempt_no, sq.section_no
+        FROM student_questions sq
+        WHERE sq.q_id IN ({question_placeholders})
+    """
+    cursor.execute(query, tuple(question_ids))
+    student_questions = cursor.fetchall()
+
+    # Group the results by user_id, c_id, t_id, attempt_no (to update for each student)
+    grouped_data = {}
+    for sq in student_questions:
+        key = (sq['user_id'], sq['c_id'], sq['t_id'], sq['attempt_no'])
+        marks_by_section = grouped_data.setdefault(key, {})
+
+        # Accumulate marks for each section
+        section_no = sq['section_no'] - 1  # Adjust for 0-based indexing
+        marks_by_section[section_no] = marks_by_section.get(section_no, 0) + sq['marks']
+
+    # After accumulating the marks, update section_wise_marks for each student
+    for (user_id, c_id, t_id, attempt_no), marks_by_section in grouped_data.items():
+        query = """
+            SELECT sc.section_wise_marks
+            FROM student_course sc
+            WHERE sc.user_id = %s AND sc.c_id = %s AND sc.t_id = %s AND sc.attempt_no = %s
+        """
+        cursor.execute(query, (user_id, c_id, t_id, attempt_no))
+        student_course = cursor.fetchone()
+
+        if not student_course:
+            logger.error(f"No student_course record found for user_id: {user_id}, c_id: {c_id}, t_id: {t_id}, attempt_no: {attempt_no}")
+            continue
+
+        section_wise_marks = _apply_section_marks(json.loads(student_course['section_wise_marks']), marks_by_section)
+
+        update_query = """
+            UPDATE student_course
+            SET section_wise_marks = %s
+            WHERE user_id = %s AND c_id = %s AND t_id = %s AND attempt_no = %s
+        """
+        cursor.execute(update_query, (json.dumps(section_wise_marks), user_id, c_id, t_id, attempt_no))
+
+def feedback_rating(feedback):
+    """
+    The `Rating` of a per-question feedback, stored as `video_auto_results.overall_score`.
+
+    Params:
+        feedback: str - JSON list holding the feedback of the question
+
+    Returns:
+        the rating, None when the feedback has none
+    """
+    if isinstance(feedback, str):
+        try:
+            feedback_json = json.loads(feedback.strip())
+            if isinstance(feedback_json, list) and feedback_json:
+                feedback_dict = feedback_json[0] if isinstance(feedback_json[0], dict) else json.loads(feedback_json[0])
+                return feedback_dict.get('Rating', None)
+        except json.JSONDecodeError:
+            logger.warning(f"Invalid JSON in feedback: {feedback}")
+    return None
+
+def rating_score(rating) -> float | None:
+    """
+    A per-question rating as the numeric `overall_score` it is stored as, None when it is not a number
+    (e.g. "N/A"), so a non numeric rating counts as no score everywhere it is written or averaged.
+    """
+    if isinstance(rating, bool):
+        return None
+    try:
+        score = float(rating)
+    except (TypeError, ValueError):
+        return None
+    return score if math.isfinite(score) else None
+
+@timed('db_insert')
 def insert_data_into_mysql(json_array: dict, db_config: dict) -> bool:
     """
     Function to perform insert/update in the video auto results table.
@@ -131,8 +285,8 @@ def insert_data_into_mysql(json_array: dict, db_config: dict) -> bool:
     try:
         logger.info(f"DB Insert Initialised with data size, {len(json_array)} rows.")
         
-        # Connect to your MySQL database using a context manager
-        with mysql.connector.connect(**db_config) as connection:
+        # Borrow a pooled connection using a context manager
+        with get_connection(db_config) as connection:
             with connection.cursor() as cursor:
                 # Bulk insert using executemany
                 query = """INSERT INTO video_auto_results 
@@ -154,16 +308,7 @@ def insert_data_into_mysql(json_array: dict, db_config: dict) -> bool:
                         """
                 values = []
                 for entry in json_array:
-                    feedback = entry.get('feedback', '[]')
-                    overall_score = None
-                    if isinstance(feedback, str):
-                        try:
-                            feedback_json = json.loads(feedback.strip())
-                            if isinstance(feedback_json, list) and feedback_json:
-                                feedback_dict = feedback_json[0] if isinstance(feedback_json[0], dict) else json.loads(feedback_json[0])
-                                overall_score = feedback_dict.get('Rating', None)
-                        except json.JSONDecodeError:
-                            logger.warning(f"Invalid JSON in feedback: {feedback}")
+                    overall_score = rating_score(feedback_rating(entry.get('feedback', '[]')))
                     values.append((
                         entry.get("transcription_id", None),
                         entry.get("s_question_id", None),
@@ -188,38 +333,41 @@ def insert_data_into_mysql(json_array: dict, db_config: dict) -> bool:
         # You might want to log the error or handle it appropriately
         return False
     except Exception as e:
+        if in_unit_of_work():
+            raise
         logger.exception(f"An unexpected error occurred: {e}")
         return False
 
-def retrieve_student_course_info(results: dict, db_config: dict) -> dict:
+@timed('transcription_lookup')
+def get_existing_transcriptions(s_question_ids: list, db_config: dict) -> dict:
     """
-    Function to retrieve the user_id, t_id, c_id, and attempt_no from the student_course table based on s_question_id.
+    Function to fetch the transcriptions already stored in `video_auto_results`, so a replayed batch
+    can skip the transcription.
 
     Params:
-        s_question_id: int - the ID of the specific question
+        s_question_ids: list - the s_question_ids of the batch
         db_config: dict - database configuration
 
     Returns:
-        dict - a dictionary containing user_id, t_id, c_id, and attempt_no
+        dict - {s_question_id: row} for the rows which have a transcription_text
     """
+    s_question_ids = list(dict.fromkeys(s_question_ids))
+    if not s_question_ids:
+        return {}
     try:
-        with mysql.connector.connect(**db_config) as connection:
+        with get_connection(db_config) as connection:
             with connection.cursor(dictionary=True) as cursor:
-                for result in results:
-                    s_question_id:int = result.get("s_question_id", None)
-                    query = f"""
-                        SELECT sq.user_id, sq.t_id, sq.c_id, sq.attempt_no
-                        FROM student_questions sq
-                        WHERE sq.s_question_id = {s_question_id}
-                    """
-                    cursor.execute(query)
-                    result = cursor.fetchone()
-                    if result:
-                        logger.info(f"Retrieved student_course info for s_question_id {s_question_id}")
-                        return result
-                    else:
-                        logger.warning(f"No student_course information found for s_question_id {s_question_id}")
-                        return {}
+                placeholders = ', '.join(['%s'] * len(s_question_ids))
+                query = f"""
+                    SELECT var.s_question_id, var.transcription_id, var.video_link, var.transcription_text,
+                           var.answer_keywords, var.q_subtype_id, var.answer_explanation, var.status
+                    FROM video_auto_results var
+                    WHERE var.s_question_id IN ({placeholders}) AND var.transcription_text IS NOT NULL
+                """
+                cursor.execute(query, tuple(s_question_ids))
+                rows = {row['s_question_id']: row for row in cursor.fetchall()}
+        logger.info(f"Found {len(rows)} stored transcriptions for {len(s_question_ids)} s_question_ids.")
+        return rows
     except mysql.connector.Error as err:
         logger.exception(f"MySQL Error: {err}")
         return {}
@@ -227,63 +375,263 @@ def retrieve_student_course_info(results: dict, db_config: dict) -> dict:
         logger.exception(f"An unexpected error occurred: {e}")
         return {}
 
+ATTEMPT_LOOKUP_BATCH_SIZE = 500
+ATTEMPT_KEYS = ('user_id', 't_id', 'c_id', 'attempt_no')
+
+@timed('attempt_lookup')
+def retrieve_student_attempts(s_question_ids: list, db_config: dict,
+                              batch_size: int = ATTEMPT_LOOKUP_BATCH_SIZE) -> dict:
+    """
+    Function to resolve the attempt (user_id, t_id, c_id, attempt_no) of every s_question_id of a batch.
+
+    One parameterised `IN (...)` query per `batch_size` ids, executed as a server side prepared
+    statement which is re-executed for every full chunk.
+
+    Params:
+        s_question_ids: list - the s_question_ids of the batch
+        db_config: dict - database configuration
+
+    Returns:
+        dict - {s_question_id: {user_id, t_id, c_id, attempt_no}}, ids without a student_questions row are absent
+
+    Raises:
+        mysql.connector.Error: The lookup failed, an empty result would drop the marks of the whole batch.
+    """
+    s_question_ids = list(dict.fromkeys(s_question_id for s_question_id in s_question_ids if s_question_id is not None))
+    if not s_question_ids:
+        return {}
+    attempts = {}
+    try:
+        with get_connection(db_config) as connection:
+            with connection.cursor(prepared=True, dictionary=True) as cursor:
+                for start in range(0, len(s_question_ids), batch_size):
+                    chunk = s_question_ids[start:start + batch_size]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    query = f"""
+                        SELECT sq.s_question_id, sq.user_id, sq.t_id, sq.c_id, sq.attempt_no
+                        FROM student_questions sq
+                        WHERE sq.s_question_id IN ({placeholders})
+                    """
+                    cursor.execute(query, tuple(chunk))
+                    for row in cursor.fetchall():
+                        attempts[row['s_question_id']] = {key: row[key] for key in ATTEMPT_KEYS}
+        missing = len(s_question_ids) - len(attempts)
+        if missing:
+            logger.warning(f"No student_course information found for {missing} of {len(s_question_ids)} s_question_ids.")
+        return attempts
+    except mysql.connector.Error as err:
+        logger.exception(f"MySQL Error: {err}")
+        raise
+
+def group_by_attempt(results: list, attempts: dict) -> dict:
+    """
+    Groups the processed questions of a batch per attempt.
+
+    Params:
+        results: list - processed questions, each with its s_question_id
+        attempts: dict - output of `retrieve_student_attempts`
 
-async def update_student_questions(results: dict, db_config: dict) -> None:
+    Returns:
+        dict - {(user_id, t_id, c_id, attempt_no): [results]}, in the order the attempts first appear
+    """
+    groups = {}
+    for result in results:
+        attempt = attempts.get(result.get("s_question_id"))
+        if attempt is not None:
+            groups.setdefault(tuple(attempt[key] for key in ATTEMPT_KEYS), []).append(result)
+    return groups
+
+def retrieve_student_course_info(results: dict, db_config: dict) -> dict:
+    """
+    Function to retrieve the user_id, t_id, c_id, and attempt_no from the student_course table based on s_question_id.
+    Returns the attempt of the first question of `results` which has one, see `retrieve_student_attempts`
+    for batches spanning several attempts.
+
+    Params:
+        results: list - processed questions, each with its s_question_id
+        db_config: dict - database configuration
+
+    Returns:
+        dict - a dictionary containing user_id, t_id, c_id, and attempt_no
+    """
+    s_question_ids = [result.get("s_question_id") for result in results]
+    attempts = retrieve_student_attempts(s_question_ids, db_config)
+    for s_question_id in s_question_ids:
+        if s_question_id in attempts:
+            logger.info(f"Retrieved student_course info for s_question_id {s_question_id}")
+            return attempts[s_question_id]
+    return {}
+
+
+UPDATE_STUDENT_QUESTIONS_BATCH_SIZE = 500
+
+@timed('student_questions')
+def update_student_questions(results: dict, db_config: dict, batch_size: int = UPDATE_STUDENT_QUESTIONS_BATCH_SIZE,
+                             scores: dict | None = None) -> None:
     """
     Performs the operation for updating the `student_questions` table for marks field.
 
+    All the s_question_ids of the batch are updated with one joined UPDATE (one per `batch_size`
+    ids), reading `video_auto_results.overall_score` once per row:
+        - marks : overall_score, 0 when there is no score
+        - state : 1 when the score equals q_total_marks, 2 when it is 0, 4 for partial marks
+                  and NULL when there is no score
+    When `scores` is given the scores are joined from the statement parameters instead.
+
     Params:
         results (dict): The response header containing student question data.
         db_config (dict): The database configuration for MySQL connection.
+        batch_size (int): Maximum number of s_question_ids per UPDATE statement.
+        scores (dict): {s_question_id: rating} already known by the caller, normalised with `rating_score`.
     """
-    logger.info(f"Updating the `student_questions` table with {len(results)} rows.")
-    
+    s_question_ids = list(dict.fromkeys(
+        result.get("s_question_id") for result in results if result.get("s_question_id") is not None
+    ))
+    logger.info(f"Updating the `student_questions` table with {len(s_question_ids)} rows.")
+    if not s_question_ids:
+        return
+
     try:
-        # Establishing the MySQL connection
-        with mysql.connector.connect(**db_config) as connection:
+        # Borrowing a pooled MySQL connection
+        with get_connection(db_config) as connection:
             with connection.cursor() as cursor:
-                
-                # Iterate over each result to update `student_questions`
-                for result in results:
-                    s_question_id = result.get("s_question_id")
-                    
-                    # Prepare the query with placeholders to avoid SQL injection
-                    query = """
+
+                for start in range(0, len(s_question_ids), batch_size):
+                    chunk = s_question_ids[start:start + batch_size]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+
+                    # One joined UPDATE for the whole chunk, placeholders avoid SQL injection
+                    if scores is None:
+                        source = "video_auto_results"
+                        params = tuple(chunk)
+                    else:
+                        source = "(" + " UNION ALL ".join(["SELECT %s AS s_question_id, %s AS overall_score"] * len(chunk)) + ")"
+                        # numbers only, a string in the derived table would turn `overall_score` into text
+                        params = tuple(value for s_question_id in chunk
+                                       for value in (s_question_id, rating_score(scores.get(s_question_id)))
+                                       ) + tuple(chunk)
+                    query = f"""
                     UPDATE student_questions AS sq
-                    SET 
-                        sq.marks = (
-                            CASE 
-                                WHEN EXISTS (SELECT 1 FROM video_auto_results WHERE s_question_id = %s AND overall_score IS NOT NULL) THEN
-                                    (SELECT overall_score FROM video_auto_results WHERE s_question_id = %s)
-                                ELSE
-                                    0
-                            END
-                        ),
+                    LEFT JOIN {source} AS var ON var.s_question_id = sq.s_question_id
+                    SET
+                        sq.marks = COALESCE(var.overall_score, 0),
                         sq.state = (
                             CASE
-                                WHEN EXISTS (SELECT 1 FROM video_auto_results WHERE s_question_id = %s AND overall_score IS NOT NULL) THEN
-                                    IF ((SELECT overall_score FROM video_auto_results WHERE s_question_id = %s) = sq.q_total_marks, 1,
-                                        IF ((SELECT overall_score FROM video_auto_results WHERE s_question_id = %s) = 0, 2, 4)
-                                    )
+                                WHEN var.overall_score IS NULL THEN NULL
+                                WHEN var.overall_score = sq.q_total_marks THEN 1
+                                WHEN var.overall_score = 0 THEN 2
+                                ELSE 4
                             END
                         )
-                    WHERE sq.s_question_id = %s;
+                    WHERE sq.s_question_id IN ({placeholders});
                     """
-                    
-                    # Execute the query with the correct parameters
-                    cursor.execute(query, (s_question_id, s_question_id, s_question_id, s_question_id, s_question_id, s_question_id))
-                    
-                    logger.info(f"Updated student_questions table for s_question_id: {s_question_id}")
-                
+                    cursor.execute(query, params)
+
                 # Commit the transaction
                 connection.commit()
-                
+                logger.info(f"Updated student_questions table for {len(s_question_ids)} s_question_ids.")
+
     except mysql.connector.Error as err:
         logger.exception(f"MySQL Error: {err}")
     except Exception as e:
+        if in_unit_of_work():
+            raise
         logger.exception(f"An unexpected error occurred: {e}")
 
 
+def write_attempt_results(results: list, db_config: dict, attempt: dict | None = None) -> float | None:
+    """
+    The DB writes of one attempt after its questions are processed: `video_auto_results` rows,
+    `student_questions` marks from the in-memory ratings, then the attempt level marks (`write_attempt_marks`).
+    Meant to run inside `run_in_unit_of_work` so they share one connection and one commit, a reader never
+    sees the rows of an attempt without its marks.
+
+    Params:
+        results: list - processed questions of the attempt
+        db_config: dict - database configuration
+        attempt: dict - {user_id, t_id, c_id, attempt_no}, None for questions without a student attempt
+
+    Returns:
+        float - the overall rating out of 10, None without attempt or rated question
+    """
+    if not insert_data_into_mysql(results, db_config):
+        raise RuntimeError(f"DB insert failed for {len(results)} questions.")
+    scores = {result.get("s_question_id"): feedback_rating(result.get('feedback', '[]')) for result in results}
+    update_student_questions(results, db_config, scores=scores)
+    if attempt is None:
+        return None
+    return write_attempt_marks(db_config, attempt)
+
+
+def overall_rating(ratings: list) -> float | None:
+    """
+    Overall rating of an attempt out of 10: the average of its per-question ratings, as the overall
+    feedback prompt asks the LLM to compute it.
+
+    Params:
+        ratings: list - per-question ratings out of 10, unrated questions (None or not numeric) are left out
+
+    Returns:
+        float - the average rounded to 2 decimals, None when no question is rated
+    """
+    rated = [score for score in map(rating_score, ratings) if score is not None]
+    return round(sum(rated) / len(rated), 2) if rated else None
+
+
+def _attempt_ratings(cursor, user_id: str, c_id: str, t_id: str, attempt_no: int) -> list:
+    """
+    Per-question ratings (`video_auto_results.overall_score`) of every question of the attempt which has feedback.
+    """
+    query = """
+        SELECT var.overall_score
+        FROM video_auto_results var
+        INNER JOIN student_questions sq ON sq.s_question_id = var.s_question_id
+        WHERE sq.user_id = %s AND sq.c_id = %s AND sq.t_id = %s AND sq.attempt_no = %s
+          AND var.feedback IS NOT NULL
+    """
+    cursor.execute(query, (user_id, c_id, t_id, attempt_no))
+    return [row[0] for row in cursor.fetchall()]
+
+
+@timed('overall_score_write')
+def update_overall_score(db_config: dict, user_id: str, t_id: str, c_id: str, attempt_no: int) -> float | None:
+    """
+    Writes `student_course.t_marks` from the overall rating computed from the attempt's question ratings,
+    scaled from out of 10 to `t_total_marks`. No LLM is involved, the marks do not wait for the narrative.
+
+    Returns:
+        float - the overall rating out of 10, None when no question of the attempt is rated yet
+    """
+    with get_connection(db_config) as connection:
+        with connection.cursor() as cursor:
+            rating = overall_rating(_attempt_ratings(cursor, user_id, c_id, t_id, attempt_no))
+            if rating is None:
+                logger.warning(f"No rated question for {user_id}:{t_id}:{attempt_no}, t_marks left unchanged.")
+                return None
+            cursor.execute("""
+                UPDATE student_course
+                SET t_marks = %s / 10 * t_total_marks
+                WHERE user_id = %s AND c_id = %s AND t_id = %s AND attempt_no = %s
+            """, (rating, user_id, c_id, t_id, attempt_no))
+        connection.commit()
+    logger.info(f"Overall rating of {user_id}:{t_id}:{attempt_no} is {rating}.")
+    return rating
+
+
+def write_attempt_marks(db_config: dict, attempt: dict) -> float | None:
+    """
+    The attempt level marks once its questions are written: section wise marks and the overall score.
+    Both update the attempt's `student_course` row, `write_attempt_results` runs it in the unit of its question rows.
+
+    Returns:
+        float - the overall rating out of 10, see `update_overall_score`
+    """
+    update_section_wise_marks(db_config, attempt['t_id'], user_id=attempt['user_id'], c_id=attempt['c_id'],
+                              attempt_no=attempt['attempt_no'])
+    return update_overall_score(db_config, attempt['user_id'], attempt['t_id'], attempt['c_id'],
+                                attempt['attempt_no'])
+
+
 def update_student_course(results:dict,db_config:dict)->None:
     """
     Function to update the `student_course` table with feilds t_marks and section wise marks.
@@ -293,7 +641,7 @@ def update_student_course(results:dict,db_config:dict)->None:
     """
     logger.info(f"Updating the student_course table.")
     try:
-        with mysql.connector.connect(**db_config) as connection:
+        with get_connection(db_config) as connection:
             with connection.cursor() as cursor:
                 for result in results:
                     s_question_id:int = result.get("s_question_id", None)
@@ -322,31 +670,50 @@ def update_student_course(results:dict,db_config:dict)->None:
     except Exception as e:
         logger.exception(f"An unexpected error occurred: {e}")
 
+@timed('questions_feedback_read')
 def get_questions_feedback(test_id:str|None,attempt_no:int|None,user_id:str|None,db_config:dict|None)->str:
     """
+    The per-question feedback of an attempt for the overall feedback prompt, compacted to
+    `FEEDBACK_TOKEN_BUDGET` estimated tokens (see `compact_question_feedback`).
+
+    Params:
+        test_id: str - t_id of the attempt
+        attempt_no: int - attempt number
+        user_id: str - candidate
+        db_config: dict - database configuration
+
+    Returns:
+        str - one line per question
     """
     feedback_list = []
     try:
-        with mysql.connector.connect(**db_config) as connector:
+        with get_connection(db_config) as connector:
             with connector.cursor() as cursor:
-                query:str = f"""
+                query:str = """
                 select
                 var.feedback
                 from
                 video_auto_results as var
                 inner join student_questions sq on sq.s_question_id = var.s_question_id
                 where
-                sq.t_id = '{test_id}'
-                and sq.attempt_no = {attempt_no}
-                and sq.user_id = '{user_id}'
-                and var.feedback is not null;
+                sq.t_id = %s
+                and sq.attempt_no = %s
+                and sq.user_id = %s
+                and var.feedback is not null
+                order by var.s_question_id;
                 """
-                cursor.execute(query)
+                cursor.execute(query, (test_id, attempt_no, user_id))
                 results = cursor.fetchall()
                 for result in results:
                     feedback_list.append(result[0])
 
-        feedback_string = "\n".join(feedback_list)
+        if not feedback_token_budget:
+            return "\n".join(feedback_list)
+        feedback_string, stats = compact_question_feedback(feedback_list, feedback_token_budget)
+        PROMPT_TOKENS.observe(stats['tokens_before'], form='raw')
+        PROMPT_TOKENS.observe(stats['tokens_after'], form='compacted')
+        COMPACTION_TIERS.inc(tier=stats['tier'])
+        logger.info(f"Question feedback of {user_id}:{test_id}:{attempt_no} compacted: {stats}")
         return feedback_string
     except Exception as e:
         raise e
@@ -360,6 +727,7 @@ def get_questions_feedback(test_id:str|None,attempt_no:int|None,user_id:str|None
 #         return {key: trim_strings(value) for key, value in obj.items()}
 #     return obj
 
+@timed('test_level_write')
 def update_test_level(db_config: dict | None,
                       user_id: str | None,
                       t_id: str | None,
@@ -367,7 +735,10 @@ def update_test_level(db_config: dict | None,
                       attempt_no: str | None,
                       overall_feedback: str | None) -> None:
     """
-    Update the overall feedback for a specific test attempt in the database, scaling the rating out of 10 into a score out of 30.
+    Update the overall feedback for a specific test attempt in the database.
+    The score is not taken from the LLM: the overall rating is computed from the attempt's question ratings
+    (see `overall_rating`) and written in the feedback in place of the LLM's one. `t_marks` is left to
+    `write_attempt_results`, which writes it with the question rows.
 
     Args:
         db_config (Optional[Dict[str, str]]): Database configuration dictionary.
@@ -393,61 +764,48 @@ def update_test_level(db_config: dict | None,
         else:
             raise ValueError("Overall feedback is either not a string or is empty")
 
-        # Extract the overall rating
-        overall_rating = overall_feedback_dict.get('overall_score')
-        if isinstance(overall_rating, dict):
-            overall_rating = overall_rating.get('Overall Rating')
-
-        # Ensure the extracted overall_rating is numeric
-        if not isinstance(overall_rating, (int, float)):
-            raise ValueError("Overall rating should be a numeric value.")
+        # Step 1: Borrow a pooled connection and compute the overall rating from the question ratings
+        with get_connection(db_config) as connector:
+            with connector.cursor() as cursor:
+                cursor.execute("""
+                SELECT t_total_marks
+                FROM student_course
+                WHERE user_id = %s AND c_id = %s AND t_id = %s AND attempt_no = %s
+                """, (user_id, c_id, t_id, attempt_no))
+                if cursor.fetchone() is None:
+                    raise ValueError("No matching record found for the given user, course, test, and attempt number.")
+
+                rating = overall_rating(_attempt_ratings(cursor, user_id, c_id, t_id, attempt_no))
+                if rating is None:
+                    raise ValueError("No rated question found for the given user, course, test, and attempt number.")
+
+                # Step 2: the feedback shows the same rating as the marks
+                overall_score = overall_feedback_dict.get('overall_score')
+                if isinstance(overall_score, dict):
+                    llm_rating = overall_score.get('Overall Rating')
+                    overall_score['Overall Rating'] = rating
+                else:
+                    llm_rating = overall_score
+                    overall_feedback_dict['overall_score'] = rating
+                if isinstance(llm_rating, (int, float)) and abs(llm_rating - rating) > 0.5:
+                    logger.info(f"LLM overall rating {llm_rating} replaced by the computed rating {rating}.")
+
+                # Step 3: Execute the update query with the JSON feedback
+                update_query = """
+                UPDATE
+                    student_course
+                SET
+                    overall_feedback = %s
+                WHERE
+                    user_id = %s
+                    AND c_id = %s
+                    AND t_id = %s
+                    AND attempt_no = %s
+                """
+                cursor.execute(update_query, (json.dumps(overall_feedback_dict), user_id, c_id, t_id, attempt_no))
 
-        # Step 1: Connect to the database and retrieve t_total_marks
-        connector = mysql.connector.connect(**db_config)
-        cursor = connector.cursor()
-        try:
-            # Retrieve t_total_marks for the specific test
-            select_query = """
-            SELECT t_total_marks
-            FROM student_course
-            WHERE user_id = %s AND c_id = %s AND t_id = %s AND attempt_no = %s
-            """
-            cursor.execute(select_query, (user_id, c_id, t_id, attempt_no))
-            result = cursor.fetchone()
-
-            if result is None:
-                raise ValueError("No matching record found for the given user, course, test, and attempt number.")
-
-            t_total_marks = result[0]  # Assuming t_total_marks is the first (and only) column returned
-
-            scaled_rating = (overall_rating / 10) * t_total_marks
-
-            # Convert the feedback dictionary back to JSON string
-            overall_feedback_json = json.dumps(overall_feedback_dict)
-
-            # Step 3: Prepare the update query
-            update_query = """
-            UPDATE
-                student_course
-            SET
-                overall_feedback = %s,
-                t_marks = %s
-            WHERE
-                user_id = %s
-                AND c_id = %s
-                AND t_id = %s
-                AND attempt_no = %s
-            """
-
-            # Execute the update query with scaled rating and JSON feedback
-            cursor.execute(update_query, (overall_feedback_json, scaled_rating, user_id, c_id, t_id, attempt_no))
-
-            # Commit the changes
-            connector.commit()
-
-        finally:
-            cursor.close()
-            connector.close()
+                # Commit the changes
+                connector.commit()
 
     except Exception as e:
         raise Exception(f"Error updating test level feedback: {e}")
@@ -0,0 +1,319 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import mysql.connector
+from mysql.connector import pooling
+from src.neoscreener.logger import logger
+from src.utils.exceptions import DBConfigException, DBPoolTimeoutException
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_TIMEOUT = 30.0
+# ER_LOCK_DEADLOCK and ER_LOCK_WAIT_TIMEOUT, the transaction was rolled back and can be replayed
+RETRYABLE_ERRNOS = (1213, 1205)
+
+
+class DBPool:
+    """
+    Process wide pool of MySQL connections shared by every function in `db_ops`.
+
+    The underlying `MySQLConnectionPool` is created lazily on the first checkout so that
+    importing the app (or preloading it in the gunicorn master) never opens a connection.
+    A forked worker detects that it does not own the pool (pid check) and builds its own.
+    """
+    def __init__(self, db_config: dict, pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_POOL_TIMEOUT, pool_name: str = 'neo_screener'):
+        if not db_config:
+            raise DBConfigException()
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.pool_name = pool_name
+        self.pid = os.getpid()
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        # stats used to size the pool
+        self.checkouts = 0
+        self.in_use = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _get_pool(self) -> pooling.MySQLConnectionPool:
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"Creating MySQL connection pool `{self.pool_name}` of size {self.pool_size} for pid {self.pid}.")
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name=f"{self.pool_name}_{self.pid}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    **self.db_config
+                )
+            return self._pool
+
+    def _health_check(self, connection) -> None:
+        """
+        Ping the borrowed connection and transparently reconnect it when the server dropped it.
+        """
+        try:
+            connection.ping(reconnect=False)
+        except mysql.connector.Error:
+            logger.warning(f"Pooled MySQL connection failed the health check, reconnecting.")
+            connection.ping(reconnect=True, attempts=3, delay=1)
+            with self._lock:
+                self.reconnects += 1
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool, waiting up to `timeout` seconds for a free slot.
+        Uncommitted work is rolled back when the block raises.
+        """
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise DBPoolTimeoutException(self.pool_size, self.timeout)
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+        connection = None
+        try:
+            connection = self._get_pool().get_connection()
+            self._health_check(connection)
+            yield connection
+        except Exception:
+            if connection is not None:
+                try:
+                    connection.rollback()
+                except mysql.connector.Error:
+                    pass
+            raise
+        finally:
+            if connection is not None:
+                connection.close()  # returns the connection to the pool
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def close(self) -> None:
+        """
+        Close the idle connections of the pool, used when the worker shuts down or recycles.
+        """
+        with self._lock:
+            if self._pool is not None and self.pid == os.getpid():
+                self._pool._remove_connections()
+                logger.info(f"Closed MySQL connection pool `{self.pool_name}` for pid {self.pid}.")
+            self._pool = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'wait_time_total_seconds': round(self.wait_time_total, 6),
+                'wait_time_avg_seconds': round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+                'wait_time_max_seconds': round(self.wait_time_max, 6),
+            }
+
+
+_pool: DBPool | None = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(db_config: dict, pool_size: int | None = None, timeout: float | None = None) -> DBPool:
+    """
+    Build the process wide pool from the `db_config` assembled in `main.py`.
+
+    Params:
+        db_config: dict - database configuration
+        pool_size: int - number of pooled connections, defaults to `MY_SQL_POOL_SIZE`
+        timeout: float - seconds to wait for a free connection, defaults to `MY_SQL_POOL_TIMEOUT`
+    """
+    global _pool
+    pool_size = int(pool_size or os.getenv('MY_SQL_POOL_SIZE', DEFAULT_POOL_SIZE))
+    timeout = float(timeout or os.getenv('MY_SQL_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT))
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = DBPool(db_config, pool_size=pool_size, timeout=timeout)
+        return _pool
+
+
+def _current_pool(db_config: dict) -> DBPool:
+    global _pool
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None:
+                _pool = DBPool(db_config,
+                               pool_size=int(os.getenv('MY_SQL_POOL_SIZE', DEFAULT_POOL_SIZE)),
+                               timeout=float(os.getenv('MY_SQL_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)))
+            elif _pool.pid != os.getpid():
+                # inherited through fork, never reuse the parent's sockets
+                _pool = DBPool(_pool.db_config, pool_size=_pool.pool_size, timeout=_pool.timeout)
+            pool = _pool
+    return pool
+
+
+class _UnitCursor:
+    """
+    Cursor of a unit of work, remembers the first MySQL error even when the caller swallows it.
+    """
+    def __init__(self, cursor, unit: 'UnitOfWork'):
+        self._cursor = cursor
+        self._unit = unit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def _run(self, method, *args):
+        if self._unit.error is not None:
+            raise self._unit.error  # the transaction is already lost, skip the remaining statements
+        try:
+            return method(*args)
+        except mysql.connector.Error as err:
+            self._unit.error = err
+            raise
+
+    def execute(self, *args):
+        return self._run(self._cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._run(self._cursor.executemany, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _UnitConnection:
+    """
+    Connection handed out by `get_connection` inside a unit of work, commits are deferred to the unit.
+    """
+    def __init__(self, connection, unit: 'UnitOfWork'):
+        self._connection = connection
+        self._unit = unit
+
+    def cursor(self, *args, **kwargs):
+        return _UnitCursor(self._connection.cursor(*args, **kwargs), self._unit)
+
+    def commit(self) -> None:
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class UnitOfWork:
+    """
+    One borrowed connection and one transaction shared by every `db_ops` call made inside it.
+    """
+    def __init__(self, connection):
+        self.connection = _UnitConnection(connection, self)
+        self.error: mysql.connector.Error | None = None
+
+
+_unit_of_work: contextvars.ContextVar[UnitOfWork | None] = contextvars.ContextVar('unit_of_work', default=None)
+
+
+def in_unit_of_work() -> bool:
+    """
+    Whether the caller runs inside `run_in_unit_of_work`. `db_ops` functions which log unexpected errors
+    re-raise them there, a unit must not commit with one of its writes missing.
+    """
+    return _unit_of_work.get() is not None
+
+
+def run_in_unit_of_work(db_config: dict, func, *args, attempts: int = 3, **kwargs):
+    """
+    Run the blocking `func(*args, **kwargs)` with every `get_connection` call it makes sharing one pooled
+    connection, committed once when `func` returns. A deadlock or lock wait timeout rolls the whole unit
+    back and replays it, up to `attempts` times. Any other MySQL error rolls back and is raised, also when
+    the `db_ops` function which hit it only logged it. Any other exception rolls back and is raised as well.
+
+    Params:
+        db_config: dict - database configuration
+        func: callable - the chain of `db_ops` calls, must be safe to replay
+        attempts: int - total number of runs on deadlock
+    """
+    for attempt in range(1, attempts + 1):
+        with _current_pool(db_config).connection() as connection:
+            unit = UnitOfWork(connection)
+            token = _unit_of_work.set(unit)
+            try:
+                result = func(*args, **kwargs)
+                if unit.error is not None:
+                    raise unit.error
+                connection.commit()
+                return result
+            except mysql.connector.Error as err:
+                connection.rollback()
+                if err.errno not in RETRYABLE_ERRNOS or attempt == attempts:
+                    raise
+                delay = random.uniform(0, 0.1 * (2 ** attempt))
+                logger.warning(f"Unit of work hit `{err}` (attempt {attempt}/{attempts}), replaying in {delay:.2f}s.")
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                _unit_of_work.reset(token)
+        time.sleep(delay)
+
+
+def get_connection(db_config: dict):
+    """
+    Context manager borrowing a health-checked connection from the process wide pool.
+    Inside `run_in_unit_of_work` it yields the connection of the unit instead.
+
+    Params:
+        db_config: dict - database configuration, used only when the pool is not built yet
+    """
+    unit = _unit_of_work.get()
+    if unit is not None:
+        return nullcontext(unit.connection)
+    return _current_pool(db_config).connection()
+
+
+def close_pool() -> None:
+    """
+    Release every pooled connection, called on worker shutdown (including `max_requests` recycling).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+def pool_stats() -> dict:
+    """
+    Returns the checkout counts and wait times of the pool, empty when it is not built yet.
+    """
+    pool = _pool
+    return pool.stats() if pool is not None and pool.pid == os.getpid() else {}
+
+
+def ping_database(db_config: dict) -> None:
+    """
+    Borrow a pooled connection and run `SELECT 1` on it, raises when MySQL cannot be reached.
+    """
+    with get_connection(db_config) as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
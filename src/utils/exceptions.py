@@ -33,4 +33,68 @@ class DBConfigException(Exception):
     """
     def __init__(self):
         self.message = f"DB Configurations are missing."
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class DBPoolTimeoutException(Exception):
+    """
+    A custom exception to raise when no pooled MySQL connection becomes free in time.
+    """
+    def __init__(self, pool_size: int, timeout: float):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.message = f"No MySQL connection available from the pool of size {self.pool_size} after {self.timeout} seconds."
+        super().__init__(self.message)
+
+
+class SchedulerSaturatedException(Exception):
+    """
+    A custom exception to raise when a dependency of the scheduler cannot queue more calls.
+    """
+    def __init__(self, dependency: str, waiting: int):
+        self.dependency = dependency
+        self.waiting = waiting
+        self.message = f"Scheduler is saturated for `{self.dependency}` with {self.waiting} calls waiting."
+        super().__init__(self.message)
+
+
+class CircuitOpenException(Exception):
+    """
+    A custom exception to raise when a provider call is refused because its circuit is open.
+    """
+    def __init__(self, provider: str, retry_after: float):
+        self.provider = provider
+        self.retry_after = retry_after
+        self.message = f"Circuit for `{self.provider}` is open, retry after {self.retry_after:.0f} seconds."
+        super().__init__(self.message)
+
+
+class PartialBatchException(Exception):
+    """
+    A custom exception to raise when only part of a batch could be processed, so the job is retried.
+    """
+    def __init__(self, failed: list, total: int):
+        self.failed = failed
+        self.total = total
+        self.message = f"{len(self.failed)} of {self.total} questions failed: {self.failed}"
+        super().__init__(self.message)
+
+
+class ConfigValidationException(Exception):
+    """
+    A custom exception to raise when a config file does not have the keys or prompt fields the pipelines use.
+    """
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.message = f"Invalid config: {self.reason}"
+        super().__init__(self.message)
+
+
+class MediaPreprocessException(Exception):
+    """
+    A custom exception to raise when the audio of an answer media could not be extracted.
+    """
+    def __init__(self, url: str, reason: str):
+        self.url = url
+        self.reason = reason
+        self.message = f"Audio could not be extracted from the media: {self.reason}"
+        super().__init__(self.message)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+EMPTY_RESPONSE_FEEDBACK = {
+    'area_of_improvement': 'The candidate did not provide a response to the question.',
+    'strength': 'No data found',
+    'suggestions': 'Answer the question with a clear explanation supported by examples.',
+    'Rating': 0,
+}
+
+
+def normalise_transcript(transcript: str | None) -> str:
+    """
+    Transcript used in the cache key: case and whitespace do not change the feedback.
+    """
+    return re.sub(r'\s+', ' ', (transcript or '')).strip().lower()
+
+
+def is_blank_response(transcript: str | None) -> bool:
+    return not re.sub(r'[\W_]+', '', transcript or '')
+
+
+def empty_response_feedback(question: str) -> str:
+    """
+    Feedback of an empty answer, which the prompt always rates 0, in the per-question output format.
+    """
+    return json.dumps([{'question': question, **EMPTY_RESPONSE_FEEDBACK}])
+
+
+def feedback_cache_key(question: str, transcript: str, prompt_version: str) -> str:
+    key = '\x00'.join((question.strip(), normalise_transcript(transcript), prompt_version))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class FeedbackCache:
+    """
+    Per-question GenAI feedback keyed by question, normalised transcript and prompt version, persisted
+    in a local SQLite file with a time to live and least recently used eviction past `max_entries`.
+
+    Args:
+        path (str): SQLite file.
+        prompt_version (str | callable): Version of the feedback prompt, a new prompt never reuses old feedback.
+            A callable is asked on every lookup, e.g. the version of a reloaded config.
+        max_entries (int): Entries kept before evicting the least recently used ones.
+        ttl (float): Seconds a feedback stays valid.
+    """
+    def __init__(self, path: str, prompt_version, max_entries: int = 100000, ttl: float = 30 * 24 * 3600):
+        self.path = path
+        self._prompt_version = prompt_version if callable(prompt_version) else lambda: prompt_version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.empty_short_circuits = 0
+        self.llm_calls = 0
+        self._writes = 0
+        # the file is created on first use, so importing the app in the gunicorn master touches nothing
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self._create_schema()
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _create_schema(self) -> None:
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS feedback (
+                        cache_key TEXT PRIMARY KEY,
+                        feedback TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                """)
+                connection.execute("CREATE INDEX IF NOT EXISTS feedback_accessed ON feedback (accessed_at)")
+            self._schema_ready = True
+
+    @property
+    def prompt_version(self) -> str:
+        return self._prompt_version()
+
+    def key(self, question: str, transcript: str) -> str:
+        return feedback_cache_key(question, transcript, self.prompt_version)
+
+    def get(self, question: str, transcript: str) -> str | None:
+        now = time.time()
+        key = self.key(question, transcript)
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT feedback FROM feedback WHERE cache_key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE feedback SET accessed_at = ? WHERE cache_key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row else None
+
+    def set(self, question: str, transcript: str, feedback: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % 100 == 1  # amortise the eviction scan
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO feedback (cache_key, feedback, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (self.key(question, transcript), feedback, now, now)
+            )
+            if not evict:
+                return
+            connection.execute("DELETE FROM feedback WHERE created_at <= ?", (now - self.ttl,))
+            connection.execute(
+                """DELETE FROM feedback WHERE cache_key IN (
+                       SELECT cache_key FROM feedback ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,)
+            )
+
+    def record_empty(self) -> None:
+        with self._lock:
+            self.empty_short_circuits += 1
+
+    def record_llm_call(self) -> None:
+        with self._lock:
+            self.llm_calls += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'prompt_version': self.prompt_version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'empty_short_circuits': self.empty_short_circuits,
+                'llm_calls': self.llm_calls,
+                'llm_calls_saved': self.hits + self.empty_short_circuits,
+            }
+
+
+def is_valid_feedback(feedback) -> bool:
+    """
+    Only well formed feedback (the JSON list `insert_data_into_mysql` reads the rating from) is cached.
+    """
+    if not isinstance(feedback, str):
+        return False
+    try:
+        return isinstance(json.loads(feedback.strip()), list)
+    except json.JSONDecodeError:
+        return False
@@ -0,0 +1,123 @@
+import json
+import re
+
+# rough size of a token for English prose, the Gemini tokenizer is only reachable through the API
+CHARS_PER_TOKEN = 4
+# placeholder the per-question prompt asks for when there is no strength, it tells the LLM nothing
+NO_DATA = 'no data found'
+# fit tiers, tried in order until the feedback fits the budget
+FULL = 'full'
+TRIMMED = 'trimmed'
+RATINGS_AND_IMPROVEMENTS = 'ratings_and_improvements'
+RATINGS_ONLY = 'ratings_only'
+SUMMARY = 'summary'
+TEXT_FIELDS = ('question', 'strength', 'improvement', 'suggestions', 'feedback')
+MIN_FIELD_CHARS = 60
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _clean(value) -> str:
+    return re.sub(r'\s+', ' ', str(value or '')).strip()
+
+
+def _clip(text: str, limit: int) -> str:
+    """
+    `text` cut to `limit` characters at a word boundary.
+    """
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    return (cut.rsplit(' ', 1)[0] or cut) + '…'
+
+
+def _rating(value):
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(rating) if rating.is_integer() else rating
+
+
+def extract_feedback(blob: str) -> dict:
+    """
+    Rating, strength, improvement and suggestions of one per-question feedback (the JSON list stored in
+    `video_auto_results.feedback`). A blob which is not that JSON is kept whitespace-normalised as `feedback`.
+    """
+    try:
+        entries = json.loads(blob.strip())
+        entry = entries[0] if isinstance(entries, list) and entries else entries
+        if isinstance(entry, str):
+            entry = json.loads(entry)
+    except (json.JSONDecodeError, AttributeError):
+        entry = None
+    if not isinstance(entry, dict):
+        return {'rating': None, 'feedback': _clean(blob)}
+    return {
+        'rating': _rating(entry.get('Rating')),
+        'question': _clean(entry.get('question')),
+        'strength': _clean(entry.get('strength')),
+        'improvement': _clean(entry.get('area_of_improvement')),
+        'suggestions': _clean(entry.get('suggestions')),
+    }
+
+
+def _render(entries: list[dict], fields: tuple, limit: int | None = None) -> str:
+    lines = []
+    for number, entry in enumerate(entries, 1):
+        item = {'q': number, 'rating': entry['rating']}
+        for field in fields:
+            value = entry.get(field)
+            if value and value.lower() != NO_DATA:
+                item[field] = _clip(value, limit) if limit else value
+        lines.append(json.dumps(item, ensure_ascii=False))
+    return '\n'.join(lines)
+
+
+def _summary(entries: list[dict]) -> str:
+    ratings = [entry['rating'] for entry in entries if entry['rating'] is not None]
+    summary = {'questions': len(entries), 'rated': len(ratings)}
+    if ratings:
+        summary.update(average_rating=round(sum(ratings) / len(ratings), 2),
+                       lowest_rating=min(ratings), highest_rating=max(ratings))
+    return json.dumps(summary)
+
+
+def compact_question_feedback(blobs: list[str], token_budget: int) -> tuple[str, dict]:
+    """
+    Fits the per-question feedback of an attempt to `token_budget` tokens for the overall feedback prompt.
+    Each feedback is parsed once and reduced to its rating, strength, improvement and suggestions, one JSON
+    line per question. The first tier which fits wins, the same input always gives the same output:
+
+        full                      every field as stored
+        trimmed                   every field cut to an even share of the budget
+        ratings_and_improvements  the rating and the area of improvement of each question
+        ratings_only              the rating of each question
+        summary                   question count and average / lowest / highest rating
+
+    Returns:
+        (compacted feedback, {questions, unparsed, tier, tokens_before, tokens_after})
+    """
+    entries = [extract_feedback(blob) for blob in blobs]
+    stats = {'questions': len(entries), 'unparsed': sum('feedback' in entry for entry in entries),
+             'tokens_before': estimate_tokens('\n'.join(blobs))}
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    # characters left per question for its text fields, once its number and rating are written
+    share = budget_chars // max(len(entries), 1) - 30
+
+    candidates = [
+        (FULL, lambda: _render(entries, TEXT_FIELDS)),
+        (TRIMMED, lambda: _render(entries, TEXT_FIELDS, max(MIN_FIELD_CHARS, share // 4 - 20))),
+        (RATINGS_AND_IMPROVEMENTS, lambda: _render(entries, ('improvement',), max(MIN_FIELD_CHARS, share - 20))),
+        (RATINGS_ONLY, lambda: _render(entries, ())),
+    ]
+    for tier, render in candidates:
+        text = render()
+        if estimate_tokens(text) <= token_budget:
+            break
+    else:
+        tier, text = SUMMARY, _summary(entries)
+    stats.update(tier=tier, tokens_after=estimate_tokens(text))
+    return text, stats
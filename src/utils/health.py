@@ -0,0 +1,94 @@
+import asyncio
+import socket
+import time
+
+OK = 'ok'
+DEGRADED = 'degraded'
+UNAVAILABLE = 'unavailable'
+_SEVERITY = {OK: 0, DEGRADED: 1, UNAVAILABLE: 2}
+
+
+def worst_status(statuses) -> str:
+    """
+    Overall status of a set of checks, the most severe one wins.
+    """
+    return max(statuses, key=_SEVERITY.__getitem__, default=OK)
+
+
+class CachedProbe:
+    """
+    Dependency check run at most once per `ttl` seconds however often the endpoint is hit, and bounded
+    by `timeout` seconds, so load balancer polling never adds load to the dependency or hangs the probe.
+
+    Args:
+        name (str): Name of the check in the readiness report.
+        check: Blocking callable returning (status, details dict), run in a thread. Raising marks the
+            dependency unavailable.
+        ttl (float): Seconds a result is reused.
+        timeout (float): Seconds the check may take before the dependency is reported unavailable.
+    """
+    def __init__(self, name: str, check, ttl: float = 5.0, timeout: float = 2.0):
+        self.name = name
+        self.check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self._result = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._result is not None and time.monotonic() - self._checked_at < self.ttl
+
+    async def result(self) -> dict:
+        if self._fresh():
+            return self._result
+        # concurrent hits wait for the one refresh in progress instead of probing again
+        async with self._lock:
+            if self._fresh():
+                return self._result
+            started = time.perf_counter()
+            try:
+                status, details = await asyncio.wait_for(asyncio.to_thread(self.check), self.timeout)
+            except asyncio.TimeoutError:
+                status, details = UNAVAILABLE, {'error': f"probe timed out after {self.timeout}s"}
+            except Exception as e:
+                status, details = UNAVAILABLE, {'error': repr(e)}
+            self._result = {'status': status, **details,
+                            'probe_seconds': round(time.perf_counter() - started, 4),
+                            'checked_at': round(time.time(), 3)}
+            self._checked_at = time.monotonic()
+        return self._result
+
+
+def pool_check(stats: dict) -> tuple[str, dict]:
+    """
+    Status of the MySQL pool from its counters: every connection checked out means new work queues.
+    """
+    if stats and stats['in_use'] >= stats['pool_size']:
+        return DEGRADED, {'reason': 'every pooled connection is in use', **stats}
+    return OK, stats
+
+
+def queue_check(depth: int, degraded_depth: int, max_depth: int) -> tuple[str, dict]:
+    """
+    Status of the job queue: past `degraded_depth` jobs the backlog grows faster than it is served,
+    at `max_depth` new submissions are refused.
+    """
+    details = {'depth': depth, 'degraded_depth': degraded_depth, 'max_depth': max_depth}
+    if depth >= max_depth:
+        return UNAVAILABLE, {'reason': 'job queue full', **details}
+    if depth >= degraded_depth:
+        return DEGRADED, {'reason': 'job queue backlog', **details}
+    return OK, details
+
+
+def reachability_check(host: str, port: int = 443, timeout: float = 2.0) -> tuple[str, dict]:
+    """
+    Status of an external provider from a TCP connect to its API host, without spending any API quota.
+    An unreachable provider degrades the worker: jobs still queue and are retried once it is back.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return OK, {'host': host}
+    except OSError as e:
+        return DEGRADED, {'host': host, 'error': repr(e)}
@@ -0,0 +1,395 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from src.neoscreener.logger import logger
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class SQLiteJobQueue:
+    """
+    Durable job queue stored in a local SQLite file, shared by every worker process of the pod.
+
+    Delivery is at-least-once: a claimed job is leased for `lease_seconds` and is handed out again
+    when its worker dies before acknowledging it, so job handlers must be idempotent. The worker keeps
+    the lease alive with `heartbeat`, and every acknowledgement carries the lease token handed out by
+    `claim` so a worker whose lease was taken over cannot settle the job of its successor.
+
+    Args:
+        path (str): SQLite file, keep it on a volume which survives pod restarts.
+        lease_seconds (float): Time a claimed job stays invisible to other consumers.
+        max_attempts (int): Deliveries before a failing job is parked as `failed`.
+        retry_delay (float): Seconds a failed job waits before its next delivery, multiplied by the attempts.
+        retention_seconds (float): Finished and failed jobs older than this are removed by `purge`.
+    """
+    def __init__(self, path: str, lease_seconds: float = 900.0, max_attempts: int = 3, retry_delay: float = 30.0,
+                 retention_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention_seconds = retention_seconds
+        # the file is created on first use, so importing the app in the gunicorn master touches nothing
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self._create_schema()
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _create_schema(self) -> None:
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                # every worker runs this on its first use, the migration below must not race
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        job_id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        lease_until REAL,
+                        lease_token TEXT,
+                        last_error TEXT,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+                columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+                if 'lease_token' not in columns:
+                    # queue files created before leases were fenced
+                    connection.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+                connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+                connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at)")
+                connection.execute("COMMIT")
+            self._schema_ready = True
+
+    def enqueue(self, payload, kind: str = 'neo_screener', job_id: str | None = None) -> str:
+        """
+        Persist a job and return its id.
+        """
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, now, now)
+            )
+        return job_id
+
+    def claim(self) -> tuple[str, str, object, int, str] | None:
+        """
+        Lease the oldest queued job which is due, or a running job whose lease expired. An expired job
+        which already used up `max_attempts` (its worker kept dying on it) is parked as failed instead.
+
+        Returns:
+            (job_id, kind, payload, attempts, lease_token) or None when there is nothing to do.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                parked = connection.execute(
+                    """UPDATE jobs SET status = ?, lease_until = NULL, lease_token = NULL, updated_at = ?,
+                              last_error = COALESCE(last_error, 'lease expired on the last attempt')
+                       WHERE status = ? AND lease_until < ? AND attempts >= ?""",
+                    (FAILED, now, RUNNING, now, self.max_attempts)
+                ).rowcount
+                row = connection.execute(
+                    """SELECT job_id, kind, payload, attempts FROM jobs
+                       WHERE (status = ? AND (lease_until IS NULL OR lease_until <= ?))
+                          OR (status = ? AND lease_until < ?)
+                       ORDER BY created_at LIMIT 1""",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                lease_token = str(uuid.uuid4())
+                if row is not None:
+                    job_id, kind, payload, attempts = row
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, attempts = ?, lease_until = ?, lease_token = ?, updated_at = ? "
+                        "WHERE job_id = ?",
+                        (RUNNING, attempts + 1, now + self.lease_seconds, lease_token, now, job_id)
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        if parked:
+            logger.error(f"Parked {parked} jobs as failed, their lease expired on the last attempt.")
+        if row is None:
+            return None
+        return job_id, kind, json.loads(payload), attempts + 1, lease_token
+
+    def heartbeat(self, job_id: str, lease_token: str) -> bool:
+        """
+        Extend the lease of a running job by `lease_seconds`.
+        Returns False when the lease was lost, the job then belongs to another delivery.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE job_id = ? AND status = ? AND lease_token = ?",
+                (now + self.lease_seconds, now, job_id, RUNNING, lease_token)
+            ).rowcount == 1
+
+    def complete(self, job_id: str, lease_token: str) -> bool:
+        """
+        Mark a job as done. Returns False when the lease was lost and the job was left untouched.
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, lease_token = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = ? AND lease_token = ?",
+                (DONE, time.time(), job_id, RUNNING, lease_token)
+            ).rowcount == 1
+
+    def fail(self, job_id: str, lease_token: str, error: str, retry: bool = True) -> str | None:
+        """
+        Requeue a failed job with a delay until it used up `max_attempts`, then park it as failed.
+        A job which cannot succeed on redelivery (`retry=False`) is parked right away.
+        Returns the new status, None when the lease was lost and the job was left untouched.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT attempts FROM jobs WHERE job_id = ? AND status = ? AND lease_token = ?",
+                    (job_id, RUNNING, lease_token)
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                attempts = row[0]
+                status = FAILED if not retry or attempts >= self.max_attempts else QUEUED
+                due = now + self.retry_delay * attempts if status == QUEUED else None
+                connection.execute(
+                    "UPDATE jobs SET status = ?, lease_until = ?, lease_token = NULL, last_error = ?, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (status, due, error, now, job_id)
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return status
+
+    def release(self, job_id: str, lease_token: str) -> bool:
+        """
+        Give an unfinished job back to the queue without counting the attempt, used when draining.
+        Returns False when the lease was lost and the job was left untouched.
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), lease_until = NULL, lease_token = NULL, "
+                "updated_at = ? WHERE job_id = ? AND status = ? AND lease_token = ?",
+                (QUEUED, time.time(), job_id, RUNNING, lease_token)
+            ).rowcount == 1
+
+    def purge(self, older_than: float | None = None) -> list[str]:
+        """
+        Delete the done and failed jobs, payload included, last updated more than `older_than` seconds
+        ago (`retention_seconds` by default). Returns the ids of the deleted jobs.
+        """
+        cutoff = time.time() - (self.retention_seconds if older_than is None else older_than)
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [row[0] for row in connection.execute(
+                    "SELECT job_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+                ).fetchall()]
+                connection.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return job_ids
+
+    def get(self, job_id: str) -> dict | None:
+        """
+        Returns the delivery state of a job, None when it is unknown.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT job_id, kind, status, attempts, last_error, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('job_id', 'kind', 'status', 'attempts', 'last_error', 'created_at', 'updated_at'), row))
+
+    def depth(self) -> int:
+        """
+        Number of jobs waiting or being processed.
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+
+
+class JobWorkerPool:
+    """
+    Pool of asyncio consumers pulling jobs from a `SQLiteJobQueue` and running them through `handler`.
+
+    Args:
+        queue (SQLiteJobQueue): Queue to consume.
+        handler: Coroutine function called with the job payload and job id, raising marks the attempt as failed.
+        concurrency (int): Number of jobs processed at the same time by this worker process.
+        poll_interval (float): Seconds to sleep when the queue is empty.
+        admit: Optional callable, jobs are only claimed while it returns True (backpressure).
+        permanent_errors (tuple): Exception types raised by `handler` for jobs which fail the same way on
+            every delivery (invalid payload), such jobs are parked as failed without being retried.
+        on_purge: Optional callable given the ids of the jobs removed by the retention sweep.
+        sweep_interval (float): Seconds between two retention sweeps of the queue.
+    """
+    def __init__(self, queue: SQLiteJobQueue, handler, concurrency: int = 2, poll_interval: float = 1.0,
+                 admit=None, permanent_errors: tuple = (), on_purge=None, sweep_interval: float = 3600.0):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.admit = admit
+        self.permanent_errors = permanent_errors
+        self.on_purge = on_purge
+        self.sweep_interval = sweep_interval
+        self._consumers = []
+        self._sweeper = None
+        self._in_flight = {}
+        self._stopping = asyncio.Event()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def alive(self) -> int:
+        """
+        Consumers still running, a consumer only ends when the pool is stopped or it crashed.
+        """
+        return sum(not consumer.done() for consumer in self._consumers)
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._consumers = [asyncio.create_task(self._consume(n)) for n in range(self.concurrency)]
+        self._sweeper = asyncio.create_task(self._sweep())
+        logger.info(f"Started {self.concurrency} job consumers on {self.queue.path}.")
+
+    async def _consume(self, consumer_no: int) -> None:
+        while not self._stopping.is_set():
+            job = None
+            if self.admit is None or self.admit():
+                try:
+                    job = await asyncio.to_thread(self.queue.claim)
+                except Exception as e:
+                    logger.exception(f"Job consumer {consumer_no} could not claim a job: {e}")
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, kind, payload, attempts, lease_token = job
+            if self._stopping.is_set():
+                # claimed while `stop` ran, the job is not in its drain and goes back to the queue untouched
+                await asyncio.to_thread(self.queue.release, job_id, lease_token)
+                logger.info(f"Consumer {consumer_no} released job {job_id}, the pool is stopping.")
+                break
+            logger.info(f"Consumer {consumer_no} processing job {job_id} ({kind}), attempt {attempts}.")
+            task = asyncio.create_task(self.handler(payload, job_id))
+            heartbeat = asyncio.create_task(self._heartbeat(job_id, lease_token))
+            self._in_flight[job_id] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.done():
+                    raise
+            except Exception:
+                pass  # inspected through the task below
+            finally:
+                self._in_flight.pop(job_id, None)
+                heartbeat.cancel()
+
+            if task.cancelled():
+                settled = await asyncio.to_thread(self.queue.release, job_id, lease_token)
+            elif task.exception() is not None:
+                retry = not isinstance(task.exception(), self.permanent_errors)
+                status = await asyncio.to_thread(self.queue.fail, job_id, lease_token, repr(task.exception()), retry)
+                settled = status is not None
+                if settled:
+                    logger.error(f"Job {job_id} failed on attempt {attempts}, now {status}: {task.exception()}")
+            else:
+                settled = await asyncio.to_thread(self.queue.complete, job_id, lease_token)
+                if settled:
+                    logger.info(f"Job {job_id} completed.")
+            if not settled:
+                logger.warning(f"Job {job_id} lost its lease on attempt {attempts}, its outcome was not recorded.")
+
+    async def _heartbeat(self, job_id: str, lease_token: str) -> None:
+        """
+        Extend the lease of a running job every third of `lease_seconds` so long batches are not redelivered.
+        """
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self.queue.heartbeat, job_id, lease_token):
+                    logger.warning(f"Job {job_id} lost its lease, another delivery may be running it.")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not extend the lease of job {job_id}: {e}")
+
+    async def _sweep(self) -> None:
+        """
+        Remove the jobs finished longer than `retention_seconds` ago, every `sweep_interval` seconds.
+        """
+        while not self._stopping.is_set():
+            try:
+                job_ids = await asyncio.to_thread(self.queue.purge)
+                if job_ids:
+                    logger.info(f"Purged {len(job_ids)} finished jobs from the job queue.")
+                    if self.on_purge is not None:
+                        await asyncio.to_thread(self.on_purge, job_ids)
+            except Exception as e:
+                logger.warning(f"Could not purge the job queue: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self, drain_timeout: float = 30.0) -> None:
+        """
+        Stop claiming new jobs and wait up to `drain_timeout` seconds for the in-flight ones.
+        Jobs still running after that are cancelled and released back to the queue.
+        """
+        self._stopping.set()
+        in_flight = dict(self._in_flight)
+        if in_flight:
+            logger.info(f"Draining {len(in_flight)} in-flight jobs.")
+            _, pending = await asyncio.wait(in_flight.values(), timeout=drain_timeout)
+            for job_id, task in in_flight.items():
+                if task in pending:
+                    # the consumer releases the cancelled job back to the queue
+                    task.cancel()
+                    logger.warning(f"Job {job_id} did not finish while draining, releasing it back to the queue.")
+        tasks = self._consumers + ([self._sweeper] if self._sweeper is not None else [])
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._consumers = []
+        self._sweeper = None
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, closing
+from src.neoscreener.logger import logger
+
+# pipeline stages of a /neo-screener job, in execution order
+VALIDATION = 'validation'
+QUESTION_PROCESSING = 'question_processing'  # transcription + per-question feedback (process_task)
+DB_WRITE = 'db_write'  # results, student_questions marks, section marks and overall score, one transaction per attempt
+TEST_LEVEL_FEEDBACK = 'test_level_feedback'  # LLM narrative of each attempt
+STAGES = (VALIDATION, QUESTION_PROCESSING, DB_WRITE, TEST_LEVEL_FEEDBACK)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class StageProgress:
+    """
+    Handle returned by `JobStatusStore.stage` to report per-item progress of a stage.
+    """
+    def __init__(self, store: 'JobStatusStore', job_id: str, stage: str):
+        self.store = store
+        self.job_id = job_id
+        self.stage = stage
+
+    async def advance(self, count: int = 1) -> None:
+        record = self.store._stage_record(self.job_id, self.stage)
+        if record is not None:
+            record['done'] += count
+            await self.store._persist(self.job_id, self.stage)
+
+
+class JobStatusStore:
+    """
+    Per-stage progress and timings of the jobs, kept in memory while a job runs on this worker
+    and written through to SQLite so any worker can answer `GET /neo-screener/jobs/{id}`.
+
+    Args:
+        path (str): SQLite file, shared with the job queue.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._active = {}
+        # the file is created on first use, so importing the app in the gunicorn master touches nothing
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self._create_schema()
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _create_schema(self) -> None:
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS job_stages (
+                        job_id TEXT NOT NULL,
+                        stage TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        total INTEGER,
+                        done INTEGER NOT NULL DEFAULT 0,
+                        started_at REAL,
+                        finished_at REAL,
+                        error TEXT,
+                        PRIMARY KEY (job_id, stage)
+                    )
+                """)
+            self._schema_ready = True
+
+    async def start_job(self, job_id: str) -> None:
+        """
+        Reset the stages of a job which is (re)delivered to this worker.
+        """
+        self._active[job_id] = {stage: {'status': PENDING, 'total': None, 'done': 0, 'started_at': None,
+                                        'finished_at': None, 'error': None} for stage in STAGES}
+        await asyncio.to_thread(self._delete_sync, job_id)
+
+    async def finish_job(self, job_id: str) -> None:
+        """
+        Mark the stages which never ran as skipped and stop serving the job from memory.
+        """
+        stages = self._active.pop(job_id, {})
+        for record in stages.values():
+            if record['status'] == PENDING:
+                record['status'] = SKIPPED
+        await asyncio.to_thread(self._write_all_sync, job_id, stages)
+
+    def forget(self, job_ids: list[str]) -> None:
+        """
+        Delete the stages of jobs purged from the job queue.
+        """
+        with closing(self._connect()) as connection:
+            connection.executemany("DELETE FROM job_stages WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+
+    def _delete_sync(self, job_id: str) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM job_stages WHERE job_id = ?", (job_id,))
+
+    def _write_all_sync(self, job_id: str, stages: dict) -> None:
+        with closing(self._connect()) as connection:
+            for stage, record in stages.items():
+                self._write(connection, job_id, stage, record)
+
+    def _stage_record(self, job_id: str, stage: str) -> dict | None:
+        return self._active.get(job_id, {}).get(stage)
+
+    def _write(self, connection: sqlite3.Connection, job_id: str, stage: str, record: dict) -> None:
+        connection.execute(
+            """INSERT OR REPLACE INTO job_stages (job_id, stage, status, total, done, started_at, finished_at, error)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, stage, record['status'], record['total'], record['done'], record['started_at'],
+             record['finished_at'], record['error'])
+        )
+
+    def _persist_sync(self, job_id: str, stage: str, record: dict) -> None:
+        with closing(self._connect()) as connection:
+            self._write(connection, job_id, stage, record)
+
+    async def _persist(self, job_id: str, stage: str) -> None:
+        record = self._stage_record(job_id, stage)
+        if record is None:
+            return
+        try:
+            await asyncio.to_thread(self._persist_sync, job_id, stage, dict(record))
+        except Exception as e:
+            # status reporting must never fail the job itself
+            logger.warning(f"Could not persist stage {stage} of job {job_id}: {e}")
+
+    @asynccontextmanager
+    async def stage(self, job_id: str | None, stage: str, total: int | None = None):
+        """
+        Record the start, end, duration and outcome of a stage of `job_id`.
+        A no-op when the work does not belong to a job (direct calls).
+        """
+        record = self._stage_record(job_id, stage) if job_id else None
+        if record is None:
+            yield StageProgress(self, job_id, stage)
+            return
+
+        record.update(status=RUNNING, total=total, done=0, started_at=time.time(), finished_at=None, error=None)
+        await self._persist(job_id, stage)
+        try:
+            yield StageProgress(self, job_id, stage)
+        except BaseException as e:
+            record.update(status=FAILED, finished_at=time.time(), error=repr(e))
+            await self._persist(job_id, stage)
+            raise
+        record.update(status=DONE, finished_at=time.time())
+        if record['total'] is not None and not record['done']:
+            record['done'] = record['total']  # stages which do not report per-item progress
+        await self._persist(job_id, stage)
+
+    def get_stages(self, job_id: str) -> list[dict]:
+        """
+        Returns the stages of a job in execution order with their timings.
+        """
+        records = self._active.get(job_id)
+        if records is None:
+            with closing(self._connect()) as connection:
+                rows = connection.execute(
+                    "SELECT stage, status, total, done, started_at, finished_at, error FROM job_stages WHERE job_id = ?",
+                    (job_id,)
+                ).fetchall()
+            records = {row[0]: {'status': row[1], 'total': row[2], 'done': row[3], 'started_at': row[4],
+                                'finished_at': row[5], 'error': row[6]} for row in rows}
+
+        stages = []
+        for stage in STAGES:
+            record = records.get(stage, {'status': PENDING, 'total': None, 'done': 0, 'started_at': None,
+                                         'finished_at': None, 'error': None})
+            duration = None
+            if record['started_at'] is not None:
+                duration = round(((record['finished_at'] or time.time()) - record['started_at']) * 1000, 1)
+            stages.append({'stage': stage, **record, 'duration_ms': duration})
+        return stages
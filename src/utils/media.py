@@ -0,0 +1,167 @@
+import asyncio
+import re
+import shutil
+import time
+from urllib.parse import urlsplit
+from src.utils.exceptions import MediaPreprocessException
+
+DURATION_RE = re.compile(r'Duration: (\d+):(\d+):([\d.]+).*?bitrate: (\d+|N/A)')
+TIME_RE = re.compile(r'time=(\d+):(\d+):([\d.]+)')
+SILENCE_RE = re.compile(r'silence_(start|end): (-?[\d.]+)')
+NO_AUDIO_MARKERS = ('does not contain any stream', 'matches no streams')
+
+SILENT = 'silent'
+TOO_SHORT = 'too_short'
+NO_AUDIO = 'no_audio'
+
+
+def _seconds(hours: str, minutes: str, seconds: str) -> float:
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_ffmpeg_report(stderr: str) -> dict:
+    """
+    Reads the ffmpeg log of a decoding run with `silencedetect`.
+
+    Returns:
+        {duration: seconds of audio decoded, 0 when nothing was, source_duration: seconds of the input as
+         its header tells, source_bitrate: kb/s of the input or None, silence: silent seconds}
+    """
+    progress = TIME_RE.findall(stderr)
+    header = DURATION_RE.search(stderr)
+    duration = _seconds(*progress[-1]) if progress else 0.0
+    source_duration = _seconds(*header.groups()[:3]) if header else duration
+    bitrate = header.group(4) if header else 'N/A'
+
+    silence, started = 0.0, None
+    for event, value in SILENCE_RE.findall(stderr):
+        if event == 'start':
+            started = max(float(value), 0.0)
+        elif started is not None:
+            silence += float(value) - started
+            started = None
+    if started is not None:  # silent until the end of the media
+        silence += max(duration - started, 0.0)
+    return {'duration': duration, 'source_duration': source_duration,
+            'source_bitrate': None if bitrate == 'N/A' else int(bitrate), 'silence': min(silence, duration)}
+
+
+def silence_reason(duration: float, silence: float, min_duration: float, min_voiced: float) -> str | None:
+    """
+    Why an answer needs neither a transcription nor an LLM call, None when it has to be transcribed.
+    """
+    if duration < min_duration:
+        return TOO_SHORT
+    if duration - silence < min_voiced:
+        return SILENT
+    return None
+
+
+class MediaPreprocessor:
+    """
+    Measures the duration and the silence of the answer media in one ffmpeg pass which decodes the audio
+    and writes nothing, so silent and too short answers are rated without a transcription. The answer
+    itself still goes to `process_task` as it is, which fetches the media from its url. Only media ffmpeg
+    streams itself are measured: signed http(s) urls (range requests, so a `moov` atom at the end of an
+    mp4 is no problem) and local files. `gs://` and `s3://` objects would have to be downloaded once more
+    just to be measured, they are left to the transcription.
+
+    Args:
+        ffmpeg (str): ffmpeg executable.
+        sample_rate (int): Sample rate the audio is decoded to before the silence detection.
+        silence_threshold_db (float): Level under which audio counts as silence.
+        min_duration (float): Answers shorter than this (seconds) are not transcribed.
+        min_voiced (float): Answers with less non silent audio than this (seconds) are not transcribed.
+        timeout (float): Seconds one measurement may take.
+    """
+    def __init__(self, ffmpeg: str = 'ffmpeg', sample_rate: int = 16000, silence_threshold_db: float = -40.0,
+                 min_duration: float = 1.0, min_voiced: float = 1.0, timeout: float = 300.0):
+        self.ffmpeg = ffmpeg
+        self.sample_rate = sample_rate
+        self.silence_threshold_db = silence_threshold_db
+        self.min_duration = min_duration
+        self.min_voiced = min_voiced
+        self.timeout = timeout
+        self.prepared = 0
+        self.skipped = 0
+        self.failures = 0
+        self.short_circuits = {SILENT: 0, TOO_SHORT: 0, NO_AUDIO: 0}
+        self.seconds = 0.0
+
+    @staticmethod
+    def available(ffmpeg: str) -> bool:
+        return shutil.which(ffmpeg) is not None
+
+    def measurable(self, url: str) -> bool:
+        """
+        Whether ffmpeg can stream the media at `url`, the other answers are counted as skipped.
+        """
+        if urlsplit(url).scheme in ('gs', 's3'):
+            self.skipped += 1
+            return False
+        return True
+
+    def _command(self, source: str) -> list[str]:
+        command = [self.ffmpeg, '-hide_banner', '-nostdin']
+        if urlsplit(source).scheme in ('http', 'https'):
+            command += ['-reconnect', '1', '-reconnect_on_network_error', '1', '-reconnect_delay_max', '5']
+        # decoded audio is discarded (null muxer), nothing is encoded nor written
+        return command + ['-i', source, '-vn', '-ac', '1', '-ar', str(self.sample_rate),
+                          '-af', f'silencedetect=noise={self.silence_threshold_db}dB:d=0.5', '-f', 'null', '-']
+
+    async def _run(self, command: list[str], url: str) -> tuple[int, str]:
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.DEVNULL,
+                                                       stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise MediaPreprocessException(url, f"ffmpeg did not finish in {self.timeout}s")
+        return process.returncode, stderr.decode(errors='replace')
+
+    async def prepare(self, url: str) -> dict:
+        """
+        Measures the audio of the media at `url`, an http(s) url or a local file (see `measurable`).
+
+        Returns:
+            {duration, silence, short_circuit}, `short_circuit` is the reason the answer needs no
+            transcription (`silent`, `too_short`, `no_audio`) or None.
+
+        Raises:
+            MediaPreprocessException: The media could not be read or decoded.
+        """
+        started = time.perf_counter()
+        try:
+            returncode, stderr = await self._run(self._command(url), url)
+            report = parse_ffmpeg_report(stderr)
+            if any(marker in stderr for marker in NO_AUDIO_MARKERS):
+                return self._finish(started, report, NO_AUDIO)
+            if returncode != 0:
+                raise MediaPreprocessException(url, stderr.strip().splitlines()[-1] if stderr.strip() else
+                                               f"ffmpeg exited with {returncode}")
+            if not report['duration']:
+                # e.g. an mp4 with its index at the end served without range requests, not a silent answer
+                raise MediaPreprocessException(url, "no audio was decoded")
+            reason = silence_reason(report['duration'], report['silence'], self.min_duration, self.min_voiced)
+            return self._finish(started, report, reason)
+        except Exception:
+            self.failures += 1
+            raise
+
+    def _finish(self, started: float, report: dict, reason: str | None) -> dict:
+        if reason:
+            self.short_circuits[reason] += 1
+        self.prepared += 1
+        self.seconds += time.perf_counter() - started
+        return {'duration': round(report['duration'], 3), 'silence': round(report['silence'], 3),
+                'short_circuit': reason}
+
+    def stats(self) -> dict:
+        return {
+            'prepared': self.prepared,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'short_circuits': dict(self.short_circuits),
+            'avg_preprocess_seconds': round(self.seconds / self.prepared, 3) if self.prepared else 0.0,
+        }
@@ -0,0 +1,347 @@
+import asyncio
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from src.secrets.load_keys import LoadSecret
+
+# seconds, from a DB round trip up to a long transcription
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, *extra: str) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(pair for pair in extra if pair)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter, one series per label values.
+    """
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(values: list[dict]) -> dict:
+        merged = {}
+        for worker in values:
+            for key, value in worker.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def samples(self, values: dict) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()]
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, one series per label values.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    @staticmethod
+    def merge(values: list[dict]) -> dict:
+        merged = {}
+        for worker in values:
+            for key, series in worker.items():
+                total = merged.setdefault(key, [0] * len(series))
+                merged[key] = [a + b for a, b in zip(total, series)]
+        return merged
+
+    def samples(self, values: dict) -> list[str]:
+        lines = []
+        for key, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# how the values of a gauge from several workers are combined
+SUM = 'sum'  # a per-worker quantity, e.g. jobs in flight
+MAX = 'max'  # a per-worker state where the worst one matters, e.g. a circuit
+LOCAL = 'local'  # a shared value read by the scraped worker, e.g. the depth of the shared queue
+
+
+class GaugeCallback:
+    """
+    Gauge read from `func` at scrape time, `func` returns a number or {label values tuple: number}.
+    `aggregate` tells how the values of the workers are combined, see `SUM`, `MAX` and `LOCAL`.
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, func, labelnames: tuple = (), aggregate: str = SUM):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.labelnames = labelnames
+        self.aggregate = aggregate
+
+    def collect(self) -> dict:
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def merge(self, values: list[dict]) -> dict:
+        merged = {}
+        for worker in values:
+            for key, value in worker.items():
+                merged[key] = value if key not in merged else (
+                    merged[key] + value if self.aggregate == SUM else max(merged[key], value))
+        return merged
+
+    def samples(self, values: dict) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()]
+
+
+def _worker_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f'metrics_{pid}.json')
+
+
+def _read_workers(directory: str) -> list[dict]:
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        try:
+            with open(path) as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+        except (OSError, ValueError):
+            continue  # removed or being replaced, its next version is read at the next scrape
+    return snapshots
+
+
+def clear_multiprocess_dir(directory: str) -> None:
+    """
+    Removes the snapshots of a previous run, called once by the gunicorn master before it forks the workers.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        os.remove(path)
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """
+    Drops the gauges of a worker which exited. Its counters and histograms are kept, so the totals of the
+    service never go down when a worker is replaced.
+    """
+    path = _worker_path(directory, pid)
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return
+    snapshot['metrics'] = {name: metric for name, metric in snapshot['metrics'].items()
+                           if metric['type'] != GaugeCallback.type}
+    _write_snapshot(path, snapshot)
+
+
+def _write_snapshot(path: str, snapshot: dict) -> None:
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(temporary, path)  # a scrape never reads half a snapshot
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text exposition format.
+
+    The gunicorn workers behind one port each count in their own process, and a scrape reaches any one of
+    them. With `multiprocess_dir` every worker writes a snapshot of its metrics there (`flush`, called
+    periodically and on each scrape) and `render` combines the snapshots of all the workers, so a scrape
+    returns the totals of the service whichever worker serves it. Without it only this process is rendered.
+
+    Args:
+        multiprocess_dir (str): Directory shared by the workers, emptied by the master at startup.
+    """
+    def __init__(self, multiprocess_dir: str | None = None):
+        self.multiprocess_dir = multiprocess_dir
+        self._metrics = {}
+        if multiprocess_dir:
+            os.makedirs(multiprocess_dir, exist_ok=True)
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, func, labelnames: tuple = (),
+              aggregate: str = SUM) -> GaugeCallback:
+        return self._register(GaugeCallback(name, documentation, func, labelnames, aggregate))
+
+    def collect(self) -> dict:
+        """
+        {metric name: {label values tuple: value}} of this process.
+        """
+        return {name: metric.collect() for name, metric in list(self._metrics.items())}
+
+    def flush(self, collected: dict | None = None) -> None:
+        """
+        Writes the snapshot of this process to `multiprocess_dir`, `collected` defaults to `collect()`.
+        """
+        if not self.multiprocess_dir:
+            return
+        collected = self.collect() if collected is None else collected
+        # read at flush time, the registry is created before gunicorn forks the workers
+        pid = os.getpid()
+        snapshot = {'pid': pid, 'metrics': {
+            name: {'type': self._metrics[name].type, 'values': [[list(key), value] for key, value in values.items()]}
+            for name, values in collected.items()}}
+        _write_snapshot(_worker_path(self.multiprocess_dir, pid), snapshot)
+
+    def render(self, collected: dict | None = None) -> str:
+        """
+        `collected` defaults to `collect()`, pass it to read the snapshot files off the event loop.
+        """
+        collected = self.collect() if collected is None else collected
+        workers = [collected]
+        if self.multiprocess_dir:
+            self.flush(collected)
+            pid = os.getpid()
+            workers += [{name: {tuple(key): value for key, value in metric['values']}
+                         for name, metric in snapshot['metrics'].items()}
+                        for snapshot in _read_workers(self.multiprocess_dir) if snapshot['pid'] != pid]
+        lines = []
+        for name, metric in list(self._metrics.items()):
+            if getattr(metric, 'aggregate', None) == LOCAL:
+                values = collected[name]
+            else:
+                values = metric.merge([worker.get(name, {}) for worker in workers])
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples(values))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(multiprocess_dir=LoadSecret().get_secret('METRICS_MULTIPROC_DIR') or None)
+
+STAGE_DURATION = registry.histogram('neo_screener_stage_duration_seconds',
+                                    'Duration of a pipeline stage or DB operation.', ('stage',))
+STAGE_ERRORS = registry.counter('neo_screener_stage_errors_total',
+                                'Pipeline stages or DB operations which raised.', ('stage',))
+EXTERNAL_CALLS = registry.counter('neo_screener_external_calls_total',
+                                  'Calls to external providers by outcome '
+                                  '(success, failure, error, short_circuited, rejected, avoided).',
+                                  ('provider', 'outcome'))
+PROMPT_TOKENS = registry.histogram('neo_screener_overall_feedback_tokens',
+                                   'Estimated tokens of the question feedback sent to the overall feedback prompt, '
+                                   'as stored (raw) and once compacted.', ('form',),
+                                   buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+COMPACTION_TIERS = registry.counter('neo_screener_feedback_compaction_total',
+                                    'Question feedback compactions by the tier which fit the token budget.', ('tier',))
+
+
+class timed:
+    """
+    Records the duration of a stage in `neo_screener_stage_duration_seconds`, and counts it in
+    `neo_screener_stage_errors_total` when it raises. Works as a context manager or as a decorator
+    of sync and async functions.
+
+        with timed('validation'):
+            ...
+
+        @timed('db_insert')
+        def insert_data_into_mysql(...):
+    """
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._record(self._started, exc_type is not None and issubclass(exc_type, Exception))
+
+    def _record(self, started: float, failed: bool) -> None:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=self.stage)
+        if failed:
+            STAGE_ERRORS.inc(stage=self.stage)
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started, failed = time.perf_counter(), False
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    self._record(started, failed)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started, failed = time.perf_counter(), False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self._record(started, failed)
+        return wrapper
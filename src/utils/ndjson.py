@@ -0,0 +1,57 @@
+import json
+from typing import AsyncIterator
+from src.utils.api_validation import validate_api_item
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple[int, bytes | None]]:
+    """
+    Splits a byte stream into numbered lines as the chunks arrive, holding at most one line in memory.
+    A line longer than `max_line_bytes` is dropped and yielded as None.
+    """
+    buffer, line_no, oversized = b'', 0, False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b'\n')
+            if end < 0:
+                break
+            line_no += 1
+            yield line_no, None if oversized or end > max_line_bytes else buffer[:end]
+            buffer, oversized = buffer[end + 1:], False
+        if len(buffer) > max_line_bytes:
+            buffer, oversized = b'', True
+    if buffer.strip() or oversized:
+        yield line_no + 1, None if oversized or len(buffer) > max_line_bytes else buffer
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_line_bytes: int = 64 * 1024):
+    """
+    Parses and validates NDJSON `neo_screener` records one line at a time, blank lines are skipped.
+
+    Yields:
+        (line_no, item, errors) - `item` is None and `errors` lists the problems of an invalid line.
+    """
+    async for line_no, line in iter_lines(chunks, max_line_bytes):
+        if line is None:
+            yield line_no, None, [f"line is longer than {max_line_bytes} bytes"]
+            continue
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, [f"invalid JSON: {e}"]
+            continue
+        errors = validate_api_item(item)
+        yield line_no, (None if errors else item), errors
+
+
+def attempt_boundary(attempts: list) -> int:
+    """
+    Index where the trailing run of equal attempts starts, the lines before it can be queued without
+    splitting an attempt across jobs. 0 when every line belongs to the same attempt.
+    """
+    cut = len(attempts) - 1
+    while cut > 0 and attempts[cut - 1] == attempts[cut]:
+        cut -= 1
+    return max(cut, 0)
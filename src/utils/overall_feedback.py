@@ -0,0 +1,16 @@
+import json
+import re
+
+
+def parse_overall_feedback(text: str) -> str:
+    """
+    The overall feedback JSON object of an LLM answer, with the markdown code fence it may be wrapped in removed.
+
+    Raises:
+        ValueError: The answer is not a JSON object.
+    """
+    cleaned = re.sub(r'^\s*```(?:json)?|```\s*$', '', text.strip()).strip()
+    feedback = json.loads(cleaned)
+    if not isinstance(feedback, dict):
+        raise ValueError("Overall feedback is not a JSON object.")
+    return json.dumps(feedback)
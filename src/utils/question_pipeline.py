@@ -0,0 +1,270 @@
+import asyncio
+import json
+import time
+from src.neoscreener.logger import logger
+from src.utils.async_db_ops import get_existing_transcriptions
+from src.utils.scheduler import TRANSCRIPTION, GENAI, MEDIA
+from src.utils.transcription_cache import normalise_media_url, media_content_hash, transcription_cache_key
+from src.utils.metrics import timed, EXTERNAL_CALLS
+from src.utils.feedback_cache import is_blank_response, empty_response_feedback, is_valid_feedback
+
+# fields of a process_task response which come from the transcription and not from the feedback
+TRANSCRIPTION_FIELDS = ('transcription_id', 'transcription_text', 'answer_keywords', 'answer_explanation', 'status')
+# transcription of an answer found silent, too short or without audio by the media pre-processing
+EMPTY_TRANSCRIPTION = {'transcription_id': None, 'transcription_text': '', 'answer_keywords': [],
+                       'answer_explanation': None, 'status': 'completed'}
+
+
+def _json_value(value):
+    """
+    `answer_keywords` is stored JSON encoded, decode it so the next insert does not encode it twice.
+    """
+    if isinstance(value, (str, bytes, bytearray)):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+class QuestionPipeline:
+    """
+    Processes the questions of a batch.
+
+    A question whose transcript is already known (stored in `video_auto_results` for the same media,
+    or found in the transcription cache) only gets its feedback generated, under the GENAI limiter. Every
+    other question goes through `process_task` which transcribes and generates the feedback, under the
+    TRANSCRIPTION limiter alone (see `src.utils.scheduler`).
+
+    Args:
+        scheduler (Scheduler): Worker wide per-dependency limiter.
+        transcription_policy (RetryPolicy): Retry policy of the transcription provider.
+        genai_policy (RetryPolicy): Retry policy of the GenAI provider.
+        process_task: Coroutine function transcribing a question and generating its feedback.
+        feedback_provider: Blocking callable (question, transcript) -> feedback string.
+        db_config (dict): Database configuration, used to reuse stored transcriptions.
+        transcription_cache: Optional `SQLiteTranscriptionCache` / `DiskTranscriptionCache`.
+        use_content_hash (bool): Add the storage content hash of the media to the cache key.
+        feedback_cache (FeedbackCache): Optional cache of the per-question GenAI feedback.
+        batch_generator (BatchFeedbackGenerator): Optional, packs the feedback of the known transcripts
+            of a batch into a few LLM requests instead of one request per question.
+        media_preprocessor (MediaPreprocessor): Optional, measures the silence of the answer media and rates
+            silent answers 0 without transcribing them.
+    """
+    def __init__(self, scheduler, transcription_policy, genai_policy, process_task, feedback_provider,
+                 db_config: dict, transcription_cache=None, use_content_hash: bool = False, feedback_cache=None,
+                 batch_generator=None, media_preprocessor=None):
+        self.scheduler = scheduler
+        self.transcription_policy = transcription_policy
+        self.genai_policy = genai_policy
+        self.process_task = process_task
+        self.feedback_provider = feedback_provider
+        self.db_config = db_config
+        self.transcription_cache = transcription_cache
+        self.use_content_hash = use_content_hash
+        self.feedback_cache = feedback_cache
+        self.batch_generator = batch_generator
+        self.media_preprocessor = media_preprocessor
+        self.transcriptions_reused = 0
+        self.transcriptions_cached = 0
+        self.transcriptions = 0
+        self.transcription_seconds = 0.0
+        self.transcriptions_avoided = 0
+
+    async def known_transcripts(self, data: list[dict]) -> dict:
+        """
+        Returns {s_question_id: transcription record} for the questions which need no transcription,
+        looked up in bulk in `video_auto_results` first and in the transcription cache next, when enabled.
+        """
+        known = {}
+        stored = await get_existing_transcriptions([doc['s_question_id'] for doc in data], self.db_config)
+        for doc in data:
+            row = stored.get(doc['s_question_id'])
+            # a re-recorded answer has another media, its stored transcript must not be reused
+            if row and normalise_media_url(row['video_link'] or '') == normalise_media_url(doc['video_url']):
+                known[doc['s_question_id']] = {**{field: row.get(field) for field in TRANSCRIPTION_FIELDS},
+                                               'answer_keywords': _json_value(row.get('answer_keywords')),
+                                               'q_subtype_id': row.get('q_subtype_id')}
+        self.transcriptions_reused += len(known)
+        if self.transcription_cache is None:
+            return known
+
+        for doc in data:
+            if doc['s_question_id'] not in known:
+                record = await asyncio.to_thread(self.transcription_cache.get, await self._cache_key(doc))
+                if record is not None:
+                    known[doc['s_question_id']] = record
+                    self.transcriptions_cached += 1
+        return known
+
+    async def _cache_key(self, doc: dict) -> str:
+        content_hash = None
+        if self.use_content_hash:
+            with timed('media_fetch'):
+                content_hash = await asyncio.to_thread(media_content_hash, doc['video_url'])
+        return transcription_cache_key(doc['video_url'], content_hash)
+
+    async def process(self, doc: dict, submission_id: str, known: dict | None = None,
+                      feedbacks: dict | None = None) -> dict:
+        """
+        Returns the `video_auto_results` row of one question, `feedbacks` holds feedback already
+        generated by `batch_feedback`.
+        """
+        record = (known or {}).get(doc['s_question_id'])
+        if record is not None:
+            feedback = (feedbacks or {}).get(doc['s_question_id'])
+            if feedback is None:
+                feedback = await self.feedback(doc['question'], record.get('transcription_text') or '', submission_id)
+            return self.build_response(doc, record, feedback)
+
+        media = await self.prepare_media(doc, submission_id)
+        if media is not None and media['short_circuit']:
+            # nothing to transcribe nor to rate, the answer gets the feedback of an empty response
+            logger.info(f"s_question_id {doc['s_question_id']} not transcribed: {media['short_circuit']} "
+                        f"({media['duration']}s, {media['silence']}s silent).")
+            self.transcriptions_avoided += 1
+            EXTERNAL_CALLS.inc(provider=TRANSCRIPTION, outcome='avoided')
+            EXTERNAL_CALLS.inc(provider=GENAI, outcome='avoided')
+            await self._cache_transcription(doc, EMPTY_TRANSCRIPTION)
+            return self.build_response(doc, EMPTY_TRANSCRIPTION, empty_response_feedback(doc['question']))
+
+        started = time.perf_counter()
+        with timed('transcription'):  # process_task also generates the question's feedback
+            response = await self.transcription_policy.call(self.scheduler.run_admitted, TRANSCRIPTION, submission_id,
+                                                            self.process_task, doc)
+        self.transcriptions += 1
+        self.transcription_seconds += time.perf_counter() - started
+        if response.get('transcription_text') is not None:
+            await self._cache_transcription(doc, {field: response.get(field) for field in TRANSCRIPTION_FIELDS})
+        if (self.feedback_cache is not None and response.get('transcription_text')
+                and is_valid_feedback(response.get('feedback'))):
+            # process_task generated the feedback itself, keep it for the next replay
+            try:
+                await asyncio.to_thread(self.feedback_cache.set, doc['question'], response['transcription_text'],
+                                        response['feedback'])
+            except Exception as e:
+                logger.warning(f"Could not cache the feedback of s_question_id {doc['s_question_id']}: {e}")
+        return response
+
+    async def prepare_media(self, doc: dict, submission_id: str) -> dict | None:
+        """
+        Duration and silence of the answer measured by the media pre-processor, see `MediaPreprocessor.prepare`.
+        None when pre-processing is off, the media is not measurable or measuring failed, the answer is
+        then transcribed.
+        """
+        if self.media_preprocessor is None or not self.media_preprocessor.measurable(doc['video_url']):
+            return None
+        try:
+            with timed('media_preprocess'):
+                media = await self.scheduler.run_admitted(MEDIA, submission_id, self.media_preprocessor.prepare,
+                                                 doc['video_url'])
+        except Exception as e:
+            logger.warning(f"Media of s_question_id {doc['s_question_id']} not pre-processed, "
+                           f"transcribing it: {e}")
+            return None
+        return media
+
+    async def _cache_transcription(self, doc: dict, record: dict) -> None:
+        if self.transcription_cache is None:
+            return
+        try:
+            await asyncio.to_thread(self.transcription_cache.set, await self._cache_key(doc), record)
+        except Exception as e:
+            logger.warning(f"Could not cache the transcription of s_question_id {doc['s_question_id']}: {e}")
+
+    async def feedback(self, question: str, transcript: str, submission_id: str) -> str:
+        """
+        Per-question GenAI feedback for an already known transcript. Blank answers are rated 0 without
+        calling the LLM and cached feedback is reused.
+        """
+        if self.feedback_cache is None:
+            return await self._generate_feedback(question, transcript, submission_id)
+
+        if is_blank_response(transcript):
+            self.feedback_cache.record_empty()
+            return empty_response_feedback(question)
+        feedback = await asyncio.to_thread(self.feedback_cache.get, question, transcript)
+        if feedback is not None:
+            return feedback
+
+        self.feedback_cache.record_llm_call()
+        feedback = await self._generate_feedback(question, transcript, submission_id)
+        if is_valid_feedback(feedback):
+            await asyncio.to_thread(self.feedback_cache.set, question, transcript, feedback)
+        return feedback
+
+    async def batch_feedback(self, data: list[dict], known: dict, submission_id: str) -> dict:
+        """
+        Feedback of the questions of `data` with a known transcript, generated with one LLM request per
+        chunk of questions. Returns {s_question_id: feedback}, cached feedback included. A question missing
+        from it (blank answer, unparsable or failed request) is left to the per-question path of `process`.
+        """
+        if self.batch_generator is None:
+            return {}
+        feedbacks, items = {}, []
+        for doc in data:
+            record = known.get(doc['s_question_id'])
+            transcript = (record or {}).get('transcription_text') or ''
+            if record is None or is_blank_response(transcript):
+                continue
+            if self.feedback_cache is not None:
+                cached = await asyncio.to_thread(self.feedback_cache.get, doc['question'], transcript)
+                if cached is not None:
+                    feedbacks[doc['s_question_id']] = cached
+                    continue
+            items.append({'s_question_id': doc['s_question_id'], 'question': doc['question'],
+                          'candidate_response': transcript})
+
+        for items_batch in self.batch_generator.batches(items):
+            if self.feedback_cache is not None:
+                self.feedback_cache.record_llm_call()
+            try:
+                with timed('batch_feedback'):
+                    answer = await self.genai_policy.call(self.scheduler.run_admitted, GENAI, submission_id, asyncio.to_thread,
+                                                          self.batch_generator.llm_call,
+                                                          self.batch_generator.prompt(items_batch))
+                parsed = self.batch_generator.parse(answer, items_batch)
+            except ValueError as e:
+                logger.warning(f"Batched feedback of {len(items_batch)} questions could not be parsed: {e}")
+                parsed = {}
+            except Exception as e:
+                logger.warning(f"Batched feedback of {len(items_batch)} questions failed: {e!r}")
+                parsed = {}
+            if len(parsed) < len(items_batch):
+                self.batch_generator.record_fallback(len(items_batch) - len(parsed))
+            for item in items_batch:
+                feedback = parsed.get(item['s_question_id'])
+                if feedback is None:
+                    continue
+                feedbacks[item['s_question_id']] = feedback
+                if self.feedback_cache is not None:
+                    await asyncio.to_thread(self.feedback_cache.set, item['question'], item['candidate_response'],
+                                            feedback)
+        return feedbacks
+
+    @timed('question_feedback')
+    async def _generate_feedback(self, question: str, transcript: str, submission_id: str) -> str:
+        return await self.genai_policy.call(self.scheduler.run_admitted, GENAI, submission_id,
+                                            asyncio.to_thread, self.feedback_provider, question, transcript)
+
+    @staticmethod
+    def build_response(doc: dict, record: dict, feedback: str) -> dict:
+        return {
+            **{field: record.get(field) for field in TRANSCRIPTION_FIELDS},
+            's_question_id': doc['s_question_id'],
+            'q_id': doc['q_id'],
+            'video_link': doc['video_url'],
+            'q_subtype_id': doc.get('vas_subtype_id', record.get('q_subtype_id')),
+            'feedback': feedback,
+        }
+
+    def stats(self) -> dict:
+        stats = {'transcriptions_reused_from_db': self.transcriptions_reused,
+                 'transcriptions_from_cache': self.transcriptions_cached}
+        if self.media_preprocessor is not None:
+            average = self.transcription_seconds / self.transcriptions if self.transcriptions else 0.0
+            stats['media'] = {**self.media_preprocessor.stats(),
+                              'provider_calls_avoided': 2 * self.transcriptions_avoided,
+                              # each avoided answer would have taken an average transcription
+                              'estimated_latency_saved_seconds': round(average * self.transcriptions_avoided, 3)}
+        return stats
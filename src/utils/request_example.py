@@ -1,5 +1,6 @@
-from pydantic import BaseModel,UUID4
-from typing import List,Dict
+from pydantic import BaseModel,UUID4,ConfigDict,AfterValidator
+from typing import List,Dict,Annotated
+from src.utils.common import is_uri
 
 class response(BaseModel):
     s_question_id: int = None # from api payload
@@ -16,8 +17,9 @@ class response(BaseModel):
     overall_match:float = None # from api to insert into db
 
 class health_check(BaseModel):
-    redis_health:str=None
-    assemblyAi_health:str=None
+    status:str # ok, degraded or unavailable
+    pid:int
+    checks:Dict[str,dict] = {} # check name -> its status and details
 
 class OveralFeedback(BaseModel):
     user_id:str
@@ -25,9 +27,16 @@ class OveralFeedback(BaseModel):
     attempt_no:int
     course_id:str
 
+def _check_uri(value: str) -> str:
+    if not is_uri(value):
+        raise ValueError(f"{value!r} is not a 'uri'")
+    return value
+
 class neo_screener(BaseModel):
+    # strict like the jsonschema of api_validation: "5" is not an integer
+    model_config = ConfigDict(strict=True)
     s_question_id: int
     q_id: str
-    video_url: str
-    vas_subtype_id: int
+    video_url: Annotated[str, AfterValidator(_check_uri)]
+    vas_subtype_id: int | None = None
     question: str
\ No newline at end of file
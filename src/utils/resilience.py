@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+from src.neoscreener.logger import logger
+from src.utils.exceptions import CircuitOpenException, SchedulerSaturatedException
+from src.utils.metrics import EXTERNAL_CALLS
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# HTTP statuses of a provider which is overloaded or briefly unavailable, worth retrying
+TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# timeouts and dropped connections of the HTTP clients under the provider SDKs (requests, httpx), which
+# do not derive from the builtin TimeoutError / ConnectionError
+TRANSIENT_ERROR_NAMES = frozenset({'Timeout', 'TimeoutException', 'ConnectionError', 'TransportError'})
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    True for provider errors which may pass on retry: timeouts, dropped connections, 429 and 5xx.
+    The status is read from `code` (google-api-core errors), `status_code` or `response.status_code`.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    for status in (getattr(error, 'code', None), getattr(error, 'status_code', None),
+                   getattr(getattr(error, 'response', None), 'status_code', None)):
+        if isinstance(status, int) and status in TRANSIENT_STATUS_CODES:
+            return True
+    return False
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail fast for
+    `reset_timeout` seconds, then a single trial call is let through (half open) which closes
+    the circuit again on success.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.short_circuited = 0
+        self._trial_running = False
+
+    def before_call(self) -> None:
+        """
+        Raises `CircuitOpenException` when the call must not reach the provider.
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.short_circuited += 1
+                raise CircuitOpenException(self.name, self.reset_timeout - (time.monotonic() - self.opened_at))
+            self.state = HALF_OPEN
+            self._trial_running = False
+        if self.state == HALF_OPEN:
+            if self._trial_running:
+                self.short_circuited += 1
+                raise CircuitOpenException(self.name, 0)
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"Circuit `{self.name}` closed again.")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_skip(self) -> None:
+        """
+        The call never reached the provider, a half open trial may be attempted again.
+        """
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.total_failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.error(f"Circuit `{self.name}` opened after {self.failures} consecutive failures.")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'total_failures': self.total_failures,
+            'short_circuited': self.short_circuited,
+        }
+
+
+class RetryPolicy:
+    """
+    Retries a provider call with exponential backoff and full jitter, guarded by a circuit breaker.
+
+    Args:
+        breaker (CircuitBreaker): Breaker of the provider being called.
+        attempts (int): Total number of attempts, including the first one.
+        base_delay (float): Backoff of the first retry in seconds, doubled on every retry.
+        max_delay (float): Upper bound of a single backoff.
+        retryable: Optional predicate on the raised exception. Errors it rejects (a bad request, an
+            unparsable answer) are raised at once without retry and without counting against the circuit,
+            the provider answered. By default every error is retried.
+    """
+    # never retried: the circuit is open or the worker is shedding load
+    not_retryable = (CircuitOpenException, SchedulerSaturatedException)
+
+    def __init__(self, breaker: CircuitBreaker, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 20.0,
+                 retryable=None):
+        self.breaker = breaker
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.retries = 0
+
+    def backoff(self, retry_no: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry_no)))
+
+    async def call(self, func, *args, **kwargs):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenException:
+                EXTERNAL_CALLS.inc(provider=self.breaker.name, outcome='short_circuited')
+                raise
+            try:
+                result = await func(*args, **kwargs)
+            except self.not_retryable as e:
+                self.breaker.record_skip()
+                EXTERNAL_CALLS.inc(provider=self.breaker.name,
+                                   outcome='rejected' if isinstance(e, SchedulerSaturatedException) else 'short_circuited')
+                raise
+            except Exception as e:
+                if self.retryable is not None and not self.retryable(e):
+                    self.breaker.record_skip()
+                    EXTERNAL_CALLS.inc(provider=self.breaker.name, outcome='error')
+                    raise
+                self.breaker.record_failure()
+                EXTERNAL_CALLS.inc(provider=self.breaker.name, outcome='failure')
+                if attempt == self.attempts:
+                    raise
+                delay = self.backoff(attempt - 1)
+                self.retries += 1
+                logger.warning(f"`{self.breaker.name}` call failed (attempt {attempt}/{self.attempts}), "
+                               f"retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+            except BaseException:
+                self.breaker.record_skip()  # cancelled
+                raise
+            else:
+                self.breaker.record_success()
+                EXTERNAL_CALLS.inc(provider=self.breaker.name, outcome='success')
+                return result
+
+
+async def gather_partial(*coroutines) -> tuple[list, list]:
+    """
+    Await every coroutine and split the outcomes instead of failing on the first exception.
+
+    Returns:
+        (results, errors) - the successful results and (index, exception) pairs, in input order.
+    """
+    outcomes = await asyncio.gather(*coroutines, return_exceptions=True)
+    results, errors = [], []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            errors.append((index, outcome))
+        else:
+            results.append(outcome)
+    return results, errors
@@ -0,0 +1,142 @@
+import asyncio
+from collections import OrderedDict, deque
+from src.neoscreener.logger import logger
+from src.utils.exceptions import SchedulerSaturatedException
+
+# `process_task` transcribes and then generates the feedback with its own Gemini request, it cannot be
+# split, so a TRANSCRIPTION slot is a combined transcription + LLM slot. GENAI caps the LLM requests made
+# outside of it (known transcripts, batches, overall feedback): a worker makes up to TRANSCRIPTION + GENAI
+# concurrent Gemini requests.
+TRANSCRIPTION = 'transcription'
+GENAI = 'genai'
+MEDIA = 'media'  # local ffmpeg audio extraction
+
+
+class FairLimiter:
+    """
+    Concurrency cap for one external dependency, shared by every submission of the worker.
+
+    Waiting calls are granted round-robin across submissions, so a 40 question batch cannot
+    starve the 3 question batch queued behind it.
+
+    Args:
+        name (str): Dependency name, used in logs and stats.
+        concurrency (int): Maximum number of calls in flight.
+        max_waiting (int): Calls allowed to wait for a slot, beyond that `run` raises and the worker
+            reports itself saturated. `run_admitted` calls always wait.
+    """
+    def __init__(self, name: str, concurrency: int, max_waiting: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waiters = OrderedDict()  # submission id -> deque of futures, in round-robin order
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def has_capacity(self) -> bool:
+        return self.waiting < self.max_waiting
+
+    async def _acquire(self, submission_id: str, shed: bool = True) -> None:
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if shed and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise SchedulerSaturatedException(self.name, self.waiting)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(submission_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # the slot was granted while we were being cancelled
+            else:
+                self._discard(submission_id, future)
+            raise
+
+    def _discard(self, submission_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(submission_id)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._waiters[submission_id]
+
+    def _release(self) -> None:
+        # hand the slot to the next submission in turn, which then goes to the back of the rotation
+        while self._waiters:
+            submission_id, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            del self._waiters[submission_id]
+            if waiters:
+                self._waiters[submission_id] = waiters
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def run(self, submission_id: str, func, *args, **kwargs):
+        """
+        Await `func(*args, **kwargs)` once a slot is free for this dependency.
+        Raises `SchedulerSaturatedException` when the waiting room is full.
+        """
+        return await self._run(True, submission_id, func, *args, **kwargs)
+
+    async def run_admitted(self, submission_id: str, func, *args, **kwargs):
+        """
+        Like `run` but never refused, for the work of a job which was already admitted at the HTTP edge:
+        shedding it would only fail and redeliver the whole job. The waiting room can grow past
+        `max_waiting`, which keeps the worker saturated so the edge and the job consumers back off.
+        """
+        return await self._run(False, submission_id, func, *args, **kwargs)
+
+    async def _run(self, shed: bool, submission_id: str, func, *args, **kwargs):
+        await self._acquire(submission_id, shed)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.completed += 1
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            'concurrency': self.concurrency,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+
+class Scheduler:
+    """
+    Worker wide registry of the per-dependency limiters.
+
+    Args:
+        limits (dict): dependency name -> (concurrency, max_waiting)
+    """
+    def __init__(self, limits: dict):
+        self.limiters = {name: FairLimiter(name, concurrency, max_waiting)
+                         for name, (concurrency, max_waiting) in limits.items()}
+        logger.info(f"Scheduler limits: {limits}")
+
+    async def run(self, dependency: str, submission_id: str, func, *args, **kwargs):
+        return await self.limiters[dependency].run(submission_id, func, *args, **kwargs)
+
+    async def run_admitted(self, dependency: str, submission_id: str, func, *args, **kwargs):
+        return await self.limiters[dependency].run_admitted(submission_id, func, *args, **kwargs)
+
+    def saturated(self) -> bool:
+        """
+        True when any dependency has its waiting room full, new work should be refused.
+        """
+        return any(not limiter.has_capacity() for limiter in self.limiters.values())
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import requests
+from src.neoscreener.logger import logger
+
+# query parameters carrying the signature / expiry of S3, GCS, CloudFront and Azure signed urls
+SIGNATURE_PARAM_PREFIXES = ('x-amz-', 'x-goog-')
+SIGNATURE_PARAMS = {'signature', 'expires', 'key-pair-id', 'policy', 'googleaccessid', 'awsaccesskeyid',
+                    'sig', 'se', 'st', 'sp', 'sv', 'sr', 'spr', 'skoid', 'sktid', 'skt', 'ske', 'sks', 'skv'}
+
+
+def normalise_media_url(url: str) -> str:
+    """
+    Strips the signature and expiry of a signed url so every signed link of a media file maps to one key.
+    """
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(SIGNATURE_PARAM_PREFIXES) and name.lower() not in SIGNATURE_PARAMS
+    )
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+def media_content_hash(url: str, timeout: float = 5.0) -> str | None:
+    """
+    Content hash advertised by the storage for the media (ETag / x-goog-hash / Content-MD5), None when absent.
+    """
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"Could not read the content hash of the media: {e}")
+        return None
+    for header in ('x-goog-hash', 'Content-MD5', 'ETag'):
+        value = response.headers.get(header)
+        if value:
+            return value.strip('"')
+    return None
+
+
+def transcription_cache_key(url: str, content_hash: str | None = None) -> str:
+    key = normalise_media_url(url)
+    if content_hash:
+        key = f"{key}#{content_hash}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class SQLiteTranscriptionCache:
+    """
+    Transcriptions keyed by `transcription_cache_key`, stored in a local SQLite file and evicted
+    least recently used first once the stored text exceeds `max_bytes`. The stored size is kept as a
+    running total next to the entries, so a write does not scan the table.
+    """
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        # the file is created on first use, so importing the app in the gunicorn master touches nothing
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self._create_schema()
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _create_schema(self) -> None:
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS transcriptions (
+                        cache_key TEXT PRIMARY KEY,
+                        record TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                """)
+                connection.execute("CREATE INDEX IF NOT EXISTS transcriptions_accessed ON transcriptions (accessed_at)")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS transcriptions_size (
+                        id INTEGER PRIMARY KEY CHECK (id = 0),
+                        total INTEGER NOT NULL
+                    )
+                """)
+                # computed once, for cache files written before the total was kept
+                connection.execute("INSERT OR IGNORE INTO transcriptions_size (id, total) "
+                                   "SELECT 0, COALESCE(SUM(size), 0) FROM transcriptions")
+            self._schema_ready = True
+
+    def get(self, key: str) -> dict | None:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT record FROM transcriptions WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE transcriptions SET accessed_at = ? WHERE cache_key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key: str, record: dict) -> None:
+        data = json.dumps(record)
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = connection.execute("SELECT size FROM transcriptions WHERE cache_key = ?", (key,)).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO transcriptions (cache_key, record, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time())
+                )
+                connection.execute("UPDATE transcriptions_size SET total = total + ? WHERE id = 0",
+                                   (len(data) - (replaced[0] if replaced else 0),))
+                total = connection.execute("SELECT total FROM transcriptions_size WHERE id = 0").fetchone()[0]
+                if total > self.max_bytes:
+                    evicted = []
+                    for cache_key, size in connection.execute(
+                            "SELECT cache_key, size FROM transcriptions WHERE cache_key != ? ORDER BY accessed_at",
+                            (key,)).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        evicted.append((cache_key,))
+                        total -= size
+                    connection.executemany("DELETE FROM transcriptions WHERE cache_key = ?", evicted)
+                    connection.execute("UPDATE transcriptions_size SET total = ? WHERE id = 0", (total,))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def size(self) -> int:
+        """
+        Bytes of transcription text stored.
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT total FROM transcriptions_size WHERE id = 0").fetchone()[0]
+
+
+class DiskTranscriptionCache:
+    """
+    Same contract as `SQLiteTranscriptionCache`, one JSON file per key in `path`, evicted by access time.
+    The directory is scanned at most every `sweep_interval` seconds, it may exceed `max_bytes` in between.
+    """
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, sweep_interval: float = 60.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._swept_at = None
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        try:
+            with open(self._file(key)) as cache_file:
+                record = json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(self._file(key))
+        return record
+
+    def set(self, key: str, record: dict) -> None:
+        with open(self._file(key), 'w') as cache_file:
+            json.dump(record, cache_file)
+        now = time.monotonic()
+        if self._swept_at is not None and now - self._swept_at < self.sweep_interval:
+            return
+        self._swept_at = now
+        entries = [entry for entry in os.scandir(self.path) if entry.name.endswith('.json')]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+
+def build_transcription_cache(backend: str, path: str, max_bytes: int):
+    """
+    Returns the configured cache backend, `sqlite` or `disk`.
+    """
+    if backend == 'disk':
+        return DiskTranscriptionCache(path, max_bytes=max_bytes)
+    return SQLiteTranscriptionCache(path, max_bytes=max_bytes)
@@ -1,6 +1,49 @@
+import asyncio
+import json
+import logging
+import os
+import runpy
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from contextlib import closing
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
+
+# read when `src` is imported, the test runs log outside of the repo's logs/ directory
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='unit_test_logs_'))
+
+import mysql.connector
+from dotenv import dotenv_values
+from benchmarks.fakes import fake_db, FakeSchema
+from src import correlation_id, CorrelationIdFilter, RateLimitFilter
 from src.neoscreener.candidate_score_feedback import GenAiFeedbackModule
+from src.secrets.load_keys import LoadSecret
+from src.utils import async_db_ops, db_pool
+from src.utils import db_ops as db_ops_module
+from src.utils.api_validation import validate_api_data_nontech, validate_api_data_model
+from src.utils.batch_feedback import pack_batches, parse_batch_feedback
+from src.utils.config_registry import ConfigRegistry
+from src.utils.db_ops import (group_by_attempt, retrieve_student_attempts, write_attempt_results, overall_rating,
+                              invalidate_test_template, insert_data_into_mysql, update_student_questions,
+                              update_section_wise_marks, get_test_template_index, template_cache, feedback_rating)
+from src.utils.db_pool import DBPool, run_in_unit_of_work, get_connection
+from src.utils.exceptions import (SchedulerSaturatedException, CircuitOpenException, DBPoolTimeoutException,
+                                  ApiValidationException)
+from src.utils.feedback_cache import FeedbackCache, is_blank_response
+from src.utils.feedback_compaction import compact_question_feedback, estimate_tokens
+from src.utils.health import CachedProbe, OK, UNAVAILABLE
+from src.utils.job_queue import SQLiteJobQueue, JobWorkerPool, QUEUED, RUNNING, DONE, FAILED
+from src.utils.job_status import JobStatusStore
+from src.utils.media import MediaPreprocessor, parse_ffmpeg_report, silence_reason
+from src.utils.metrics import Registry, LOCAL, mark_process_dead
+from src.utils.ndjson import iter_ndjson
+from src.utils.question_pipeline import QuestionPipeline
+from src.utils.resilience import CircuitBreaker, RetryPolicy, gather_partial, is_transient_error, OPEN, CLOSED
+from src.utils.scheduler import FairLimiter, Scheduler
+from src.utils.transcription_cache import SQLiteTranscriptionCache, transcription_cache_key
 
 class TestNERGrammarCheck(unittest.TestCase):
     
@@ -11,10 +54,1167 @@ class TestNERGrammarCheck(unittest.TestCase):
         self.assertEqual(obj.get_feedback(),str)
 
 
-if __name__ == '__main__':
-    suite = unittest.TestLoader().loadTestsFromTestCase(TestNERGrammarCheck)
-    result = unittest.TextTestRunner().run(suite)
+class FakeProvider:
+    """
+    Local stand-in for the transcription / GenAI providers with a fixed latency per call.
+    """
+    def __init__(self, latency:float=0.02):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def call(self, item):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            self.calls.append(item)
+            return item
+        finally:
+            self.in_flight -= 1
+
+
+class TestFairLimiter(unittest.TestCase):
+
+    def test_caps_concurrency(self):
+        provider = FakeProvider()
+        limiter = FairLimiter('transcription', concurrency=4, max_waiting=100)
+
+        async def run():
+            return await asyncio.gather(*[limiter.run('job', provider.call, i) for i in range(40)])
+
+        self.assertEqual(asyncio.run(run()), list(range(40)))
+        self.assertEqual(provider.max_in_flight, 4)
+
+    def test_round_robin_across_submissions(self):
+        provider = FakeProvider()
+        limiter = FairLimiter('transcription', concurrency=1, max_waiting=100)
+
+        async def run():
+            big = [limiter.run('big', provider.call, f'big-{i}') for i in range(10)]
+            small = [limiter.run('small', provider.call, f'small-{i}') for i in range(2)]
+            await asyncio.gather(*big, *small)
+
+        asyncio.run(run())
+        # the small submission is served between the calls of the big one instead of after all of them
+        self.assertLess(provider.calls.index('small-1'), 6)
+
+    def test_rejects_when_saturated(self):
+        provider = FakeProvider()
+        limiter = FairLimiter('genai', concurrency=2, max_waiting=3)
+
+        async def run():
+            return await asyncio.gather(*[limiter.run('job', provider.call, i) for i in range(10)],
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+        rejected = [r for r in results if isinstance(r, SchedulerSaturatedException)]
+        self.assertEqual(len(rejected), 5)
+        self.assertEqual(limiter.rejected, 5)
+
+    def test_admitted_work_waits_instead_of_being_shed(self):
+        provider = FakeProvider(latency=0.01)
+        scheduler = Scheduler({'genai': (2, 3)})
+        limiter = scheduler.limiters['genai']
+
+        async def run():
+            calls = [asyncio.create_task(limiter.run_admitted('job', provider.call, i)) for i in range(10)]
+            await asyncio.sleep(0)
+            # the waiting room overflows, the worker reports saturated so the edge refuses new jobs
+            saturated = scheduler.saturated()
+            return await asyncio.gather(*calls), saturated
+
+        results, saturated = asyncio.run(run())
+        self.assertEqual(results, list(range(10)))
+        self.assertTrue(saturated)
+        self.assertEqual((limiter.rejected, provider.max_in_flight), (0, 2))
+
+    def test_throughput_flat_under_overload(self):
+        limiter = FairLimiter('transcription', concurrency=4, max_waiting=1000)
+
+        def throughput(items:int)->float:
+            provider = FakeProvider(latency=0.02)
+
+            async def run():
+                await asyncio.gather(*[limiter.run(f'job-{i % 5}', provider.call, i) for i in range(items)])
+
+            started = time.perf_counter()
+            asyncio.run(run())
+            return items / (time.perf_counter() - started)
+
+        nominal = throughput(20)
+        overloaded = throughput(200)
+        self.assertGreater(overloaded, nominal * 0.7)
+
+
+class FaultyProvider:
+    """
+    Local provider stub which fails the first `failures` calls, or the calls for the given items.
+    """
+    def __init__(self, failures:int=0, failing_items:tuple=()):
+        self.failures = failures
+        self.failing_items = failing_items
+        self.calls = 0
+
+    async def call(self, item=None):
+        self.calls += 1
+        if self.calls <= self.failures or item in self.failing_items:
+            raise ConnectionError(f"injected failure on call {self.calls}")
+        return item
+
+
+class TestResilience(unittest.TestCase):
+
+    def test_retry_recovers_from_transient_failures(self):
+        provider = FaultyProvider(failures=2)
+        policy = RetryPolicy(CircuitBreaker('transcription', failure_threshold=5), attempts=3, base_delay=0)
+        self.assertEqual(asyncio.run(policy.call(provider.call, 'ok')), 'ok')
+        self.assertEqual(provider.calls, 3)
+        self.assertEqual(policy.retries, 2)
+        self.assertEqual(policy.breaker.state, CLOSED)
+
+    def test_breaker_opens_and_fails_fast(self):
+        provider = FaultyProvider(failures=100)
+        policy = RetryPolicy(CircuitBreaker('genai', failure_threshold=2, reset_timeout=60), attempts=1)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                asyncio.run(policy.call(provider.call))
+        self.assertEqual(policy.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenException):
+            asyncio.run(policy.call(provider.call))
+        self.assertEqual(provider.calls, 2)
+
+    def test_breaker_closes_after_successful_trial(self):
+        provider = FaultyProvider(failures=2)
+        policy = RetryPolicy(CircuitBreaker('genai', failure_threshold=2, reset_timeout=0.05), attempts=1)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                asyncio.run(policy.call(provider.call))
+        time.sleep(0.06)
+        self.assertEqual(asyncio.run(policy.call(provider.call, 'ok')), 'ok')
+        self.assertEqual(policy.breaker.state, CLOSED)
+
+    def test_only_transient_errors_are_retried_and_counted(self):
+        class ProviderError(Exception):
+            def __init__(self, code):
+                super().__init__(f"status {code}")
+                self.code = code
+
+        class Timeout(OSError):  # as requests.exceptions.Timeout, not a TimeoutError
+            pass
+
+        class ReadTimeout(Timeout):
+            pass
+
+        self.assertTrue(all(is_transient_error(error) for error in
+                            (TimeoutError(), ConnectionError(), ProviderError(429), ProviderError(503),
+                             ReadTimeout())))
+        self.assertFalse(is_transient_error(KeyError('transcription_text')))
+        self.assertFalse(any(is_transient_error(error) for error in
+                             (ValueError(), ProviderError(400), mysql.connector.Error())))
+
+        policy = RetryPolicy(CircuitBreaker('genai', failure_threshold=1), attempts=3, base_delay=0,
+                             retryable=is_transient_error)
+        calls = []
+
+        async def bad_request():
+            calls.append(1)
+            raise ProviderError(400)
+
+        with self.assertRaises(ProviderError):
+            asyncio.run(policy.call(bad_request))
+        self.assertEqual((len(calls), policy.retries, policy.breaker.state), (1, 0, CLOSED))
+
+    def test_provider_policies_retry_only_transient_errors(self):
+        import main
+        for policy in (main.transcription_policy, main.genai_policy):
+            self.assertIs(policy.retryable, is_transient_error)
+
+    def test_partial_results_are_kept(self):
+        provider = FaultyProvider(failing_items=(2,))
+
+        async def run():
+            return await gather_partial(*[provider.call(i) for i in range(4)])
+
+        results, errors = asyncio.run(run())
+        self.assertEqual(results, [0, 1, 3])
+        self.assertEqual([index for index, _ in errors], [2])
+
+
+class TestTranscriptionCache(unittest.TestCase):
+
+    def test_key_ignores_url_signature(self):
+        first = "https://storage.googleapis.com/bucket/answer.mp4?X-Goog-Signature=abc&X-Goog-Expires=900"
+        second = "https://storage.googleapis.com/bucket/answer.mp4?X-Goog-Signature=def&X-Goog-Expires=600"
+        other = "https://storage.googleapis.com/bucket/other.mp4?X-Goog-Signature=abc"
+        self.assertEqual(transcription_cache_key(first), transcription_cache_key(second))
+        self.assertNotEqual(transcription_cache_key(first), transcription_cache_key(other))
+        self.assertNotEqual(transcription_cache_key(first, 'md5-a'), transcription_cache_key(second, 'md5-b'))
+
+    def test_evicts_least_recently_used(self):
+        cache = SQLiteTranscriptionCache(os.path.join(tempfile.mkdtemp(), 'cache.db'), max_bytes=250)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, {'transcription_text': 'x' * 50})
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('d', {'transcription_text': 'x' * 50})
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('d'))
+
+    def test_running_total_follows_replacements_and_evictions(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        cache = SQLiteTranscriptionCache(path, max_bytes=200)
+        for key in ('a', 'b', 'a', 'c', 'd'):
+            cache.set(key, {'transcription_text': key * 50})
+        with closing(sqlite3.connect(path)) as connection:
+            stored = connection.execute("SELECT COALESCE(SUM(size), 0) FROM transcriptions").fetchone()[0]
+        self.assertEqual(cache.size(), stored)
+        self.assertLessEqual(stored, 200)
+        # a reopened cache keeps the total
+        self.assertEqual(SQLiteTranscriptionCache(path, max_bytes=200).size(), stored)
+
+    def test_stored_transcripts_are_reused_without_the_cache(self):
+        schema = FakeSchema()
+        payload = schema.seed(attempts=1, questions=3)[0]
+        stored = {**payload[0], 'video_link': payload[0]['video_url'], 'transcription_text': 'stored answer',
+                  'feedback': '[]'}
+        pipeline = QuestionPipeline(None, None, None, process_task=None, feedback_provider=None, db_config={})
+        with fake_db(responder=schema):
+            insert_data_into_mysql([stored], {})
+            known = asyncio.run(pipeline.known_transcripts(payload))
+        self.assertEqual(list(known), [payload[0]['s_question_id']])
+        self.assertEqual(known[payload[0]['s_question_id']]['transcription_text'], 'stored answer')
+
+
+class TestFeedbackCache(unittest.TestCase):
+
+    def test_blank_responses(self):
+        self.assertTrue(is_blank_response(None))
+        self.assertTrue(is_blank_response("  ... \n"))
+        self.assertFalse(is_blank_response("I would use a hash map"))
+
+    def test_key_covers_transcript_and_prompt_version(self):
+        path = os.path.join(tempfile.mkdtemp(), 'feedback.db')
+        cache = FeedbackCache(path, prompt_version='v1')
+        cache.set("What is a list?", "A list is  an ordered collection", '[{"Rating": 7}]')
+        self.assertEqual(cache.get("What is a list?", "a list is an ordered collection"), '[{"Rating": 7}]')
+        self.assertIsNone(cache.get("What is a list?", "A tuple"))
+        self.assertIsNone(FeedbackCache(path, prompt_version='v2').get("What is a list?", "A list is an ordered collection"))
+
+
+class TestBatchFeedback(unittest.TestCase):
+
+    items = [{'s_question_id': i, 'question': f"Question {i}", 'candidate_response': 'x' * 40} for i in range(5)]
+
+    def test_batches_are_bounded(self):
+        self.assertEqual([len(batch) for batch in pack_batches(self.items, max_questions=2, max_chars=1000)], [2, 2, 1])
+        self.assertEqual([len(batch) for batch in pack_batches(self.items, max_questions=10, max_chars=100)], [2, 2, 1])
+
+    def test_answer_is_split_per_question(self):
+        answer = "```json\n" + json.dumps([{'s_question_id': 1, 'strength': 's', 'Rating': 6},
+                                              {'s_question_id': 2, 'Rating': 'N/A'},
+                                              {'s_question_id': 99, 'Rating': 5}]) + "\n```"
+        feedback = parse_batch_feedback(answer, self.items[:3])
+        self.assertEqual(list(feedback), [1])
+        self.assertEqual(json.loads(feedback[1])[0]['question'], "Question 1")
+        with self.assertRaises(ValueError):
+            parse_batch_feedback("Sorry, I cannot help with that.", self.items)
+
+
+class TestApiValidation(unittest.TestCase):
+
+    payload = [{'s_question_id': 1, 'q_id': 'a', 'video_url': 'https://storage.example.com/1.mp4', 'question': 'q'},
+               {'s_question_id': 2, 'q_id': 'a', 'video_url': 'not a url', 'question': 'q'}]
+
+    def test_errors_carry_item_path(self):
+        for validate_api_data in (validate_api_data_nontech, validate_api_data_model):
+            self.assertTrue(validate_api_data(self.payload[:1])[0])
+            status, message = validate_api_data(self.payload)
+            self.assertFalse(status)
+            self.assertTrue(message.startswith("[1].video_url:"), message)
+
+
+class TestNdjsonIngestion(unittest.TestCase):
+
+    def test_lines_are_validated_one_by_one(self):
+        item = {'s_question_id': 1, 'q_id': 'a', 'video_url': 'https://storage.example.com/1.mp4', 'question': 'q'}
+        body = '\n'.join([json.dumps(item), '{broken', '', 'x' * 300, json.dumps({**item, 'q_id': 2})]).encode()
+
+        async def chunks():
+            for start in range(0, len(body), 16):
+                yield body[start:start + 16]
+
+        async def run():
+            return [(line_no, item is not None, len(errors)) async for line_no, item, errors in iter_ndjson(chunks(), 256)]
+
+        self.assertEqual(asyncio.run(run()), [(1, True, 0), (2, False, 1), (4, False, 1), (5, False, 1)])
+
+
+class TestAttemptGrouping(unittest.TestCase):
+
+    def test_mixed_batch_is_grouped_per_attempt(self):
+        attempts = {1: {'user_id': 'u1', 't_id': 't', 'c_id': 'c', 'attempt_no': 1},
+                    2: {'user_id': 'u2', 't_id': 't', 'c_id': 'c', 'attempt_no': 1},
+                    3: {'user_id': 'u1', 't_id': 't', 'c_id': 'c', 'attempt_no': 1}}
+        groups = group_by_attempt([{'s_question_id': i} for i in (1, 2, 3, 4)], attempts)
+        self.assertEqual(list(groups), [('u1', 't', 'c', 1), ('u2', 't', 'c', 1)])
+        self.assertEqual([result['s_question_id'] for result in groups[('u1', 't', 'c', 1)]], [1, 3])
+
+    def test_lookup_errors_reach_the_job(self):
+        def lost_connection(query, params, dictionary):
+            raise mysql.connector.errors.OperationalError('Lost connection to MySQL server during query')
+
+        with fake_db(responder=lost_connection), self.assertRaises(mysql.connector.Error):
+            retrieve_student_attempts([1, 2], {})  # an empty result would mark the job done without marks
+        with fake_db(responder=FakeSchema()):
+            self.assertEqual(retrieve_student_attempts([1, 2], {}), {})
+
+
+class TestUnitOfWork(unittest.TestCase):
+
+    def test_deadlock_replays_the_whole_unit(self):
+        deadlocks = [mysql.connector.errors.InternalError(msg="Deadlock found", errno=1213)]
+
+        def responder(query, params, dictionary):
+            if query.lstrip().startswith("UPDATE student_questions") and deadlocks:
+                raise deadlocks.pop()
+            return []
+
+        results = [{'s_question_id': 1, 'q_id': 'a', 'feedback': '[{"Rating": 7}]'}]
+        with fake_db(responder=responder) as connection:
+            run_in_unit_of_work({}, write_attempt_results, results, {})
+        inserts = [query for query, _ in connection.statements if query.startswith("INSERT INTO video_auto_results")]
+        self.assertEqual((len(inserts), connection.rollbacks, connection.commits), (2, 1, 1))
+
+
+    def test_unexpected_errors_roll_the_unit_back(self):
+        results = [{'s_question_id': 1, 'q_id': 'a', 'feedback': '[{"Rating": 7}]'}]
+        attempt = {'user_id': 'user0', 't_id': 't1', 'c_id': 'c1', 'attempt_no': 1}
+        with fake_db(responder=lambda query, params, dictionary: []) as connection, \
+                patch('src.utils.db_ops.get_test_template_index', side_effect=ValueError('malformed template')):
+            with self.assertRaises(ValueError):
+                run_in_unit_of_work({}, write_attempt_results, results, {}, attempt)
+        self.assertEqual((connection.rollbacks, connection.commits), (1, 0))
+
+    def test_unexpected_errors_are_only_logged_outside_a_unit(self):
+        with fake_db(responder=lambda query, params, dictionary: []), \
+                patch('src.utils.db_ops.get_test_template_index', side_effect=ValueError('malformed template')):
+            update_section_wise_marks({}, 't1', 'user0', 'c1', 1)
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_is_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram('stage_seconds', 'Stage duration.', ('stage',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage='db_insert')
+        lines = registry.render().splitlines()
+        self.assertIn('stage_seconds_bucket{stage="db_insert",le="0.1"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="db_insert",le="1.0"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="db_insert",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_count{stage="db_insert"} 4', lines)
+
+    @staticmethod
+    def worker(directory: str, pid: int, calls: int, in_flight: int, depth: int) -> Registry:
+        registry = Registry(multiprocess_dir=directory)
+        counter = registry.counter('calls_total', 'Calls.', ('outcome',))
+        for _ in range(calls):
+            counter.inc(outcome='success')
+        registry.histogram('stage_seconds', 'Stage duration.', buckets=(1.0,)).observe(0.5)
+        registry.gauge('in_flight', 'Jobs in flight.', lambda: in_flight)
+        registry.gauge('depth', 'Shared queue depth.', lambda: depth, aggregate=LOCAL)
+        with patch('src.utils.metrics.os.getpid', return_value=pid):
+            registry.flush()
+        return registry
+
+    def test_every_scrape_returns_the_totals_of_all_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.worker(directory, 101, calls=2, in_flight=1, depth=4)
+            serving = self.worker(directory, 102, calls=3, in_flight=2, depth=5)
+            with patch('src.utils.metrics.os.getpid', return_value=102):
+                samples = serving.render().splitlines()
+            self.assertIn('calls_total{outcome="success"} 5', samples)
+            self.assertIn('stage_seconds_bucket{le="1.0"} 2', samples)
+            self.assertIn('in_flight 3', samples)
+            self.assertIn('depth 5', samples)
+
+            # an exited worker keeps its counts in the totals, not its gauges
+            mark_process_dead(directory, 101)
+            with patch('src.utils.metrics.os.getpid', return_value=102):
+                samples = serving.render().splitlines()
+            self.assertIn('calls_total{outcome="success"} 5', samples)
+            self.assertIn('in_flight 2', samples)
+
+
+class TestHealthProbes(unittest.TestCase):
+
+    def test_probe_result_is_cached(self):
+        calls = []
+        probe = CachedProbe('database', lambda: calls.append(1) or (OK, {}), ttl=60)
+        async def hit_twice():
+            return await asyncio.gather(probe.result(), probe.result(), probe.result())
+        results = asyncio.run(hit_twice())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result['status'] == OK for result in results))
+
+    def test_slow_probe_is_unavailable(self):
+        probe = CachedProbe('database', lambda: time.sleep(0.5) or (OK, {}), timeout=0.05)
+        result = asyncio.run(probe.result())
+        self.assertEqual(result['status'], UNAVAILABLE)
+        self.assertIn('timed out', result['error'])
+
+
+class TestFeedbackCompaction(unittest.TestCase):
+
+    def feedback(self, rating):
+        return json.dumps([{'question': 'Explain overfitting. ' * 10, 'area_of_improvement': 'Give examples. ' * 40,
+                            'strength': 'No data found', 'suggestions': 'Practise. ' * 30, 'Rating': str(rating)}])
+
+    def test_small_attempt_is_kept_whole(self):
+        text, stats = compact_question_feedback([self.feedback(7), 'not json'], token_budget=6000)
+        lines = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual(stats['tier'], 'full')
+        self.assertEqual((lines[0]['rating'], lines[1]['feedback']), (7, 'not json'))
+        self.assertNotIn('strength', lines[0])
+
+    def test_large_attempt_fits_the_budget_and_keeps_every_rating(self):
+        blobs = [self.feedback(i % 11) for i in range(60)]
+        text, stats = compact_question_feedback(blobs, token_budget=1500)
+        self.assertLessEqual(estimate_tokens(text), 1500)
+        self.assertLess(stats['tokens_after'], stats['tokens_before'])
+        self.assertEqual([json.loads(line)['rating'] for line in text.splitlines()], [i % 11 for i in range(60)])
+        self.assertEqual(compact_question_feedback(blobs, token_budget=1500)[0], text)
+
+
+class TestConfigRegistry(unittest.TestCase):
+
+    CONFIG = """
+prompt:
+  - "Rate {candidate_response} for {question} as {expected_output_format}"
+expected_output_format:
+  - "{'Rating': 'Rating out of 10'}"
+overal_feedback_prompt: "Overall: {question_feedback}"
+batch_prompt: "{expected_output_format} {questions}"
+"""
+
+    def write(self, path, content, mtime):
+        with open(path, 'w') as config_file:
+            config_file.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def test_prompts_are_compiled_and_reloaded_on_change(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feedback_config.yml')
+            self.write(path, self.CONFIG, 1000)
+            registry = ConfigRegistry(path, check_interval=0)
+            versions = []
+            registry.subscribe(lambda config: versions.append(config.version))
+            first = registry.version
+            self.assertEqual(registry.render('question_feedback', question='Q', candidate_response='A'),
+                             "Rate A for Q as {'Rating': 'Rating out of 10'}")
+
+            self.write(path, self.CONFIG.replace('Overall:', 'Summary:'), 2000)
+            self.assertEqual(registry.render('overall_feedback', question_feedback='x'), 'Summary: x')
+            self.assertEqual(versions, [registry.version])
+            self.assertNotEqual(registry.version, first)
+
+    def test_edit_reaches_the_feedback_cache_and_status_without_a_render(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feedback_config.yml')
+            self.write(path, self.CONFIG, 1000)
+            registry = ConfigRegistry(path, check_interval=0)
+            cache = FeedbackCache(os.path.join(directory, 'feedback.db'), prompt_version=lambda: registry.version)
+            cache.set("What is a list?", "An ordered collection", '[]')
+            self.write(path, self.CONFIG.replace('Rate', 'Score'), 2000)
+            self.assertIsNone(cache.get("What is a list?", "An ordered collection"))
+            self.assertEqual(cache.prompt_version, registry.stats()['version'])
+            self.assertEqual(registry.stats()['reloads'], 1)
+
+    def test_invalid_edit_keeps_the_last_valid_version(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feedback_config.yml')
+            self.write(path, self.CONFIG, 1000)
+            registry = ConfigRegistry(path, check_interval=0)
+            version = registry.version
+            self.write(path, self.CONFIG.replace('{question_feedback}', '{feedback}'), 2000)
+            self.assertEqual(registry.version, version)
+            self.assertEqual(registry.stats()['failed_reloads'], 1)
+
+
+class TestMediaPreprocess(unittest.TestCase):
+
+    REPORT = (
+        "Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'answer.mp4':\n"
+        "  Duration: 00:00:12.50, start: 0.000000, bitrate: 1200 kb/s\n"
+        "[silencedetect @ 0x1] silence_start: -0.01\n"
+        "[silencedetect @ 0x1] silence_end: 2.5 | silence_duration: 2.51\n"
+        "[silencedetect @ 0x1] silence_start: 11\n"
+        "size=      40kB time=00:00:12.48 bitrate=  26.3kbits/s speed= 150x\n")
+
+    def test_report_gives_duration_bitrate_and_silence(self):
+        report = parse_ffmpeg_report(self.REPORT)
+        self.assertEqual((report['duration'], report['source_bitrate']), (12.48, 1200))
+        self.assertAlmostEqual(report['silence'], 2.5 + 1.48)
+
+    def test_silent_and_short_answers_are_not_transcribed(self):
+        self.assertEqual(silence_reason(0.4, 0.0, min_duration=1, min_voiced=1), 'too_short')
+        self.assertEqual(silence_reason(30, 29.5, min_duration=1, min_voiced=1), 'silent')
+        self.assertIsNone(silence_reason(12.48, 3.98, min_duration=1, min_voiced=1))
+
+    def test_media_is_only_decoded_never_encoded(self):
+        command = MediaPreprocessor()._command('https://storage.example/answer.mp4')
+        self.assertEqual(command[-3:], ['-f', 'null', '-'])
+        self.assertNotIn('-c:a', command)
+
+    def test_bucket_objects_are_not_downloaded_to_be_measured(self):
+        preprocessor = MediaPreprocessor()
+        self.assertTrue(preprocessor.measurable('https://storage.example/answer.mp4?X-Goog-Signature=1'))
+        self.assertFalse(preprocessor.measurable('gs://answers/answer.mp4'))
+        self.assertFalse(preprocessor.measurable('s3://answers/answer.mp4'))
+        self.assertEqual(preprocessor.stats()['skipped'], 2)
+
+class TestAttemptMarks(unittest.TestCase):
 
-    # If you want to ensure that the exit code reflects the test results
-    if not result.wasSuccessful():
-        exit(1)
\ No newline at end of file
+    def test_marks_are_written_with_the_question_rows(self):
+        schema = FakeSchema()
+        payload = schema.seed(attempts=1, questions=4, sections=2, total_marks=50)[0]
+        results = [{**doc, 'feedback': json.dumps([{'Rating': rating}])} for doc, rating in zip(payload, (10, 6, 8, 0))]
+        attempt = {'user_id': 'user0', 't_id': 't1', 'c_id': 'c1', 'attempt_no': 1}
+        invalidate_test_template('t1')
+        with fake_db(responder=schema):
+            rating = run_in_unit_of_work({}, write_attempt_results, results, {}, attempt)
+        course = schema.student_course[('user0', 'c1', 't1', 1)]
+        self.assertEqual((rating, course['t_marks']), (6.0, 30.0))
+        # q0 and q2 are in the first section, q1 and q3 in the second
+        self.assertEqual([section['marks'] for section in json.loads(course['section_wise_marks'])], [18, 6])
+        self.assertFalse(schema.unmatched)
+
+    def test_overall_rating_is_the_average_of_rated_questions(self):
+        self.assertEqual(overall_rating([6, '7', None, 'n/a', 8.5]), 7.17)
+        self.assertIsNone(overall_rating([None]))
+
+
+class TestDBPool(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        patcher = patch('src.utils.db_pool.pooling.MySQLConnectionPool')
+        self.mysql_pool = patcher.start()
+        self.mysql_pool.return_value.get_connection.return_value = self.connection
+        self.addCleanup(patcher.stop)
+
+    def test_checkout_times_out_when_every_connection_is_borrowed(self):
+        pool = DBPool({'host': 'db'}, pool_size=1, timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(DBPoolTimeoutException):
+                with pool.connection():
+                    pass
+        with pool.connection() as connection:
+            self.assertIs(connection, self.connection)
+        self.assertEqual((pool.stats()['checkouts'], pool.stats()['timeouts'], pool.stats()['in_use']), (2, 1, 0))
+        self.assertEqual(self.mysql_pool.call_count, 1)  # built lazily, once
+        self.assertEqual(self.connection.close.call_count, 2)  # handed back to the pool
+
+    def test_failing_block_rolls_back(self):
+        pool = DBPool({'host': 'db'}, pool_size=1)
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError("boom")
+        self.connection.rollback.assert_called_once()
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_forked_worker_builds_its_own_pool(self):
+        inherited = DBPool({'host': 'db'}, pool_size=3, timeout=7)
+        inherited.pid = -1  # built by the gunicorn master before the fork
+        with patch.object(db_pool, '_pool', inherited):
+            pool = db_pool._current_pool({})
+            self.assertIsNot(pool, inherited)
+            self.assertEqual((pool.pid, pool.db_config, pool.pool_size, pool.timeout), (os.getpid(), {'host': 'db'}, 3, 7))
+            self.assertIs(db_pool._current_pool({}), pool)
+
+
+class TestDBExecutor(unittest.TestCase):
+
+    def tearDown(self):
+        async_db_ops.shutdown_db_executor()
+
+    def test_blocking_calls_are_bounded_and_keep_the_caller_context(self):
+        running, peak = [0], [0]
+
+        def blocking_call(item):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            running[0] -= 1
+            return item, correlation_id.get()
+
+        async def main():
+            token = correlation_id.set('job-1')
+            try:
+                ticks = 0
+                calls = asyncio.gather(*[async_db_ops.run_blocking(blocking_call, n) for n in range(6)])
+                while not calls.done():
+                    ticks += 1  # the loop keeps turning while the DB calls run
+                    await asyncio.sleep(0.005)
+                return await calls, ticks
+            finally:
+                correlation_id.reset(token)
+
+        with patch.dict(os.environ, {'DB_EXECUTOR_WORKERS': '2'}):
+            async_db_ops.shutdown_db_executor()
+            results, ticks = asyncio.run(main())
+        self.assertEqual(results, [(n, 'job-1') for n in range(6)])
+        self.assertEqual(peak[0], 2)
+        self.assertGreater(ticks, 5)
+
+
+class TestStudentQuestionsUpdate(unittest.TestCase):
+
+    # the per-row statement the joined UPDATE replaced
+    PER_ROW_UPDATE = """
+        UPDATE student_questions AS sq
+        SET
+            sq.marks = (
+                CASE
+                    WHEN EXISTS (SELECT 1 FROM video_auto_results WHERE s_question_id = %s AND overall_score IS NOT NULL) THEN
+                        (SELECT overall_score FROM video_auto_results WHERE s_question_id = %s)
+                    ELSE
+                        0
+                END
+            ),
+            sq.state = (
+                CASE
+                    WHEN EXISTS (SELECT 1 FROM video_auto_results WHERE s_question_id = %s AND overall_score IS NOT NULL) THEN
+                        IF ((SELECT overall_score FROM video_auto_results WHERE s_question_id = %s) = sq.q_total_marks, 1,
+                            IF ((SELECT overall_score FROM video_auto_results WHERE s_question_id = %s) = 0, 2, 4)
+                        )
+                END
+            )
+        WHERE sq.s_question_id = %s;
+    """
+
+    def graded_attempt(self):
+        schema = FakeSchema()
+        payload = schema.seed(attempts=1, questions=12)[0]
+        # full marks, zero, partial, numeric and non numeric string ratings and feedback without a rating
+        feedbacks = [json.dumps([{'Rating': rating}]) for rating in (10, 0, 7, '10', 3.5, 'N/A')] + ['not json', '[]']
+        results = [{**doc, 'feedback': feedbacks[number % len(feedbacks)]} for number, doc in enumerate(payload)]
+        return schema, results
+
+    def final_rows(self, write) -> dict:
+        schema, results = self.graded_attempt()
+        with fake_db(responder=schema):
+            write(results)
+        self.assertFalse(schema.unmatched)
+        return {s_question_id: (row['marks'], row['state']) for s_question_id, row in schema.student_questions.items()}
+
+    def per_row(self, results):
+        insert_data_into_mysql(results, {})
+        with get_connection({}) as connection:
+            with connection.cursor() as cursor:
+                for result in results:
+                    cursor.execute(self.PER_ROW_UPDATE, (result['s_question_id'],) * 6)
+
+    def test_joined_update_matches_the_per_row_updates(self):
+        expected = self.final_rows(self.per_row)
+        self.assertEqual(set(expected.values()), {(10, 1), (0, 2), (7, 4), (3.5, 4), (0, None)})
+        # scores joined from video_auto_results, in chunks smaller than the batch
+        self.assertEqual(self.final_rows(lambda results: (insert_data_into_mysql(results, {}),
+                                                          update_student_questions(results, {}, batch_size=5))),
+                         expected)
+        # scores joined from the in-memory ratings, as write_attempt_results does
+        self.assertEqual(self.final_rows(lambda results: run_in_unit_of_work({}, write_attempt_results, results, {})),
+                         expected)
+
+    def test_only_numbers_are_joined_as_scores(self):
+        schema, results = self.graded_attempt()
+        with fake_db(responder=schema) as connection:
+            update_student_questions(results, {}, scores={result['s_question_id']: feedback_rating(result['feedback'])
+                                                          for result in results})
+        query, params = next((query, params) for query, params in connection.statements
+                             if query.lstrip().startswith('UPDATE student_questions'))
+        count = len(params) // 3
+        self.assertEqual(set(map(type, params[1:2 * count:2])), {float, type(None)})
+        # "N/A" is no score, not a zero mark
+        na = next(result['s_question_id'] for result in results if 'N/A' in result['feedback'])
+        self.assertEqual((schema.student_questions[na]['marks'], schema.student_questions[na]['state']), (0, None))
+
+
+class TestSectionMarks(unittest.TestCase):
+
+    def graded_test(self) -> FakeSchema:
+        schema = FakeSchema()
+        schema.seed(attempts=3, questions=6, sections=3)
+        for row in schema.student_questions.values():
+            row['marks'] = row['s_question_id']
+        invalidate_test_template('t1')
+        return schema
+
+    @staticmethod
+    def section_marks(schema: FakeSchema, user_id: str) -> list:
+        return [section['marks'] for section in
+                json.loads(schema.student_course[(user_id, 'c1', 't1', 1)]['section_wise_marks'])]
+
+    def test_only_the_graded_attempt_is_written(self):
+        schema = self.graded_test()
+        with fake_db(responder=schema) as connection:
+            update_section_wise_marks({}, 't1', 'user1', 'c1', 1)
+        # q0/q3, q1/q4 and q2/q5 share a section, user1 answered s_question_id 7 to 12
+        self.assertEqual(self.section_marks(schema, 'user1'), [7 + 10, 8 + 11, 9 + 12])
+        self.assertEqual(self.section_marks(schema, 'user0'), [0, 0, 0])
+        self.assertEqual(self.section_marks(schema, 'user2'), [0, 0, 0])
+        updates = [statement for statement, _ in connection.statements if statement.startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(schema.unmatched)
+
+    def test_scoped_marks_match_the_test_wide_refresh(self):
+        scoped, test_wide = self.graded_test(), self.graded_test()
+        with fake_db(responder=scoped):
+            for user_id in ('user0', 'user1', 'user2'):
+                update_section_wise_marks({}, 't1', user_id, 'c1', 1)
+        with fake_db(responder=test_wide):
+            update_section_wise_marks({}, 't1')
+        self.assertEqual(scoped.student_course, test_wide.student_course)
+        self.assertFalse(scoped.unmatched or test_wide.unmatched)
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_test_template()
+        self.schema = FakeSchema()
+        self.schema.seed(attempts=1, questions=4, sections=2)
+
+    def template_reads(self, connection) -> int:
+        return sum('FROM tests t' in statement for statement, _ in connection.statements)
+
+    def index(self) -> dict:
+        with get_connection({}) as connection:
+            with connection.cursor(dictionary=True) as cursor:
+                return get_test_template_index(cursor, 't1')
+
+    def test_template_is_read_once(self):
+        with fake_db(responder=self.schema) as connection:
+            first, second = self.index(), self.index()
+        self.assertIs(first, second)
+        self.assertEqual(self.template_reads(connection), 1)
+        self.assertEqual(first['question_section'], {'q0': 'section 0', 'q1': 'section 1',
+                                                     'q2': 'section 0', 'q3': 'section 1'})
+
+    def test_invalidation_rereads_an_edited_template(self):
+        with fake_db(responder=self.schema) as connection:
+            self.index()
+            template = json.loads(self.schema.tests['t1']['template_data'])
+            template['questions'][0]['questionList'].append('q9')
+            self.schema.tests['t1']['template_data'] = json.dumps(template)
+            self.assertNotIn('q9', self.index()['question_section'])
+            invalidate_test_template('t1')
+            self.assertEqual(self.index()['question_section']['q9'], 'section 0')
+        self.assertEqual(self.template_reads(connection), 2)
+
+    def test_entries_expire_after_the_ttl(self):
+        with patch.object(template_cache, 'ttl', 0.0), fake_db(responder=self.schema) as connection:
+            self.index()
+            self.index()
+        self.assertEqual(self.template_reads(connection), 2)
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def queue(self, **kwargs) -> SQLiteJobQueue:
+        return SQLiteJobQueue(os.path.join(self.directory.name, 'jobs.db'), **kwargs)
+
+    def test_expired_lease_is_redelivered_and_fences_the_old_worker(self):
+        queue = self.queue(lease_seconds=0.05)
+        job_id = queue.enqueue([{'s_question_id': 1}])
+        _, _, payload, attempts, first_token = queue.claim()
+        self.assertEqual((payload, attempts), ([{'s_question_id': 1}], 1))
+        self.assertIsNone(queue.claim())
+        time.sleep(0.06)
+        redelivered = queue.claim()
+        self.assertEqual((redelivered[0], redelivered[3]), (job_id, 2))
+        # the first worker wakes up after its lease was taken over
+        self.assertFalse(queue.heartbeat(job_id, first_token))
+        self.assertFalse(queue.complete(job_id, first_token))
+        self.assertIsNone(queue.fail(job_id, first_token, 'late'))
+        self.assertEqual(queue.get(job_id)['status'], RUNNING)
+        self.assertTrue(queue.complete(job_id, redelivered[4]))
+        self.assertEqual(queue.get(job_id)['status'], DONE)
+
+    def test_heartbeat_keeps_a_long_job_leased(self):
+        queue = self.queue(lease_seconds=0.1)
+        job_id = queue.enqueue([])
+        token = queue.claim()[4]
+        for _ in range(3):
+            time.sleep(0.05)
+            self.assertTrue(queue.heartbeat(job_id, token))
+        self.assertIsNone(queue.claim())
+
+    def test_failing_job_is_retried_then_parked(self):
+        queue = self.queue(max_attempts=2, retry_delay=0.0)
+        job_id = queue.enqueue([])
+        self.assertEqual(queue.fail(job_id, queue.claim()[4], 'ValueError()'), QUEUED)
+        self.assertEqual(queue.fail(job_id, queue.claim()[4], 'ValueError()'), FAILED)
+        self.assertIsNone(queue.claim())
+        self.assertEqual({key: queue.get(job_id)[key] for key in ('status', 'attempts', 'last_error')},
+                         {'status': FAILED, 'attempts': 2, 'last_error': 'ValueError()'})
+
+    def test_job_crashing_its_workers_is_parked(self):
+        queue = self.queue(lease_seconds=0.01, max_attempts=2)
+        job_id = queue.enqueue([])
+        for _ in range(2):
+            self.assertIsNotNone(queue.claim())
+            time.sleep(0.02)  # the worker dies without acknowledging
+        self.assertIsNone(queue.claim())
+        self.assertEqual(queue.get(job_id)['status'], FAILED)
+
+    def test_purge_removes_finished_jobs_only(self):
+        queue = self.queue(retention_seconds=0.0)
+        done, waiting = queue.enqueue([]), queue.enqueue([])
+        queue.complete(done, queue.claim()[4])
+        self.assertEqual(queue.purge(), [done])
+        self.assertIsNone(queue.get(done))
+        self.assertEqual(queue.get(waiting)['status'], QUEUED)
+
+    def test_drain_releases_unfinished_jobs(self):
+        queue = self.queue()
+        job_id = queue.enqueue([])
+        started = asyncio.Event()
+
+        async def handler(payload, job_id):
+            started.set()
+            await asyncio.sleep(60)
+
+        async def run():
+            pool = JobWorkerPool(queue, handler, concurrency=1, poll_interval=0.01)
+            pool.start()
+            await asyncio.wait_for(started.wait(), 5)
+            await pool.stop(drain_timeout=0.01)
+
+        asyncio.run(run())
+        job = queue.get(job_id)
+        self.assertEqual((job['status'], job['attempts']), (QUEUED, 0))
+        self.assertIsNotNone(queue.claim())
+
+    def test_job_claimed_while_stopping_is_released(self):
+        queue = self.queue()
+        job_id = queue.enqueue([])
+        claiming, stopping = threading.Event(), threading.Event()
+        claim, handled = queue.claim, []
+
+        def slow_claim():
+            claiming.set()
+            stopping.wait(5)  # `stop` runs while the claim is in its thread
+            return claim()
+
+        async def handler(payload, job_id):
+            handled.append(job_id)
+
+        async def run():
+            pool = JobWorkerPool(queue, handler, concurrency=1, poll_interval=0.01)
+            with patch.object(queue, 'claim', slow_claim):
+                pool.start()
+                await asyncio.to_thread(claiming.wait, 5)
+                stop = asyncio.create_task(pool.stop(drain_timeout=0.01))
+                await asyncio.sleep(0)
+                stopping.set()
+                await asyncio.wait_for(stop, 5)
+
+        asyncio.run(run())
+        self.assertEqual(handled, [])
+        job = queue.get(job_id)
+        self.assertEqual((job['status'], job['attempts']), (QUEUED, 0))
+
+    def test_the_file_is_only_created_on_first_use(self):
+        # the app is imported by the preloading gunicorn master, which must not open the queue
+        path = os.path.join(self.directory.name, 'queue', 'jobs.db')
+        queue = SQLiteJobQueue(path)
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+        job_id = queue.enqueue({'n': 1})
+        self.assertEqual(queue.get(job_id)['status'], QUEUED)
+        self.assertTrue(os.path.exists(path))
+
+class TestJobApi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import main
+        cls.main = main
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.queue = SQLiteJobQueue(os.path.join(directory.name, 'jobs.db'), retry_delay=0.0)
+        for name, value in (('job_queue', self.queue), ('job_status', JobStatusStore(self.queue.path))):
+            patcher = patch.object(self.main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_invalid_payload_is_rejected_before_queueing(self):
+        response = asyncio.run(self.main.screener([{'s_question_id': 'one', 'q_id': 'q1'}]))
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('[0].s_question_id', json.loads(response.body)['message'])
+        self.assertEqual(self.queue.depth(), 0)
+
+    def test_invalid_queued_job_is_parked_with_a_failed_validation(self):
+        # a job queued before the payload was validated at the edge
+        job_id = self.queue.enqueue([{'s_question_id': 1, 'q_id': 'q1', 'question': 'Why?'}])
+
+        async def run():
+            pool = JobWorkerPool(self.queue, self.main.process_data, concurrency=1, poll_interval=0.01,
+                                 permanent_errors=(ApiValidationException,))
+            pool.start()
+            while self.queue.get(job_id)['status'] in (QUEUED, RUNNING):
+                await asyncio.sleep(0.01)
+            await pool.stop()
+            return await self.main.screener_job_status(job_id)
+
+        job = asyncio.run(run())
+        self.assertEqual((job['status'], job['attempts']), (FAILED, 1))
+        self.assertIn('video_url', job['last_error'])
+        stages = {stage['stage']: stage for stage in job['stages']}
+        self.assertEqual(stages['validation']['status'], 'failed')
+        self.assertIn("'video_url' is a required property", stages['validation']['error'])
+        self.assertEqual({stage['status'] for name, stage in stages.items() if name != 'validation'}, {'skipped'})
+
+    def test_unknown_job_is_not_found(self):
+        self.assertEqual(asyncio.run(self.main.screener_job_status('missing')).status_code, 404)
+
+
+class TestOverallFeedback(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import main
+        cls.main = main
+
+    def setUp(self):
+        self.schema = FakeSchema()
+        payload = self.schema.seed(attempts=1, questions=2)[0]
+        self.data = self.main.OveralFeedback(user_id='user0', test_id='t1', attempt_no=1, course_id='c1')
+        self.results = [{**doc, 'feedback': json.dumps([{'Rating': 8}])} for doc in payload]
+        self.prompts = []
+        breaker = CircuitBreaker('genai', failure_threshold=2)
+        for name, value in (('genai_policy', RetryPolicy(breaker, attempts=3, base_delay=0, retryable=is_transient_error)),
+                            ('genai_overall_feedback', self.answer)):
+            patcher = patch.object(self.main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.failures = []
+
+    def answer(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.failures:
+            raise self.failures.pop(0)
+        return '```json\n{"overall_score": {"Overall Rating": 3}, "feedback": "Structured answers."}\n```'
+
+    def run_feedback(self, write_results: bool = True):
+        with fake_db(responder=self.schema):
+            if write_results:
+                run_in_unit_of_work({}, write_attempt_results, self.results, {})
+            return asyncio.run(self.main.test_level_feedback(self.data))
+
+    def test_failures_fail_the_job_stage_and_are_counted(self):
+        with fake_db(responder=self.schema), patch('src.utils.metrics.STAGE_ERRORS.inc') as errors:
+            with self.assertRaises(LookupError):
+                asyncio.run(self.main.generate_overall_feedback(self.data, admitted=True))
+        errors.assert_called_once_with(stage='overall_feedback')
+        self.assertEqual(self.prompts, [])
+
+    def test_feedback_is_written_with_the_computed_rating(self):
+        self.run_feedback()
+        course = self.schema.student_course[('user0', 'c1', 't1', 1)]
+        self.assertEqual(json.loads(course['overall_feedback'])['overall_score'], {'Overall Rating': 8.0})
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn('Rating', self.prompts[0])
+
+    def test_marks_are_only_written_with_the_question_rows(self):
+        attempt = {'user_id': 'user0', 't_id': 't1', 'c_id': 'c1', 'attempt_no': 1}
+        with fake_db(responder=self.schema) as connection:
+            run_in_unit_of_work({}, write_attempt_results, self.results, {}, attempt)
+            written = len(connection.statements)
+            asyncio.run(self.main.generate_overall_feedback(self.data))
+        course = self.schema.student_course[('user0', 'c1', 't1', 1)]
+        self.assertEqual(course['t_marks'], 8 / 10 * course['t_total_marks'])
+        self.assertFalse([query for query, _ in connection.statements[written:] if 't_marks' in query])
+
+    def test_transient_llm_errors_are_retried(self):
+        self.failures = [TimeoutError('deadline exceeded')]
+        self.run_feedback()
+        self.assertEqual(len(self.prompts), 2)
+        self.assertIsNotNone(self.schema.student_course[('user0', 'c1', 't1', 1)]['overall_feedback'])
+
+    def test_attempt_without_feedback_costs_no_llm_call(self):
+        for _ in range(3):
+            self.assertEqual(self.run_feedback(write_results=False).status_code, 404)
+        self.assertEqual(self.prompts, [])
+        self.assertEqual(self.main.genai_policy.breaker.state, CLOSED)
+
+    def test_write_errors_are_not_retried_nor_counted(self):
+        with patch.object(db_ops_module, 'overall_rating', return_value=None):  # "No rated question found"
+            for _ in range(3):
+                self.assertEqual(self.run_feedback().status_code, 500)
+        self.assertEqual(len(self.prompts), 3)
+        self.assertEqual(self.main.genai_policy.breaker.stats()['total_failures'], 0)
+
+
+class TestStreamChunking(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import main
+        cls.main = main
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.queue = SQLiteJobQueue(os.path.join(directory.name, 'jobs.db'))
+        # s_question_id -> user of the attempt, attempts of 2, 3 and 2 questions
+        self.users = {1: 'a', 2: 'a', 3: 'b', 4: 'b', 5: 'b', 6: 'c', 7: 'c'}
+
+        async def attempts(s_question_ids, db_config):
+            return {s_question_id: {'user_id': self.users[s_question_id], 't_id': 't1', 'c_id': 'c1', 'attempt_no': 1}
+                    for s_question_id in s_question_ids}
+
+        for name, value in (('job_queue', self.queue), ('retrieve_student_attempts', attempts),
+                            ('stream_chunk_size', 3), ('stream_max_chunk_size', 3)):
+            patcher = patch.object(self.main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stream(self, max_depth: int = 100):
+        lines = [json.dumps({'s_question_id': s_question_id, 'q_id': f'q{s_question_id}', 'question': 'Why?',
+                             'video_url': f'https://storage.example.com/{s_question_id}.mp4'})
+                 for s_question_id in self.users]
+
+        async def body():
+            for line in lines:
+                yield (line + '\n').encode()
+
+        with patch.object(self.main, 'job_queue_max_depth', max_depth):
+            response = asyncio.run(self.main.screener_stream(SimpleNamespace(stream=body)))
+        return response.status_code, [json.loads(line) for line in response.body.decode().splitlines()]
+
+    def test_jobs_are_cut_at_attempt_boundaries(self):
+        status, entries = self.stream()
+        self.assertEqual(status, 200)
+        self.assertEqual([entry['lines'] for entry in entries[:-1]], [[1, 2], [3, 5], [6, 7]])
+        self.assertEqual(entries[-1]['summary'], {'lines_queued': 7, 'lines_invalid': 0, 'jobs': 3})
+
+    def test_long_attempt_is_split_at_the_cap(self):
+        self.users = {s_question_id: 'a' for s_question_id in range(1, 6)}
+        _, entries = self.stream()
+        self.assertEqual([entry['count'] for entry in entries[:-1]], [3, 2])
+
+    def test_ingestion_stops_once_saturated(self):
+        status, entries = self.stream(max_depth=1)
+        self.assertEqual(status, 503)
+        self.assertEqual(entries[0]['lines'], [1, 2])
+        self.assertEqual(entries[-1]['summary']['jobs'], 1)
+        self.assertIn('saturated', entries[-1]['summary']['error'])
+        self.assertEqual(self.queue.depth(), 1)
+
+
+class TestLogging(unittest.TestCase):
+
+    @staticmethod
+    def record(level: int = logging.INFO, lineno: int = 10) -> logging.LogRecord:
+        return logging.LogRecord('neoprescreener', level, 'db_ops.py', lineno, 'row written', None, None)
+
+    def test_rate_limit_reports_the_suppressed_records(self):
+        rate_limit = RateLimitFilter(limit=2)
+        with patch('src.time.monotonic', return_value=100.0):
+            passed = [rate_limit.filter(self.record()) for _ in range(5)]
+            self.assertTrue(rate_limit.filter(self.record(lineno=11)))  # another call site
+            self.assertTrue(rate_limit.filter(self.record(logging.ERROR)))  # errors are never dropped
+        self.assertEqual(passed, [True, True, False, False, False])
+        with patch('src.time.monotonic', return_value=101.0):
+            record = self.record()
+            self.assertTrue(rate_limit.filter(record))
+        self.assertEqual(record.msg, 'row written (3 similar messages suppressed)')
+
+    def test_correlation_id_reaches_threads_and_tasks(self):
+        stamp = CorrelationIdFilter()
+
+        def stamped() -> str:
+            record = self.record()
+            stamp.filter(record)
+            return record.correlation_id
+
+        async def run():
+            token = correlation_id.set('job-1')
+            try:
+                return (stamped(), await asyncio.to_thread(stamped),
+                        await asyncio.create_task(asyncio.to_thread(stamped)))
+            finally:
+                correlation_id.reset(token)
+
+        self.assertEqual(asyncio.run(run()), ('job-1', 'job-1', 'job-1'))
+        self.assertEqual(stamped(), '-')
+
+    def test_request_id_is_propagated_and_echoed(self):
+        import main
+        seen = []
+
+        async def call_next(request):
+            seen.append(await asyncio.to_thread(correlation_id.get))
+            return main.Response(content=b'')
+
+        async def run(headers):
+            return await main.correlate_request(SimpleNamespace(headers=headers), call_next)
+
+        response = asyncio.run(run({'X-Request-ID': 'abc'}))
+        self.assertEqual((seen[-1], response.headers['X-Request-ID']), ('abc', 'abc'))
+        response = asyncio.run(run({}))
+        self.assertEqual(seen[-1], response.headers['X-Request-ID'])
+        self.assertEqual(len(seen[-1]), 32)
+        self.assertEqual(correlation_id.get(), '-')
+
+
+class TestServerConfig(unittest.TestCase):
+
+    KEYS = ('SERVER_MAX_REQUESTS', 'SERVER_GRACEFUL_TIMEOUT', 'JOB_QUEUE_DRAIN_TIMEOUT')
+
+    @staticmethod
+    def server_config(env: dict) -> dict:
+        LoadSecret()  # loads the env file once, before the keys are removed
+        environ = {key: value for key, value in os.environ.items() if key not in TestServerConfig.KEYS}
+        with patch.dict(os.environ, {**environ, **env}, clear=True):
+            return runpy.run_path('gunicorn.conf.py')
+
+    def assert_workers_are_not_recycled_mid_job(self, config: dict, drain_timeout: float):
+        self.assertEqual(config['max_requests'], 0)
+        self.assertGreater(config['graceful_timeout'], drain_timeout)
+        # a typical scoring job finishes inside the drain instead of being redone by another worker
+        self.assertGreaterEqual(drain_timeout, 300)
+
+    def test_defaults(self):
+        self.assert_workers_are_not_recycled_mid_job(self.server_config({}), 300)
+
+    def test_env_files(self):
+        for env_file in ('.env.development', '.env.production'):
+            with self.subTest(env_file=env_file):
+                env = {key: value for key, value in dotenv_values(env_file).items() if key in self.KEYS}
+                self.assert_workers_are_not_recycled_mid_job(
+                    self.server_config(env), float(env['JOB_QUEUE_DRAIN_TIMEOUT']))
+
+
+    def test_the_genai_client_is_built_once_per_worker_on_first_use(self):
+        import main
+        main.genai_llm.cache_clear()  # what the at-fork hook does in a new worker
+        self.addCleanup(main.genai_llm.cache_clear)
+        with patch('main.ChatGoogleGenerativeAI') as client:
+            client.return_value.invoke.return_value.content = 'feedback'
+            self.assertEqual(client.call_count, 0)
+            self.assertEqual(main.genai_overall_feedback('prompt'), 'feedback')
+            main.genai_overall_feedback('prompt')
+        self.assertEqual(client.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()